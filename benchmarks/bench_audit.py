@@ -0,0 +1,44 @@
+""" Time auditing a synthetic vault with different numbers of worker processes
+
+Run from the repository root:
+    python -m benchmarks.bench_audit --accounts 200000 --workers 1 2 4
+"""
+from argparse import ArgumentParser
+from collections import deque
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from benchmarks.synthetic import PASSWORD
+from plain_sight.audit import audit_vault
+from plain_sight.encryption import KeyContext, new_kdf, DEFAULT_CIPHER
+from plain_sight.records import SchemaTable
+from plain_sight.synthetic import iter_accounts
+from plain_sight.vault import write_vault
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'audit.vault'
+
+        # The key is derived up front so only decrypting and checking records is timed
+        key = KeyContext(PASSWORD, new_kdf(), DEFAULT_CIPHER)
+        schemas = SchemaTable()
+        records = (schemas.encode(tuple(account), list(account.values())) for account in iter_accounts(args.accounts))
+        write_vault(vault_path, key, records, schemas=schemas)
+        print(f'{args.accounts} accounts, {vault_path.stat().st_size / 1e6:.1f} MB')
+
+        for workers in args.workers:
+            start = perf_counter()
+            summary = deque(audit_vault(vault_path, key, workers=workers), maxlen=1)[0]['summary']
+            seconds = perf_counter() - start
+
+            print(f'{workers:3d} workers: {seconds * 1e3:8.1f} ms, {summary["weak"]} weak, {summary["reused"]} reused')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+""" Compare the throughput of the vault ciphers for record sized and large payloads
+
+Run from the repository root:
+    python -m benchmarks.bench_ciphers --records 20000
+"""
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+from typing import Callable
+from benchmarks.synthetic import PASSWORD
+from plain_sight.encryption import KeyContext, CIPHERS, new_kdf, encrypt_data, decrypt_data
+from plain_sight.synthetic import iter_accounts
+
+
+_LARGE_SIZE = 1 << 24
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """ Fastest of several runs """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the best is reported')
+    args = parser.parse_args()
+
+    records = [dumps(account).encode() for account in iter_accounts(args.records)]
+    record_bytes = sum(map(len, records))
+    large = bytes(_LARGE_SIZE)
+    key = KeyContext(PASSWORD, new_kdf())
+    print(f'{args.records} records of {record_bytes / args.records:.0f} bytes on average, {_LARGE_SIZE >> 20} MiB blob')
+
+    for cipher in CIPHERS:
+        context = key.with_cipher(cipher)
+        cipher_texts = [encrypt_data(context, record) for record in records]
+        large_cipher_text = encrypt_data(context, large)
+
+        encrypt_seconds = best_time(lambda: [encrypt_data(context, record) for record in records], args.repeat)
+        decrypt_seconds = best_time(lambda: [decrypt_data(context, text) for text in cipher_texts], args.repeat)
+        large_encrypt = best_time(lambda: encrypt_data(context, large), args.repeat)
+        large_decrypt = best_time(lambda: decrypt_data(context, large_cipher_text), args.repeat)
+
+        print(f'{cipher:>17}: records encrypt {record_bytes / encrypt_seconds / 1e6:7.1f} MB/s '
+              f'decrypt {record_bytes / decrypt_seconds / 1e6:7.1f} MB/s, '
+              f'{sum(map(len, cipher_texts)) - record_bytes:8d} bytes overhead, '
+              f'blob encrypt {_LARGE_SIZE / large_encrypt / 1e6:7.1f} MB/s '
+              f'decrypt {_LARGE_SIZE / large_decrypt / 1e6:7.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
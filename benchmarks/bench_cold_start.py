@@ -0,0 +1,96 @@
+""" Time one-shot commands from process start to exit, as a deploy script calling them in a loop would see them
+
+Commands marked with * are answered by an agent started for the run.
+
+Run from the repository root:
+    python -m benchmarks.bench_cold_start --accounts 1000 --runs 10
+"""
+from argparse import ArgumentParser
+from os import environ
+from pathlib import Path
+from statistics import mean
+from subprocess import Popen, run, DEVNULL
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+from benchmarks.bench_mmap import make_vault, _PASSWORD
+from plain_sight.agent_client import request
+from plain_sight.cli import PASSWORD_VARIABLE, AGENT_VARIABLE
+
+
+_MAIN = str(Path(__file__).absolute().parent.parent / 'main.py')
+
+
+def commands(vault_path: Path) -> dict:
+    """ Command lines to time, the bare interpreter is the floor every command pays """
+    vault = ['--vault', str(vault_path)]
+
+    return {
+        'python': [executable, '-c', 'pass'],
+        'generate': [executable, _MAIN, 'generate'],
+        'get': [executable, _MAIN, 'get', 'account 1', *vault],
+        'list': [executable, _MAIN, 'list', *vault],
+        'search': [executable, _MAIN, 'search', 'account 9', *vault],
+    }
+
+
+def time_command(command: list, runs: int, environment: dict = None) -> list:
+    """ Wall time of each run of a command """
+    environment = environment if environment is not None else {**environ, PASSWORD_VARIABLE: _PASSWORD}
+    times = []
+
+    for _ in range(runs):
+        start = perf_counter()
+        run(command, env=environment, stdout=DEVNULL, stderr=DEVNULL, check=True)
+        times.append(perf_counter() - start)
+
+    return times
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'benchmark.vault'
+        make_vault(vault_path, args.accounts)
+        print(f'{args.accounts} accounts, {args.runs} runs each')
+
+        for name, command in commands(vault_path).items():
+            times = time_command(command, args.runs)
+            print(f'{name:>8}: mean {mean(times) * 1000:.0f} ms, min {min(times) * 1000:.0f} ms')
+
+        time_agent(vault_path, Path(temp_dir) / 'agent.sock', args.runs)
+
+
+def time_agent(vault_path: Path, socket_path: Path, runs: int) -> None:
+    """ The same lookups answered by an agent that unlocked the vault once """
+    command = [executable, _MAIN, 'agent', '--vault', str(vault_path), '--socket', str(socket_path)]
+    server = Popen(command, env={**environ, PASSWORD_VARIABLE: _PASSWORD}, stdout=DEVNULL, stderr=DEVNULL)
+
+    try:
+        while not socket_path.exists():
+            sleep(0.01)
+
+        # Clients don't get the master password, every lookup has to go through the agent
+        environment = {key: value for key, value in environ.items() if key != PASSWORD_VARIABLE}
+        environment[AGENT_VARIABLE] = str(socket_path)
+        for name in ('get', 'search'):
+            times = time_command(commands(vault_path)[name], runs, environment)
+            print(f'{name + " *":>8}: mean {mean(times) * 1000:.0f} ms, min {min(times) * 1000:.0f} ms')
+
+        times = []
+        for _ in range(runs * 10):
+            start = perf_counter()
+            request(socket_path, {'command': 'get', 'name': 'account 1'})
+            times.append(perf_counter() - start)
+        print(f'   round trip: mean {mean(times) * 1e6:.0f} us, min {min(times) * 1e6:.0f} us')
+    finally:
+        request(socket_path, {'command': 'stop'})
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+""" Measure import cost of the command line entry point with -X importtime and guard it against a budget
+
+Run from the repository root:
+    python -m benchmarks.bench_import --budget-ms 60
+"""
+from argparse import ArgumentParser
+from statistics import median
+from plain_sight.timing import forbidden_imports, import_times
+
+
+_MODULE = 'plain_sight.cli'
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default=_MODULE)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, help='fail when the median cumulative import time is larger')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest modules to show')
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    total = median(times[args.module][1] for times in runs) / 1000
+
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_time, cumulative) in slowest:
+        print(f'{self_time / 1000:8.2f} ms self {cumulative / 1000:8.2f} ms cumulative  {name}')
+    print(f'{args.module}: median {total:.1f} ms over {args.runs} runs')
+
+    forbidden = forbidden_imports(runs[-1])
+    if forbidden:
+        print(f'Imported at startup: {", ".join(forbidden)}')
+        return 1
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f'Over the budget of {args.budget_ms:.1f} ms')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
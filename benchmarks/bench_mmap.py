@@ -0,0 +1,97 @@
+""" Compare opening a record vault through buffered reads against the memory-mapped path
+
+Run from the repository root:
+    python -m benchmarks.bench_mmap --accounts 100000
+"""
+from argparse import ArgumentParser
+from json import dumps, loads
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from plain_sight.file_io import load_file, map_file
+from plain_sight.encryption import KeyContext
+from plain_sight.vault import write_vault, read_header, read_index, read_record, unlock
+
+
+_PASSWORD = 'benchmark key'
+_MODES = ('read', 'mmap')
+
+
+def make_vault(vault_path: Path, count: int) -> None:
+    """ Write a synthetic vault with the given number of accounts """
+    records = (
+        dumps({'name': f'account {index}', 'login': f'user{index}@example.com', 'password': 'x' * 20}).encode()
+        for index in range(count)
+    )
+    write_vault(vault_path, _PASSWORD, records)
+
+
+def open_with_read(vault_path: Path, key: KeyContext) -> int:
+    """ Previous path, the whole file is read into bytes and every slice is a copy """
+    data = load_file(vault_path)
+    index, _ = read_index(memoryview(data), key)
+
+    records = 0
+    for offset, size in index['records']:
+        read_record(memoryview(data[offset:offset + size]), key, [0, size])
+        records += 1
+
+    return records
+
+
+def open_with_mmap(vault_path: Path, key: KeyContext) -> int:
+    """ Memory-mapped path, records are decrypted from zero-copy slices """
+    with map_file(vault_path) as view:
+        read_header(view)
+        index, _ = read_index(view, key)
+
+        records = 0
+        for entry in index['records']:
+            read_record(view, key, entry)
+            records += 1
+
+    return records
+
+
+def measure(vault_path: Path, mode: str) -> dict:
+    """ Time a single open, runs in a fresh process so peak RSS is per mode """
+    opener = open_with_mmap if mode == 'mmap' else open_with_read
+    with map_file(vault_path) as view:
+        key = unlock(read_header(view), _PASSWORD)
+
+    start = perf_counter()
+    records = opener(vault_path, key)
+    elapsed = perf_counter() - start
+
+    return {'mode': mode, 'records': records, 'seconds': elapsed, 'max_rss_kb': getrusage(RUSAGE_SELF).ru_maxrss}
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--mode', choices=_MODES)
+    parser.add_argument('--vault', type=Path)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(dumps(measure(args.vault, args.mode)))
+        return
+
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'benchmark.vault'
+        make_vault(vault_path, args.accounts)
+        print(f'{args.accounts} accounts, {vault_path.stat().st_size / 1e6:.1f} MB')
+
+        for mode in _MODES:
+            command = [executable, '-m', 'benchmarks.bench_mmap', '--mode', mode, '--vault', str(vault_path)]
+            output = run(command, capture_output=True, check=True, text=True).stdout
+            result = loads(output.strip().splitlines()[-1])
+
+            print(f'{mode:>5}: {result["seconds"]:.3f} s, peak RSS {result["max_rss_kb"] / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Compare JSON and binary vault records: size, encoding and decoding
+
+Run from the repository root:
+    python -m benchmarks.bench_records --accounts 100000
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable, List
+from plain_sight.account import AccountStore, snapshot_accounts
+from plain_sight.compression import Codec
+from plain_sight.records import get_decoder, new_table, RECORD_FORMATS
+from plain_sight.synthetic import iter_accounts
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """ Fastest of several runs """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def compressed_size(records: List[bytes]) -> int:
+    """ Size of the records once compressed the way vaults are written """
+    codec, records = Codec.train('zlib', records)
+
+    return sum(len(codec.compress(record)) for record in records)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the best is reported')
+    args = parser.parse_args()
+
+    store = AccountStore()
+    accounts = [store.add(account) for account in iter_accounts(args.accounts)]
+    print(f'{args.accounts} accounts')
+
+    for record_format in RECORD_FORMATS:
+        schemas = new_table(record_format)
+        records = list(snapshot_accounts(accounts, schemas))
+        decode = get_decoder(record_format, schemas.schemas if schemas is not None else [])
+
+        def encode() -> None:
+            list(snapshot_accounts(accounts, new_table(record_format)))
+
+        def decode_all() -> None:
+            [decode(record) for record in records]
+
+        def load() -> None:
+            target = AccountStore()
+            [target.append(*decode(record)) for record in records]
+
+        encode_seconds = best_time(encode, args.repeat)
+        decode_seconds = best_time(decode_all, args.repeat)
+        load_seconds = best_time(load, args.repeat)
+
+        print(f'{record_format:>6}: {sum(map(len, records)) / 1e6:6.2f} MB, '
+              f'{compressed_size(records) / 1e6:6.2f} MB compressed, '
+              f'encode {encode_seconds * 1e3:8.1f} ms, decode {decode_seconds * 1e3:8.1f} ms, '
+              f'decode into accounts {load_seconds * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+""" Time re-keying a synthetic vault with different numbers of worker processes
+
+Run from the repository root:
+    python -m benchmarks.bench_rekey --accounts 200000 --workers 1 2 4
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from json import dumps
+from time import perf_counter
+from benchmarks.synthetic import PASSWORD
+from plain_sight.encryption import KeyContext, new_kdf, DEFAULT_CIPHER
+from plain_sight.rekey import rekey_vault
+from plain_sight.synthetic import iter_accounts
+from plain_sight.vault import write_vault
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        source_path = Path(temp_dir) / 'source.vault'
+        vault_path = Path(temp_dir) / 'rekey.vault'
+
+        # Keys are derived up front so only re-encrypting and verifying are timed
+        key = KeyContext(PASSWORD, new_kdf(), DEFAULT_CIPHER)
+        new_key = KeyContext('new ' + PASSWORD, new_kdf(), DEFAULT_CIPHER)
+
+        write_vault(source_path, key, (dumps(account).encode() for account in iter_accounts(args.accounts)))
+        size = source_path.stat().st_size
+        print(f'{args.accounts} accounts, {size / 1e6:.1f} MB')
+
+        for workers in args.workers:
+            copyfile(source_path, vault_path)
+            start = perf_counter()
+            rekey_vault(vault_path, key, new_key, workers)
+            seconds = perf_counter() - start
+
+            print(f'{workers:3d} workers: {seconds * 1e3:8.1f} ms, {size / seconds / 1e6:6.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+""" Time open, load, crypto, search, save and password generation on synthetic vaults and save the results as JSON
+
+Run from the repository root:
+    python -m benchmarks.bench_suite --sizes 1000 10000 100000 --output results.json
+    python -m benchmarks.bench_suite --sizes 1000 10000 --compare results.json
+
+Every case runs in a fresh process, so the reported peak RSS belongs to that case alone.
+"""
+from argparse import ArgumentParser
+from json import dumps, loads
+from pathlib import Path
+from platform import platform, python_version
+from resource import getrusage, RUSAGE_SELF
+from shutil import copyfile
+from statistics import median
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, Tuple
+from benchmarks.synthetic import make_vault, PASSWORD
+from plain_sight.encryption import KeyContext, new_kdf, encrypt_data, decrypt_data, generate_password, \
+    generate_passwords, DEFAULT_CIPHER
+from plain_sight.plain_sight import PlainSight
+from plain_sight.synthetic import iter_accounts
+
+
+_SIZES = (1000, 10000, 100000)
+_QUERIES = 1000
+_TOLERANCE = 0.1
+
+# A case prepares its inputs outside the timed region and returns the function to time, how many operations one
+# call performs and how many bytes it processes
+Prepared = Tuple[Callable[[], Any], int, int]
+
+
+def case_open(vault_path: Path, count: int) -> Prepared:
+    """ Unlock and read the whole vault, including key derivation """
+    return lambda: PlainSight(vault_path, PASSWORD), count, vault_path.stat().st_size
+
+
+def case_load_data(vault_path: Path, count: int) -> Prepared:
+    """ Parse a plaintext vault document into accounts """
+    text = dumps({'accounts': list(iter_accounts(count))})
+
+    return lambda: PlainSight.load_data(text), count, len(text)
+
+
+def case_encrypt(vault_path: Path, count: int) -> Prepared:
+    """ Encrypt every record """
+    key = KeyContext(PASSWORD, new_kdf(), DEFAULT_CIPHER)
+    records = [dumps(account).encode() for account in iter_accounts(count)]
+
+    return lambda: [encrypt_data(key, record) for record in records], count, sum(map(len, records))
+
+
+def case_decrypt(vault_path: Path, count: int) -> Prepared:
+    """ Decrypt every record """
+    key = KeyContext(PASSWORD, new_kdf(), DEFAULT_CIPHER)
+    cipher_texts = [encrypt_data(key, dumps(account).encode()) for account in iter_accounts(count)]
+
+    return lambda: [decrypt_data(key, cipher_text) for cipher_text in cipher_texts], count, sum(map(len, cipher_texts))
+
+
+def case_index(vault_path: Path, count: int) -> Prepared:
+    """ Build the search index of an open vault """
+    plain_sight = PlainSight(vault_path, PASSWORD)
+
+    def build() -> None:
+        plain_sight._search_index = None
+        plain_sight.search_index
+
+    return build, count, 0
+
+
+def case_search(vault_path: Path, count: int) -> Prepared:
+    """ Queries the way search_accounts runs them, a mix of names, logins and partial words """
+    plain_sight = PlainSight(vault_path, PASSWORD)
+    index = plain_sight.search_index
+    accounts = list(iter_accounts(min(count, _QUERIES), seed=1))
+    queries = [(account['name'], account['login'][:4], account['url'][8:12])[number % 3]
+               for number, account in enumerate(accounts)]
+
+    return lambda: [index.search(query, 11) for query in queries], len(queries), 0
+
+
+def case_save(vault_path: Path, count: int) -> Prepared:
+    """ Journal a single edited account """
+    working_path = vault_path.with_name(f'{vault_path.stem}.save.vault')
+    copyfile(vault_path, working_path)
+    plain_sight = PlainSight(working_path, PASSWORD)
+
+    def save() -> None:
+        account = plain_sight.accounts[count // 2]
+        account.login = f'edited {perf_counter()}'
+        plain_sight.set_update_flag(account)
+        plain_sight.save_data()
+
+    return save, 1, 0
+
+
+def case_compact(vault_path: Path, count: int) -> Prepared:
+    """ Rewrite the whole vault """
+    working_path = vault_path.with_name(f'{vault_path.stem}.compact.vault')
+    copyfile(vault_path, working_path)
+    plain_sight = PlainSight(working_path, PASSWORD)
+
+    return lambda: plain_sight.compact(background=False), count, vault_path.stat().st_size
+
+
+def case_generate(vault_path: Path, count: int) -> Prepared:
+    """ Generate one password per account in a single batch """
+    return lambda: generate_passwords(count), count, 0
+
+
+def case_generate_single(vault_path: Path, count: int) -> Prepared:
+    """ Generate passwords one call at a time, as the interactive shell does """
+    calls = min(count, 10000)
+
+    return lambda: [generate_password() for _ in range(calls)], calls, 0
+
+
+CASES: Dict[str, Callable[[Path, int], Prepared]] = {
+    'open': case_open,
+    'load_data': case_load_data,
+    'encrypt_data': case_encrypt,
+    'decrypt_data': case_decrypt,
+    'index': case_index,
+    'search': case_search,
+    'save_data': case_save,
+    'compact': case_compact,
+    'generate_passwords': case_generate,
+    'generate_password': case_generate_single
+}
+
+
+def measure(case: str, vault_path: Path, count: int, repeat: int) -> Dict[str, Any]:
+    """ Time a case in the current process, the best run is used for throughput """
+    function, operations, size = CASES[case](vault_path, count)
+
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    best = min(times)
+    return {
+        'case': case,
+        'accounts': count,
+        'seconds': best,
+        'median_seconds': median(times),
+        'operations': operations,
+        'operations_per_second': operations / best,
+        'megabytes_per_second': size / best / 1e6 if size else None,
+        'max_rss_kb': getrusage(RUSAGE_SELF).ru_maxrss
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path, tolerance: float) -> bool:
+    """ Print the change against saved results, returns whether any case got slower than the tolerance """
+    baseline = {(result['case'], result['accounts']): result for result in loads(baseline_path.read_text())['results']}
+    regressed = False
+
+    for result in results:
+        previous = baseline.get((result['case'], result['accounts']))
+        if previous is None:
+            continue
+
+        change = result['seconds'] / previous['seconds'] - 1
+        flag = ' slower' if change > tolerance else ''
+        regressed = regressed or bool(flag)
+        print(f'{result["case"]:>18} {result["accounts"]:>8}: {previous["seconds"] * 1e3:10.2f} ms -> '
+              f'{result["seconds"] * 1e3:10.2f} ms ({change:+.1%}){flag}')
+
+    return regressed
+
+
+def get_commit() -> str:
+    """ Commit the results were measured at, empty outside a git checkout """
+    output = run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+
+    return output.stdout.strip() if output.returncode == 0 else ''
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(_SIZES), help='vault sizes in accounts')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best is reported')
+    parser.add_argument('--output', type=Path, help='write the results to this JSON file')
+    parser.add_argument('--compare', type=Path, help='results JSON from an earlier commit to compare against')
+    parser.add_argument('--tolerance', type=float, default=_TOLERANCE, help='slowdown reported as a regression')
+    parser.add_argument('--case', choices=list(CASES), help='run a single case in this process')
+    parser.add_argument('--vault', type=Path)
+    args = parser.parse_args()
+
+    if args.case:
+        print(dumps(measure(args.case, args.vault, args.sizes[0], args.repeat)))
+        return 0
+
+    results = []
+    with TemporaryDirectory() as temp_dir:
+        for count in args.sizes:
+            vault_path = Path(temp_dir) / f'{count}.vault'
+            make_vault(vault_path, count)
+            print(f'{count} accounts, {vault_path.stat().st_size / 1e6:.1f} MB')
+
+            for case in args.cases:
+                command = [executable, '-m', 'benchmarks.bench_suite', '--case', case, '--vault', str(vault_path),
+                           '--sizes', str(count), '--repeat', str(args.repeat)]
+                output = run(command, capture_output=True, check=True, text=True).stdout
+                result = loads(output.strip().splitlines()[-1])
+                results.append(result)
+
+                throughput = f', {result["megabytes_per_second"]:.1f} MB/s' if result['megabytes_per_second'] else ''
+                print(f'{case:>18}: {result["seconds"] * 1e3:10.2f} ms, '
+                      f'{result["operations_per_second"]:12.0f} ops/s{throughput}, '
+                      f'peak RSS {result["max_rss_kb"] / 1024:.1f} MB')
+
+    if args.output:
+        meta = {'commit': get_commit(), 'python': python_version(), 'platform': platform(), 'time': time()}
+        args.output.write_text(dumps({'meta': meta, 'results': results}, indent=2))
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,44 @@
+""" Time searching many synthetic vaults one at a time and concurrently
+
+Run from the repository root:
+    python -m benchmarks.bench_vault_search --vaults 50 --accounts 2000
+"""
+from argparse import ArgumentParser
+from os import cpu_count
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from benchmarks.synthetic import make_vault, PASSWORD
+from plain_sight.vault_search import search_vault, search_vaults
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vaults', type=int, default=50)
+    parser.add_argument('--accounts', type=int, default=2000, help='accounts per vault')
+    parser.add_argument('--term', default='github')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        vault_paths = [Path(temp_dir) / f'{number}.vault' for number in range(args.vaults)]
+        for seed, vault_path in enumerate(vault_paths):
+            make_vault(vault_path, args.accounts, seed)
+        vaults = [(vault_path, PASSWORD) for vault_path in vault_paths]
+
+        single = []
+        for vault_path in vault_paths:
+            start = perf_counter()
+            search_vault(vault_path, PASSWORD, args.term, 10)
+            single.append(perf_counter() - start)
+
+        for workers in sorted({1, cpu_count() or 1, args.vaults}):
+            start = perf_counter()
+            search_vaults(vaults, args.term, 10, workers)
+            seconds = perf_counter() - start
+            print(f'{workers:3d} workers: {seconds * 1e3:8.1f} ms')
+
+        print(f'slowest single vault {max(single) * 1e3:.1f} ms, sum of all vaults {sum(single) * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
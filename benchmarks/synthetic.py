@@ -0,0 +1,16 @@
+""" Deterministic synthetic vaults in the current record format, for benchmarks """
+from json import dumps
+from pathlib import Path
+from plain_sight.encryption import KeyContext, new_kdf, DEFAULT_CIPHER
+from plain_sight.synthetic import iter_accounts
+from plain_sight.vault import write_vault
+
+
+PASSWORD = 'benchmark key'
+
+
+def make_vault(vault_path: Path, count: int, seed: int = 0, password: str = PASSWORD) -> None:
+    """ Write a synthetic vault with the default key derivation """
+    records = (dumps(account).encode() for account in iter_accounts(count, seed))
+
+    write_vault(vault_path, KeyContext(password, new_kdf(), DEFAULT_CIPHER), records)
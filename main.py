@@ -1,9 +1,21 @@
-from plain_sight.plain_sight import PlainSight
+from sys import argv
 
 
 if __name__ == '__main__':
+    if len(argv) > 1:
+        from plain_sight.cli import main
+
+        exit(main(argv[1:]))
+
+    from plain_sight.encryption import DecryptionError
+    from plain_sight.plain_sight import PlainSight
+
     print('Plain sight\n\n')
 
-    ps = PlainSight()
+    try:
+        ps = PlainSight()
+    except DecryptionError:
+        print('Invalid password entered. Exiting.')
+        exit(0)
 
     ps.interaction()
@@ -1,33 +1,272 @@
 from plain_sight.cmd_io import get_input, get_password, get_yes_no
-from plain_sight.encryption import generate_password, _PASSWORD_LENGTH
-from typing import Dict, Callable, Optional, List, Union
+from plain_sight.encryption import generate_password, SessionKey, _PASSWORD_LENGTH
+from typing import Any, Dict, Callable, Iterable, Iterator, Optional, List, Tuple, Union
 from plain_sight.log import get_logger
-from re import compile
+from json import dumps
+from json.encoder import encode_basestring_ascii
+from sys import intern
+from plain_sight.records import SchemaTable
 
 
 _SKIP_ATTRIBUTES = {'options', 'password'}
 logger = get_logger('account')
-builtin_pattern = compile(r'(__\w+__)|(options)')
 _EDIT_PATTERN = r'\d*'
+_OPTIONS = {
+    'c': 'close',
+    'v': 'view_account',
+    'p': 'get_password',
+    'e': 'edit',
+    'h': 'help'
+}
+_MISSING = object()
+
+# Secrets are never interned as the table would keep old values alive after an edit, names are nearly always unique
+_UNINTERNED_ATTRIBUTES = _SKIP_ATTRIBUTES | {'name'}
+
+# Secret strings are stored sealed under the store's session key and decrypted each time they are read, values read
+# from vaults are never bytes, so bytes in a column are always sealed
+_SECRET_ATTRIBUTES = {'password'}
+_ENCODING = 'utf8'
+
+Schema = Tuple[str, ...]
+
+
+class AccountStore:
+    """ Columnar storage for account fields, repeated strings are stored once """
+    def __init__(self):
+        self.size = 0
+        self.columns: Dict[str, List[Any]] = {}
+        self.strings: Dict[str, str] = {}
+
+        # Each row references a shared, sorted schema tuple that is replaced when a field is added to the row
+        self.schemas: List[Schema] = []
+        self.schema_table: Dict[Schema, Schema] = {}
+        self.extensions: Dict[Tuple[Schema, str], Schema] = {}
+        self.encoders: Dict[Schema, Tuple[str, ...]] = {}
+
+        # Columns each value of a schema is stored in and whether it is interned or sealed, for rows added in one step
+        self.layouts: Dict[Schema, Tuple[Schema, List[Tuple[List[Any], bool, bool]]]] = {}
+        self.session_key: Optional[SessionKey] = None
+
+    def add(self, data: dict = None) -> 'Account':
+        """ Add a row and return a view of it """
+        return Account(data, self)
+
+    def append(self, fields: Tuple[str, ...], values: List[Any]) -> 'Account':
+        """ Add a row from field names and values, rows read from a vault skip the per-field bookkeeping of set """
+        layout = self.layouts.get(fields)
+        if layout is None:
+            if len(set(fields)) != len(fields):     # Repeated fields, the row is built field by field
+                return self.add(dict(zip(fields, values)))
+
+            for field in fields:
+                if field not in self.columns:
+                    self.columns[intern(field)] = [_MISSING] * self.size
+
+            schema = tuple(sorted(intern(field) for field in fields))
+            schema = self.schema_table.setdefault(schema, schema)
+            targets = [(self.columns[field], field not in _UNINTERNED_ATTRIBUTES, field in _SECRET_ATTRIBUTES)
+                       for field in fields]
+            layout = self.layouts[fields] = (schema, targets)
+
+        schema, targets = layout
+        row = self.new_row()
+        self.schemas[row] = schema
+
+        strings = self.strings
+        for (column, interned, sealed), value in zip(targets, values):
+            if interned and isinstance(value, str):
+                value = strings.setdefault(value, value)
+            elif sealed and isinstance(value, str):
+                value = self.seal(value)
+            column[row] = value
+
+        return Account(store=self, row=row)
+
+    def new_row(self) -> int:
+        """ Append an empty row to every column """
+        for column in self.columns.values():
+            column.append(_MISSING)
+
+        self.schemas.append(())
+
+        self.size += 1
+        return self.size - 1
+
+    def seal(self, secret: str) -> bytes:
+        """ Encrypt a secret with the session key, created on first use """
+        if self.session_key is None:
+            self.session_key = SessionKey()
+
+        return self.session_key.seal(secret)
+
+    def reveal(self, value: Any) -> Any:
+        """ Plaintext of a stored value, only sealed secrets need decrypting """
+        return self.session_key.unseal(value) if type(value) is bytes else value
+
+    def get(self, row: int, field: str) -> Any:
+        """ Value of a field, _MISSING when the row does not have it """
+        column = self.columns.get(field)
+
+        return self.reveal(column[row]) if column is not None else _MISSING
+
+    def set(self, row: int, field: str, value: Any) -> None:
+        """ Set a field, new fields add a column """
+        column = self.columns.get(field)
+        if column is None:
+            column = self.columns[intern(field)] = [_MISSING] * self.size
+
+        if isinstance(value, str) and field not in _UNINTERNED_ATTRIBUTES:
+            value = self.strings.setdefault(value, value)
+        elif isinstance(value, str) and field in _SECRET_ATTRIBUTES:
+            value = self.seal(value)
+
+        if column[row] is _MISSING:
+            self.schemas[row] = self.extend_schema(self.schemas[row], field)
+        column[row] = value
+
+    def clear(self, row: int) -> None:
+        """ Remove every field of a row, the row stays allocated to be set again """
+        columns = self.columns
+        for field in self.schemas[row]:
+            columns[field][row] = _MISSING
+
+        self.schemas[row] = ()
+
+    def extend_schema(self, schema: Schema, field: str) -> Schema:
+        """ Schema with one more field, computed once per distinct schema """
+        extended = self.extensions.get((schema, field))
+        if extended is None:
+            extended = tuple(sorted(schema + (intern(field),)))
+            extended = self.extensions[(schema, field)] = self.schema_table.setdefault(extended, extended)
+
+        return extended
+
+    def fields(self, row: int) -> Schema:
+        """ Sorted names of the fields set on a row """
+        return self.schemas[row]
+
+    def get_encoder(self, schema: Schema) -> Tuple[str, ...]:
+        """ JSON text preceding each value of a schema, computed once per distinct schema """
+        encoder = self.encoders.get(schema)
+        if encoder is None:
+            separators = ['{'] + [', '] * (len(schema) - 1)
+            encoder = self.encoders[schema] = tuple(
+                f'{separator}{encode_basestring_ascii(field)}: ' for separator, field in zip(separators, schema)
+            )
+
+        return encoder
+
+    def snapshot(self) -> 'AccountStore':
+        """ Copy that later edits don't change, values are immutable so only the column lists are copied """
+        snapshot = AccountStore()
+        snapshot.size = self.size
+        snapshot.columns = {field: list(column) for field, column in self.columns.items()}
+        snapshot.schemas = list(self.schemas)
+
+        # Only read from the snapshot, so the lookup tables are shared rather than copied
+        snapshot.strings = self.strings
+        snapshot.schema_table = self.schema_table
+        snapshot.extensions = self.extensions
+        snapshot.encoders = self.encoders
+        snapshot.session_key = self.session_key
+
+        return snapshot
+
+    def get_row(self, row: int) -> Tuple[Schema, List[Any]]:
+        """ Schema of a row and its values in schema order, secrets are decrypted """
+        schema = self.schemas[row]
+        columns = self.columns
+
+        return schema, [self.reveal(columns[field][row]) for field in schema]
+
+    def serialize(self, row: int) -> str:
+        """ JSON object for a row, identical to dumps of Account.to_json """
+        schema = self.schemas[row]
+        if not schema:
+            return '{}'
+
+        columns = self.columns
+        parts = []
+        for prefix, field in zip(self.get_encoder(schema), schema):
+            value = self.reveal(columns[field][row])
+            parts.append(prefix)
+            parts.append(encode_basestring_ascii(value) if type(value) is str else dumps(value))
+
+        parts.append('}')
+        return ''.join(parts)
+
+
+def serialize_accounts(accounts: Iterable['Account']) -> Iterator[bytes]:
+    """ Serialize accounts to vault records in bulk, without reflection or per-object callbacks """
+    for account in accounts:
+        yield account._store.serialize(account._row).encode(_ENCODING)
+
+
+def snapshot_accounts(accounts: Iterable['Account'], schemas: SchemaTable = None) -> Iterator[bytes]:
+    """ Records of the accounts as they are now, serialized lazily so they can be written from another thread
+
+    Records are JSON unless a schema table is given to encode binary records with.
+    """
+    snapshots: Dict[int, AccountStore] = {}
+    rows: List[Tuple[AccountStore, int]] = []
+
+    for account in accounts:
+        store = account._store
+        snapshot = snapshots.get(id(store))
+        if snapshot is None:
+            snapshot = snapshots[id(store)] = store.snapshot()
+        rows.append((snapshot, account._row))
+
+    if schemas is not None:
+        return (schemas.encode(*store.get_row(row)) for store, row in rows)
+
+    return (store.serialize(row).encode(_ENCODING) for store, row in rows)
 
 
 class Account:
-    def __init__(self, package: dict = None):
+    """ Lightweight view of a row in an account store """
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, package: dict = None, store: AccountStore = None, row: int = None):
+        store = store if store is not None else AccountStore()
+        object.__setattr__(self, '_store', store)
+        object.__setattr__(self, '_row', row if row is not None else store.new_row())
+
         if package is not None:
             self.load(package)
 
-        self.options: Dict[str, Callable[[Optional[int]], None]] = {
-            'c': self.close,
-            'v': self.view_account,
-            'p': self.get_password,
-            'e': self.edit,
-            'h': self.help
-        }
+    def __getattr__(self, name: str) -> Any:
+        if name in Account.__slots__:     # Only reached before the slots are set
+            raise AttributeError(name)
+
+        value = self._store.get(self._row, name)
+        if value is _MISSING:
+            raise AttributeError(f'Account has no attribute {name}')
+
+        return value
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if hasattr(Account, name):    # Slots, methods and properties, storing them would add a column to every row
+            raise AttributeError(f'{name} is not an account field')
+
+        self._store.set(self._row, name, value)
+
+    @property
+    def options(self) -> Dict[str, Callable[[Optional[int]], None]]:
+        """ Interactive options, bound on access rather than stored on every account """
+        return {option: getattr(self, name) for option, name in _OPTIONS.items()}
 
     def load(self, data: dict) -> None:
-        """ Load data from dictionary """
+        """ Load data from dictionary, every key is a field even when named like a method """
+        store, row = self._store, self._row
         for key in data:
-            setattr(self, key, data[key])
+            store.set(row, key, data[key])
+
+    def replace(self, data: dict) -> None:
+        """ Replace every field with the data, reusing the account's row """
+        self._store.clear(self._row)
+        self.load(data)
 
     def close(self) -> None:
         """ No action required """
@@ -115,26 +354,18 @@ class Account:
         """ Used to help export object to json """
         attributes = self.get_attributes()
 
-        return {attribute: getattr(self, attribute) for attribute in attributes}
+        return {attribute: self._store.get(self._row, attribute) for attribute in attributes}
+
+    def to_public_json(self) -> Dict[str, Union[str, int]]:
+        """ Fields that are safe to show or send, secrets are left out """
+        return {attribute: value for attribute, value in self.to_json().items() if attribute not in _SKIP_ATTRIBUTES}
 
     def __str__(self) -> str:
         return getattr(self, 'name')
 
-    def get_attributes(self) -> List:
+    def get_attributes(self) -> Schema:
         """ Get account attributes """
-        attributes = []
-
-        for attribute in dir(self):
-            actual = getattr(self, attribute)
-
-            is_builtin = builtin_pattern.match(attribute) is not None
-            is_callable = callable(actual)
-            if is_builtin or is_callable:
-                continue
-
-            attributes.append(attribute)
-
-        return attributes
+        return self._store.fields(self._row)
 
     def get_password(self) -> None:
         """ Password accessor """
@@ -153,4 +384,4 @@ class Account:
         name = getattr(self, 'name')
         login = getattr(self, 'login')
 
-        return search_term in name or login
+        return search_term in name or search_term in login
@@ -0,0 +1,186 @@
+from asyncio import Event, StreamReader, StreamWriter, get_running_loop, start_unix_server, wait_for, TimeoutError
+from json import dumps, loads
+from os import chmod, umask
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from plain_sight.agent_client import AgentError, request
+from plain_sight.log import get_logger
+from plain_sight.plain_sight import PlainSight
+
+
+_ENCODING = 'utf8'
+_SEARCH_LIMIT = 10
+
+logger = get_logger('agent')
+
+Signature = Tuple[Optional[Tuple[int, int]], ...]
+
+
+def get_signature(plain_sight: PlainSight) -> Signature:
+    """ Modification time and size of the vault and its journals, changes when another process saves """
+    paths = (plain_sight.vault_path, plain_sight.journal.path, plain_sight.journal.compacting_path)
+
+    signature = []
+    for path in paths:
+        try:
+            status = path.stat()
+            signature.append((status.st_mtime_ns, status.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+
+    return tuple(signature)
+
+
+class Agent:
+    """ Keeps an unlocked vault in memory and answers requests from local clients until it is left idle """
+    def __init__(self, plain_sight: PlainSight, idle_timeout: float):
+        self.plain_sight = plain_sight
+        self.idle_timeout = idle_timeout
+        self.signature = get_signature(plain_sight)
+        self.vault = str(plain_sight.vault_path.resolve())
+
+        self.last_used = 0.0
+        self.stopped: Optional[Event] = None
+        self.clients: Set[StreamWriter] = set()
+
+        self.commands: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            'get': self.get,
+            'search': self.search,
+            'status': self.status,
+            'stop': self.stop
+        }
+
+    def refresh(self) -> None:
+        """ Reload the vault if another process saved to it since it was read """
+        signature = get_signature(self.plain_sight)
+        if signature == self.signature:
+            return
+
+        try:
+            self.plain_sight.reload()
+        except ValueError as e:
+            raise AgentError(f'Could not reload {self.vault}, restart the agent. {e}')
+
+        self.signature = signature
+        logger.info('Reloaded %s.', self.vault)
+
+    def get(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """ A field of the account with exactly the given name, or the whole account """
+        name = str(message.get('name', ''))
+        field = str(message.get('field', 'password'))
+
+        account = self.plain_sight.name_index.find(name, exact=True)
+        if account is None:
+            raise AgentError(f'No account named {name!r}.')
+        if message.get('json'):
+            return {'account': account.to_json()}
+
+        value = getattr(account, field) if field in account.get_attributes() else None
+        if value is None:
+            raise AgentError(f'Account {name!r} has no field {field!r}.')
+
+        return {'value': value}
+
+    def search(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """ Best matching accounts without secrets """
+        accounts = self.plain_sight.search_index.search(str(message.get('term', '')),
+                                                        int(message.get('limit', _SEARCH_LIMIT)))
+
+        return {'accounts': [account.to_public_json() for account in accounts]}
+
+    def status(self, _: Dict[str, Any]) -> Dict[str, Any]:
+        """ Number of accounts served """
+        return {'accounts': len(self.plain_sight.accounts)}
+
+    def stop(self, _: Dict[str, Any]) -> Dict[str, Any]:
+        """ Shut the agent down once the response is sent """
+        self.stopped.set()
+        return {}
+
+    def respond(self, line: bytes) -> Dict[str, Any]:
+        """ Answer a single request, errors are reported to the client rather than raised """
+        try:
+            message = loads(line.decode(_ENCODING))
+            if not isinstance(message, dict):
+                raise AgentError('Requests must be JSON objects.')
+
+            command = self.commands.get(message.get('command'))
+            if command is None:
+                raise AgentError(f'Unknown command {message.get("command")!r}.')
+
+            self.refresh()
+            return {'ok': True, 'vault': self.vault, **command(message)}
+        except (AgentError, ValueError) as e:
+            return {'ok': False, 'vault': self.vault, 'error': str(e)}
+
+    async def handle(self, reader: StreamReader, writer: StreamWriter) -> None:
+        """ Serve newline-delimited JSON requests from one client """
+        loop = get_running_loop()
+        self.clients.add(writer)
+
+        try:
+            while not self.stopped.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+
+                self.last_used = loop.time()
+                writer.write(dumps(self.respond(line)).encode(_ENCODING) + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:     # Disconnects and requests over the line limit
+            logger.debug('Dropping client: %s', e)
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def serve(self, socket_path: Path) -> None:
+        """ Listen on a socket only the current user can connect to until idle or stopped """
+        loop = get_running_loop()
+        self.stopped = Event()
+        self.last_used = loop.time()
+
+        if socket_path.exists():
+            try:
+                request(socket_path, {'command': 'status'})
+            except OSError:
+                socket_path.unlink()    # Left behind by an agent that did not shut down cleanly
+            else:
+                raise AgentError(f'An agent is already listening on {socket_path}.')
+
+        # The socket is created without group or other permissions rather than restricted after it is bound
+        previous_umask = umask(0o177)
+        try:
+            server = await start_unix_server(self.handle, path=str(socket_path))
+        finally:
+            umask(previous_umask)
+        chmod(socket_path, 0o600)
+
+        logger.info('Serving %s on %s.', self.vault, socket_path)
+        try:
+            async with server:
+                await self.watch()
+
+                # Idle clients would otherwise keep the server from closing
+                for client in list(self.clients):
+                    client.close()
+        finally:
+            if socket_path.exists():
+                socket_path.unlink()
+
+            # Drop the decrypted accounts and the key as soon as the agent stops serving
+            del self.plain_sight
+
+    async def watch(self) -> None:
+        """ Return once a client asks the agent to stop or no request arrived within the idle timeout """
+        loop = get_running_loop()
+
+        while not self.stopped.is_set():
+            remaining = self.last_used + self.idle_timeout - loop.time()
+            if remaining <= 0:
+                logger.info('Idle for %.0f seconds, shutting down.', self.idle_timeout)
+                return
+
+            try:
+                await wait_for(self.stopped.wait(), remaining)
+            except TimeoutError:
+                pass
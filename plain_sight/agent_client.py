@@ -0,0 +1,48 @@
+from json import dumps, loads
+from os import getuid
+from pathlib import Path
+from socket import socket, AF_UNIX, SOCK_STREAM
+from tempfile import gettempdir
+from typing import Any, Dict
+
+
+_SOCKET_NAME = 'agent.sock'
+_ENCODING = 'utf8'
+_PRIVATE_MODE = 0o077
+
+
+class AgentError(Exception):
+    """ A request could not be answered, the message is sent back to the client """
+
+
+def socket_directory() -> Path:
+    """ Per-user directory for agent sockets, refused unless it is private to the current user """
+    directory = Path(gettempdir()) / f'plain-sight-{getuid()}'
+    directory.mkdir(mode=0o700, exist_ok=True)
+
+    status = directory.lstat()
+    if directory.is_symlink() or status.st_uid != getuid() or status.st_mode & _PRIVATE_MODE:
+        raise AgentError(f'{directory} must be a directory only the current user can access.')
+
+    return directory
+
+
+def default_socket_path() -> Path:
+    """ Socket the agent listens on when no path is given """
+    return socket_directory() / _SOCKET_NAME
+
+
+def request(socket_path: Path, message: Dict[str, Any], timeout: float = 5.0) -> Dict[str, Any]:
+    """ Send a single request to a running agent and return its response, raises OSError if it is unreachable """
+    with socket(AF_UNIX, SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(str(socket_path))
+        connection.sendall(dumps(message).encode(_ENCODING) + b'\n')
+
+        with connection.makefile('rb') as response:
+            line = response.readline()
+
+    if not line:
+        raise ConnectionError(f'Agent at {socket_path} closed the connection.')
+
+    return loads(line.decode(_ENCODING))
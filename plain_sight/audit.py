@@ -0,0 +1,141 @@
+from hashlib import blake2b
+from json import loads
+from pathlib import Path
+from secrets import token_bytes
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from plain_sight.compression import Codec
+from plain_sight.encryption import decrypt_data, estimate_entropy, Key
+from plain_sight.file_io import map_file
+from plain_sight.journal import Journal
+from plain_sight.log import get_logger
+from plain_sight.records import get_decoder, JSON_RECORDS
+from plain_sight.vault import is_record_vault, read_codec, read_header, read_index, unlock
+from plain_sight.workers import count_workers, get_state, iter_chunks, map_chunks, worker_pool
+
+
+DEFAULT_MIN_BITS = 60.0     # About ten random characters drawn from every character class
+_CHUNK_RECORDS = 4096
+_REUSE_KEY_LENGTH = 32
+_DIGEST_SIZE = 16           # Collisions stay negligible for any number of accounts a vault could hold
+_ENCODING = 'utf8'
+
+logger = get_logger('audit')
+
+
+class AuditRow(NamedTuple):
+    """ What the audit keeps of an account, the password only as a keyed hash and an entropy estimate """
+    name: str
+    login: str
+    digest: Optional[bytes]
+    bits: Optional[float]
+
+
+def audit_fields(fields: Dict[str, Any], reuse_key: bytes) -> AuditRow:
+    """ Audit row of an account's fields, accounts without a password have no digest """
+    password = fields.get('password')
+    name, login = str(fields.get('name', '')), str(fields.get('login', ''))
+
+    if not isinstance(password, str):
+        return AuditRow(name, login, None, None)
+
+    digest = blake2b(password.encode(_ENCODING), key=reuse_key, digest_size=_DIGEST_SIZE).digest()
+    return AuditRow(name, login, digest, estimate_entropy(password))
+
+
+def audit_chunk(records: List[bytes]) -> List[AuditRow]:
+    """ Audit rows of encrypted records, run by workers started with the vault key, codec, schemas and reuse key """
+    key, compression, dictionary, record_format, schemas, reuse_key = get_state()
+    codec = Codec(compression, dictionary)
+    decode = get_decoder(record_format, schemas)
+    rows = []
+
+    for record in records:
+        fields, values = decode(codec.decompress(decrypt_data(key, record)))
+        rows.append(audit_fields(dict(zip(fields, values)), reuse_key))
+
+    return rows
+
+
+def iter_rows(vault_path: Path, password: Key, reuse_key: bytes, workers: int = None) -> Iterator[AuditRow]:
+    """ Audit rows of every account in vault order, records are decrypted and checked across worker processes so
+    plaintext never leaves them """
+    if not is_record_vault(vault_path):
+        from plain_sight.plain_sight import PlainSight
+
+        for account in PlainSight(vault_path, password).accounts:
+            yield audit_fields(account.to_json(), reuse_key)
+        return
+
+    with map_file(vault_path) as view:
+        header = read_header(view)
+        key = unlock(header, password)
+        index, _ = read_index(view, key)
+        entries = index['records']
+        codec = read_codec(header, index)
+
+        # Edits journaled since the vault was written replace its records or follow them
+        edits = {position: audit_fields(loads(record.decode(_ENCODING)), reuse_key)
+                 for position, record in Journal(vault_path, key, index.get('journal', ())).replay()}
+
+        state = (key, codec.name, codec.dictionary, header.get('records', JSON_RECORDS), index.get('schemas', []),
+                 reuse_key)
+        workers = count_workers(workers, len(entries), _CHUNK_RECORDS)
+        position = 0
+
+        with worker_pool(state, workers) as executor:
+            for rows in map_chunks(executor, audit_chunk, iter_chunks(view, entries, _CHUNK_RECORDS), workers):
+                for row in rows:
+                    yield edits.pop(position, row)
+                    position += 1
+
+    while position in edits:
+        yield edits.pop(position)
+        position += 1
+
+    if edits:
+        logger.warning('Skipping journal entries for %d missing records.', len(edits))
+
+
+def iter_report(rows: Iterable[AuditRow], min_bits: float) -> Iterator[Dict[str, Any]]:
+    """ Findings without secrets, weak passwords as they are found, reused ones once every account was seen, then a
+    summary """
+    accounts: List[Tuple[str, str]] = []
+    reuse: Dict[bytes, List[int]] = {}
+    weak = without_password = 0
+
+    for row in rows:
+        if row.digest is None:
+            without_password += 1
+            continue
+
+        reuse.setdefault(row.digest, []).append(len(accounts))
+        accounts.append((row.name, row.login))
+
+        if row.bits < min_bits:
+            weak += 1
+            yield {'issue': 'weak', 'name': row.name, 'login': row.login, 'bits': round(row.bits, 1)}
+
+    reused = 0
+    for positions in reuse.values():
+        if len(positions) > 1:
+            reused += len(positions)
+            yield {'issue': 'reused', 'accounts': [
+                {'name': accounts[position][0], 'login': accounts[position][1]} for position in positions
+            ]}
+
+    yield {'summary': {
+        'accounts': len(accounts) + without_password, 'without_password': without_password, 'weak': weak,
+        'reused': reused
+    }}
+
+
+def audit_vault(vault_path: Union[Path, str], password: Key, min_bits: float = DEFAULT_MIN_BITS,
+                workers: int = None) -> Iterator[Dict[str, Any]]:
+    """ Stream a report of weak and reused passwords
+
+    Reuse is found in one pass over keyed BLAKE2 hashes, a MAC like HMAC at a third of the cost. The key is made for
+    this audit only, so the index can't be compared against hashes of known passwords.
+    """
+    reuse_key = token_bytes(_REUSE_KEY_LENGTH)
+
+    return iter_report(iter_rows(Path(vault_path), password, reuse_key, workers), min_bits)
@@ -0,0 +1,65 @@
+from threading import Lock, Timer
+from typing import Any, Callable, Dict, Optional
+from plain_sight.log import get_logger
+
+
+logger = get_logger('autosave')
+
+
+class Autosaver:
+    """ Debounced background writer, changes handed over by the editing thread are written together on a timer
+
+    The editing thread may hand over a snapshot of the whole vault with the changes, it is passed to the writer as is and
+    a later snapshot replaces an earlier one.
+    """
+    def __init__(self, write: Callable[[Dict[int, bytes], Any], None], delay: float):
+        self.write = write
+        self.delay = delay
+
+        self.pending: Dict[int, bytes] = {}
+        self.snapshot: Any = None
+        self.timer: Optional[Timer] = None
+        self.lock = Lock()          # Guards pending, snapshot and timer
+        self.write_lock = Lock()    # One write at a time, in the order changes were made
+
+    def schedule(self, changes: Dict[int, bytes], snapshot: Any = None) -> None:
+        """ Queue changes and restart the delay, later changes to a record replace earlier ones """
+        with self.lock:
+            self.pending.update(changes)
+            if snapshot is not None:
+                self.snapshot = snapshot
+
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self, raise_errors: bool = False) -> None:
+        """ Write every queued change now, a failed write is logged by the timer and raised when asked to """
+        with self.write_lock:
+            with self.lock:
+                changes, self.pending = self.pending, {}
+                snapshot, self.snapshot = self.snapshot, None
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+
+            if not changes:
+                return
+
+            try:
+                self.write(changes, snapshot)
+            except Exception as e:
+                # Nothing is lost, the changes are written with the next save
+                logger.error('Autosave failed.', exc_info=e)
+                with self.lock:
+                    self.pending = {**changes, **self.pending}
+                    if self.snapshot is None:
+                        self.snapshot = snapshot
+
+                if raise_errors:
+                    raise
+                return
+
+            logger.debug('Autosaved %d records.', len(changes))
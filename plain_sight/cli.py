@@ -0,0 +1,540 @@
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from itertools import islice
+from json import dumps
+from os import environ
+from pathlib import Path
+from sys import stderr, stdin
+from typing import List, Optional, Tuple
+from plain_sight.encryption import generate_passwords, generate_password, CHARACTER_CLASSES, _PASSWORD_LENGTH
+from plain_sight.account import _SKIP_ATTRIBUTES
+from plain_sight.config import get_config
+from plain_sight import timing
+
+
+PASSWORD_VARIABLE = 'PLAIN_SIGHT_PASSWORD'
+NEW_PASSWORD_VARIABLE = 'PLAIN_SIGHT_NEW_PASSWORD'
+AGENT_VARIABLE = 'PLAIN_SIGHT_AGENT'
+_DEFAULT_LIMIT = 10
+_TRANSFER_FORMATS = ('csv', 'json')     # Kept here so building the parser doesn't import transfer
+
+
+class CommandError(Exception):
+    """ A command could not be completed, the message is shown to the user """
+
+
+def character_classes(value: str) -> List[str]:
+    """ Parse a comma separated list of character classes """
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def field(value: str) -> Tuple[str, str]:
+    """ Parse a key=value account field, secrets are never accepted on the command line """
+    key, separator, field_value = value.partition('=')
+    if not separator or not key:
+        raise ArgumentTypeError(f'Expected key=value, got {value!r}.')
+    if key in _SKIP_ATTRIBUTES:
+        raise ArgumentTypeError(f'{key} can not be given on the command line, see --password-stdin.')
+
+    return key, field_value
+
+
+def read_secret(descriptor: Optional[int], variable: str, option: str) -> str:
+    """ First line of the given file descriptor, otherwise the environment variable """
+    if descriptor is not None:
+        with open(descriptor, closefd=False) as fl:
+            return fl.readline().rstrip('\n')
+
+    secret = environ.get(variable)
+    if secret is None:
+        raise CommandError(f'No master password, use {option} or set {variable}.')
+
+    return secret
+
+
+def read_password(args: Namespace) -> str:
+    """ Master password from the given file descriptor, otherwise from the environment """
+    return read_secret(args.password_fd, PASSWORD_VARIABLE, '--password-fd')
+
+
+def get_vault_path(args: Namespace) -> Path:
+    """ Vault given on the command line, otherwise the one in the config """
+    return args.vault if args.vault is not None else Path(get_config().key_file)
+
+
+def open_vault(args: Namespace, create: bool = False, password: str = None):
+    """ Open the vault without prompting, only commands that add accounts may create it """
+    # Deferred so that commands which never decrypt skip importing the vault machinery
+    from plain_sight.encryption import DecryptionError
+    from plain_sight.plain_sight import PlainSight
+
+    vault_path = get_vault_path(args)
+    if not create and not vault_path.exists():
+        raise CommandError(f'Vault {vault_path} does not exist.')
+
+    try:
+        return PlainSight(vault_path, password if password is not None else read_password(args))
+    except DecryptionError:
+        raise CommandError('Invalid password or corrupted vault.')
+
+
+def read_account(args: Namespace):
+    """ Account with exactly the given name, only its record is decrypted when the vault indexes names """
+    # Deferred so that commands which never decrypt skip importing the vault machinery
+    from plain_sight.encryption import DecryptionError
+    from plain_sight.plain_sight import PlainSight
+
+    vault_path = get_vault_path(args)
+    if not vault_path.exists():
+        raise CommandError(f'Vault {vault_path} does not exist.')
+
+    password = read_password(args)
+    try:
+        account = PlainSight.read_account(vault_path, password, args.name)
+    except LookupError:
+        return find_account(open_vault(args, password=password), args.name)
+    except DecryptionError:
+        raise CommandError('Invalid password or corrupted vault.')
+
+    if account is None:
+        raise CommandError(f'No account named {args.name!r}.')
+
+    return account
+
+
+def ask_agent(args: Namespace, message: dict) -> Optional[dict]:
+    """ Response of an agent serving this vault, None when there is none and the vault has to be opened """
+    socket_path = environ.get(AGENT_VARIABLE)
+    if not socket_path:
+        return None
+
+    from plain_sight.agent_client import request
+
+    try:
+        response = request(Path(socket_path), message)
+    except (OSError, ValueError) as e:
+        print(f'Agent at {socket_path} is unavailable, opening the vault: {e}', file=stderr)
+        return None
+
+    if response.get('vault') != str(get_vault_path(args).resolve()):
+        return None
+    if not response.get('ok'):
+        raise CommandError(response.get('error'))
+
+    return response
+
+
+def find_account(plain_sight, name: str):
+    """ Account with exactly this name, ignoring case """
+    account = plain_sight.name_index.find(name, exact=True)
+    if account is None:
+        raise CommandError(f'No account named {name!r}.')
+
+    return account
+
+
+def new_password(args: Namespace) -> Optional[str]:
+    """ Password given on stdin or generated, None when neither was asked for """
+    if args.password_stdin:
+        return stdin.readline().rstrip('\n')
+    if args.generate is not None:
+        try:
+            return generate_password(args.generate)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    return None
+
+
+def save(plain_sight, account) -> None:
+    """ Persist an edited account and wait for any background write """
+    plain_sight.set_update_flag(account)
+    try:
+        plain_sight.save_data()
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Could not save {plain_sight.vault_path}: {e}')
+    plain_sight.journal.wait()
+
+
+def generate(args: Namespace) -> int:
+    """ Print generated passwords, one per line """
+    try:
+        passwords = generate_passwords(args.count, args.length, args.classes, args.require, args.no_ambiguous)
+    except ValueError as e:
+        raise CommandError(str(e))
+
+    print('\n'.join(passwords))
+    return 0
+
+
+def get(args: Namespace) -> int:
+    """ Print a single field of an account, or the whole account as JSON """
+    response = ask_agent(args, {'command': 'get', 'name': args.name, 'field': args.field, 'json': args.json})
+    if response is not None:
+        print(dumps(response['account']) if args.json else response['value'])
+        return 0
+
+    account = read_account(args)
+
+    if args.json:
+        print(dumps(account.to_json()))
+        return 0
+
+    # Only data fields, never attributes or methods of the account object
+    value = getattr(account, args.field) if args.field in account.get_attributes() else None
+    if value is None:
+        raise CommandError(f'Account {args.name!r} has no field {args.field!r}.')
+
+    print(value)
+    return 0
+
+
+def list_accounts(args: Namespace) -> int:
+    """ Print every account without secrets, one JSON object per line """
+    for account in open_vault(args).accounts:
+        print(dumps(account.to_public_json()))
+
+    return 0
+
+
+def search(args: Namespace) -> int:
+    """ Print the best matching accounts without secrets, one JSON object per line """
+    response = ask_agent(args, {'command': 'search', 'term': args.term, 'limit': args.limit})
+    if response is not None:
+        for account in response['accounts']:
+            print(dumps(account))
+        return 0
+
+    for account in open_vault(args).search_index.search(args.term, args.limit):
+        print(dumps(account.to_public_json()))
+
+    return 0
+
+
+def read_passwords(args: Namespace, count: int) -> List[str]:
+    """ One master password per vault, one per line from the file descriptor or the same one for every vault """
+    if args.password_fd is None:
+        return [read_password(args)] * count
+
+    with open(args.password_fd, closefd=False) as fl:
+        passwords = [line.rstrip('\n') for line in islice(fl, count)]
+
+    if len(passwords) == 1:
+        return passwords * count
+    if len(passwords) != count:
+        raise CommandError(f'Expected 1 or {count} master passwords, got {len(passwords)}.')
+
+    return passwords
+
+
+def report_failure(vault_path: Path, error: Exception) -> None:
+    """ Tell the user a vault was skipped and why """
+    print(f'Skipped {vault_path}: {str(error) or type(error).__name__}', file=stderr)
+
+
+def search_vaults(args: Namespace) -> int:
+    """ Search several vaults at once, results as JSON lines naming the vault of each account """
+    from plain_sight.vault_search import search_vaults as search_all
+
+    vaults = list(zip(args.vaults, read_passwords(args, len(args.vaults))))
+    failures = []
+
+    def fail(vault_path: Path, error: Exception) -> None:
+        failures.append(vault_path)
+        report_failure(vault_path, error)
+
+    for vault_path, account in search_all(vaults, args.term, args.limit, args.workers, fail):
+        print(dumps({'vault': str(vault_path), **account.to_public_json()}))
+
+    return 1 if len(failures) == len(vaults) else 0
+
+
+def add(args: Namespace) -> int:
+    """ Add an account, a password is generated unless one is given on stdin """
+    # Deferred so that commands which never add accounts skip importing the transfer formats
+    from plain_sight.transfer import validate
+
+    fields = dict(args.fields)
+    for key in ('name', 'login'):
+        if key in fields:
+            raise CommandError(f'The {key} is given by its own argument, not by --set.')
+
+    reason = validate({'name': args.name, 'login': args.login, 'password': '', **fields})
+    if reason is not None:
+        raise CommandError(f'Can not add {args.name!r}, {reason}.')
+
+    plain_sight = open_vault(args, create=True)
+    if plain_sight.name_index.find(args.name, exact=True) is not None:
+        raise CommandError(f'Account {args.name!r} already exists.')
+
+    password = new_password(args)
+    data = {'name': args.name, 'login': args.login, **fields}
+    data['password'] = password if password is not None else generate_password(_PASSWORD_LENGTH)
+
+    account = plain_sight.store.add(data)
+    plain_sight.accounts.append(account)
+    save(plain_sight, account)
+
+    print(dumps(account.to_public_json()))
+    return 0
+
+
+def set_fields(args: Namespace) -> int:
+    """ Change fields of an existing account """
+    plain_sight = open_vault(args)
+    account = find_account(plain_sight, args.name)
+
+    password = new_password(args)
+    if not args.fields and password is None:
+        raise CommandError('Nothing to change.')
+
+    for key, value in args.fields:
+        try:
+            setattr(account, key, value)
+        except AttributeError as e:
+            raise CommandError(str(e)) from e
+    if password is not None:
+        account.password = password
+
+    save(plain_sight, account)
+
+    print(dumps(account.to_public_json()))
+    return 0
+
+
+def report_rejection(number: int, reason: str) -> None:
+    """ Tell the user which record was skipped, the record itself may hold secrets and is never shown """
+    print(f'Skipped record {number}: {reason}.', file=stderr)
+
+
+def import_file(args: Namespace) -> int:
+    """ Add every new account of an export and save the vault once """
+    from plain_sight.transfer import import_accounts, read_records, SaveError
+
+    if not args.path.is_file():
+        raise CommandError(f'{args.path} does not exist.')
+
+    plain_sight = open_vault(args, create=True)
+    try:
+        result = import_accounts(plain_sight, read_records(args.path, args.format), report_rejection)
+    except ValueError as e:
+        raise CommandError(f'Could not read {args.path}, nothing was imported: {e}')
+    except SaveError as e:
+        raise CommandError(f'{e}, nothing was imported.')
+
+    print(dumps(result._asdict()))
+    return 0
+
+
+def export_file(args: Namespace) -> int:
+    """ Write every account, including passwords, to a file """
+    from plain_sight.transfer import export_accounts
+
+    plain_sight = open_vault(args)
+    try:
+        count = export_accounts(plain_sight.accounts, args.path, args.format)
+    except ValueError as e:
+        raise CommandError(str(e))
+
+    print(f'Exported {count} accounts to {args.path}.', file=stderr)
+    return 0
+
+
+def report_progress(stage: str, done: int, total: int) -> None:
+    """ Overwrite a single progress line on stderr, ended once the stage completes """
+    print(f'\r{stage.capitalize()} {done}/{total} records', end='\n' if done == total else '', file=stderr, flush=True)
+
+
+def rekey(args: Namespace) -> int:
+    """ Re-encrypt the vault under a new master password, the vault is only replaced once the result is verified """
+    from plain_sight.encryption import DecryptionError
+    from plain_sight.plain_sight import PlainSight
+    from plain_sight.rekey import rekey_vault
+
+    vault_path = get_vault_path(args)
+    if not vault_path.exists():
+        raise CommandError(f'Vault {vault_path} does not exist.')
+
+    password = read_password(args)
+    new_password = read_secret(args.new_password_fd, NEW_PASSWORD_VARIABLE, '--new-password-fd')
+    if not new_password:
+        raise CommandError('The new master password is empty.')
+
+    try:
+        count = rekey_vault(vault_path, password, PlainSight.new_key(new_password), args.workers, report_progress)
+    except DecryptionError:
+        raise CommandError('Invalid password or corrupted vault.')
+    except ValueError as e:
+        raise CommandError(str(e))
+
+    print(f'Re-keyed {count} records of {vault_path}.', file=stderr)
+    return 0
+
+
+def audit(args: Namespace) -> int:
+    """ Print weak and reused passwords as JSON lines naming the accounts, never the passwords """
+    from plain_sight.audit import audit_vault, DEFAULT_MIN_BITS
+    from plain_sight.encryption import DecryptionError
+
+    vault_path = get_vault_path(args)
+    if not vault_path.exists():
+        raise CommandError(f'Vault {vault_path} does not exist.')
+
+    min_bits = args.min_bits if args.min_bits is not None else DEFAULT_MIN_BITS
+    try:
+        for finding in audit_vault(vault_path, read_password(args), min_bits, args.workers):
+            print(dumps(finding))
+    except DecryptionError:
+        raise CommandError('Invalid password or corrupted vault.')
+    except ValueError as e:
+        raise CommandError(str(e))
+
+    return 0
+
+
+def agent(args: Namespace) -> int:
+    """ Unlock the vault once and serve it to local clients until idle """
+    from asyncio import run
+    from plain_sight.agent import Agent
+    from plain_sight.agent_client import AgentError, default_socket_path
+
+    try:
+        socket_path = args.socket if args.socket is not None else default_socket_path()
+        timeout = args.timeout if args.timeout is not None else get_config().agent_idle_timeout
+
+        vault_agent = Agent(open_vault(args), timeout)
+        print(f'{AGENT_VARIABLE}={socket_path}; export {AGENT_VARIABLE};', flush=True)
+
+        run(vault_agent.serve(socket_path))
+    except AgentError as e:
+        raise CommandError(str(e))
+
+    return 0
+
+
+def add_vault_arguments(parser: ArgumentParser) -> None:
+    """ Arguments shared by every command that opens the vault """
+    parser.add_argument('--vault', type=Path, help='vault path [key_file from the config]')
+    parser.add_argument('--password-fd', type=int, metavar='FD',
+                        help=f'read the master password from this file descriptor instead of {PASSWORD_VARIABLE}')
+
+
+def add_password_arguments(parser: ArgumentParser) -> None:
+    """ Arguments for commands that set an account password """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--password-stdin', action='store_true', help='read the account password from stdin')
+    group.add_argument('--generate', type=int, metavar='LENGTH', help='generate a password of this length')
+
+
+def build_parser() -> ArgumentParser:
+    """ Parser for the non-interactive commands """
+    parser = ArgumentParser(prog='plain_sight', description='Simple terminal-based password manager.')
+    parser.add_argument('--profile', action='store_true', help='print a per-stage timing breakdown to stderr')
+    parser.add_argument('--profile-memory', action='store_true', help='also trace peak memory of every stage')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='generate passwords')
+    generate_parser.add_argument('-n', '--count', type=int, default=1, help='number of passwords')
+    generate_parser.add_argument('-l', '--length', type=int, default=_PASSWORD_LENGTH, help='password length')
+    generate_parser.add_argument('--classes', type=character_classes, default=list(CHARACTER_CLASSES),
+                                 help=f'character classes to draw from [{",".join(CHARACTER_CLASSES)}]')
+    generate_parser.add_argument('--require', type=character_classes, default=[],
+                                 help='character classes every password must contain')
+    generate_parser.add_argument('--no-ambiguous', action='store_true', help='exclude look-alike characters')
+    generate_parser.set_defaults(handler=generate)
+
+    get_parser = commands.add_parser('get', help='print a field of an account')
+    get_parser.add_argument('name', help='account name')
+    get_parser.add_argument('-f', '--field', default='password', help='field to print [password]')
+    get_parser.add_argument('--json', action='store_true', help='print the whole account as JSON')
+    add_vault_arguments(get_parser)
+    get_parser.set_defaults(handler=get)
+
+    list_parser = commands.add_parser('list', help='list accounts as JSON lines')
+    add_vault_arguments(list_parser)
+    list_parser.set_defaults(handler=list_accounts)
+
+    search_parser = commands.add_parser('search', help='search accounts, results as JSON lines')
+    search_parser.add_argument('term', help='search term')
+    search_parser.add_argument('-n', '--limit', type=int, default=_DEFAULT_LIMIT, help='maximum number of results')
+    add_vault_arguments(search_parser)
+    search_parser.set_defaults(handler=search)
+
+    search_vaults_parser = commands.add_parser('search-vaults', help='search several vaults at once')
+    search_vaults_parser.add_argument('term', help='search term')
+    search_vaults_parser.add_argument('vaults', type=Path, nargs='+', metavar='VAULT', help='vault paths')
+    search_vaults_parser.add_argument('-n', '--limit', type=int, default=_DEFAULT_LIMIT,
+                                      help='maximum number of results over all vaults')
+    search_vaults_parser.add_argument('--workers', type=int, help='vaults opened at once [one per CPU]')
+    search_vaults_parser.add_argument('--password-fd', type=int, metavar='FD',
+                                      help=f'read master passwords from this file descriptor, one line per vault or a '
+                                           f'single line for all, instead of {PASSWORD_VARIABLE}')
+    search_vaults_parser.set_defaults(handler=search_vaults)
+
+    add_parser = commands.add_parser('add', help='add an account')
+    add_parser.add_argument('name', help='account name')
+    add_parser.add_argument('--login', default='', help='login name')
+    add_parser.add_argument('-s', '--set', type=field, action='append', default=[], dest='fields',
+                            metavar='KEY=VALUE', help='extra field, may be repeated')
+    add_password_arguments(add_parser)
+    add_vault_arguments(add_parser)
+    add_parser.set_defaults(handler=add)
+
+    set_parser = commands.add_parser('set', help='change fields of an account')
+    set_parser.add_argument('name', help='account name')
+    set_parser.add_argument('-s', '--set', type=field, action='append', default=[], dest='fields',
+                            metavar='KEY=VALUE', help='field to change, may be repeated')
+    add_password_arguments(set_parser)
+    add_vault_arguments(set_parser)
+    set_parser.set_defaults(handler=set_fields)
+
+    import_parser = commands.add_parser('import', help='import accounts from a CSV or JSON export')
+    import_parser.add_argument('path', type=Path, help='file exported by this or another password manager')
+    import_parser.add_argument('--format', choices=_TRANSFER_FORMATS, help='file format [from the extension]')
+    add_vault_arguments(import_parser)
+    import_parser.set_defaults(handler=import_file)
+
+    export_parser = commands.add_parser('export', help='export accounts, including passwords, as CSV or JSON')
+    export_parser.add_argument('path', type=Path, help='file to write, readable only by you, - for stdout')
+    export_parser.add_argument('--format', choices=_TRANSFER_FORMATS, help='file format [from the extension]')
+    add_vault_arguments(export_parser)
+    export_parser.set_defaults(handler=export_file)
+
+    rekey_parser = commands.add_parser('rekey', help='change the master password, re-encrypting every record')
+    rekey_parser.add_argument('--new-password-fd', type=int, metavar='FD',
+                              help=f'read the new master password from this file descriptor instead of '
+                                   f'{NEW_PASSWORD_VARIABLE}')
+    rekey_parser.add_argument('--workers', type=int, help='worker processes [one per CPU]')
+    add_vault_arguments(rekey_parser)
+    rekey_parser.set_defaults(handler=rekey)
+
+    audit_parser = commands.add_parser('audit', help='report weak and reused passwords as JSON lines')
+    audit_parser.add_argument('--min-bits', type=float, metavar='BITS',
+                              help='estimated entropy below which a password is weak [60]')
+    audit_parser.add_argument('--workers', type=int, help='worker processes for large vaults [one per CPU]')
+    add_vault_arguments(audit_parser)
+    audit_parser.set_defaults(handler=audit)
+
+    agent_parser = commands.add_parser('agent', help='serve the unlocked vault to local clients over a socket')
+    agent_parser.add_argument('--socket', type=Path, help='socket path [a private per-user directory]')
+    agent_parser.add_argument('--timeout', type=float, help='seconds without requests before shutting down')
+    add_vault_arguments(agent_parser)
+    agent_parser.set_defaults(handler=agent)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Run a single non-interactive command """
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_memory:
+        timing.enable(memory=args.profile_memory)
+
+    try:
+        return args.handler(args)
+    except CommandError as e:
+        print(e, file=stderr)
+        return 1
+    finally:
+        if timing.is_enabled():
+            print(timing.report(), file=stderr)
+            timing.disable()
@@ -1,5 +1,5 @@
 from re import fullmatch
-from typing import Union
+from typing import Callable, List, Union
 
 
 def get_input(prompt: str, validation: str = '.+', default: Union[str, None] = None) -> Union[str, None]:
@@ -26,3 +26,25 @@ def get_yes_no(message: str) -> bool:
         response = get_input(f'{message} (y/n) ', r'[yn]')
 
     return response == 'y'
+
+
+def set_completer(complete: Callable[[str], List[str]]) -> bool:
+    """ Tab complete input with the given function, returns False when readline is unavailable """
+    try:
+        import readline
+    except ImportError:
+        return False
+
+    matches: List[str] = []
+
+    def completer(text: str, state: int) -> Union[str, None]:
+        if state == 0:
+            matches[:] = complete(text)
+
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer(completer)
+    readline.set_completer_delims('')   # Account names may contain spaces
+    readline.parse_and_bind('tab: complete')
+
+    return True
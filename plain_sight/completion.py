@@ -0,0 +1,57 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+from plain_sight.account import Account
+
+
+class NameIndex:
+    """ Account names kept sorted for prefix completion, maintained incrementally """
+    def __init__(self, accounts: Iterable[Account] = ()):
+        self.current: Dict[Account, str] = {account: str(account) for account in accounts}
+        self.keys: List[tuple] = sorted(
+            (name.lower(), name, id(account)) for account, name in self.current.items()
+        )
+        self.accounts: Dict[int, Account] = {id(account): account for account in self.current}
+
+    def update(self, account: Account) -> None:
+        """ Add a new account or re-sort an account whose name changed """
+        name = str(account)
+        previous = self.current.get(account)
+        if previous == name:
+            return
+
+        if previous is not None:
+            del self.keys[bisect_left(self.keys, (previous.lower(), previous, id(account)))]
+
+        self.current[account] = name
+        self.accounts[id(account)] = account
+        insort(self.keys, (name.lower(), name, id(account)))
+
+    def matches(self, prefix: str, limit: int = None) -> List[Account]:
+        """ Accounts whose name starts with the prefix, ignoring case, in name order """
+        prefix = prefix.lower()
+        index = bisect_left(self.keys, (prefix,))
+
+        accounts = []
+        while index < len(self.keys) and (limit is None or len(accounts) < limit):
+            key, _, account_id = self.keys[index]
+            if not key.startswith(prefix):
+                break
+
+            accounts.append(self.accounts[account_id])
+            index += 1
+
+        return accounts
+
+    def complete(self, prefix: str, limit: int = None) -> List[str]:
+        """ Names that complete the prefix """
+        return [str(account) for account in self.matches(prefix, limit)]
+
+    def find(self, name: str, exact: bool = False) -> Optional[Account]:
+        """ Account with exactly this name, or the only account starting with it unless exact is set """
+        candidates = self.matches(name, 2)
+
+        matched = [account for account in candidates if str(account).lower() == name.lower()]
+        if matched:
+            return matched[0]
+
+        return candidates[0] if len(candidates) == 1 and not exact else None
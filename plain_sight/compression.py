@@ -0,0 +1,83 @@
+from itertools import chain
+from lzma import compress as lzma_compress, decompress as lzma_decompress, FORMAT_RAW, FILTER_LZMA2, LZMAError
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Union
+from zlib import compressobj, decompressobj, DEFLATED, Z_BEST_COMPRESSION, error as ZlibError
+
+
+NO_COMPRESSION = 'none'
+CODECS = (NO_COMPRESSION, 'zlib', 'lzma')
+DEFAULT_CODEC = 'zlib'
+
+# Records are compressed one at a time so they stay individually readable, a few hundred bytes of JSON barely
+# compress alone, so zlib is primed with a dictionary of earlier records holding the repeated keys and values
+# A 16 KiB window is a third cheaper to prime per record than the full 32 KiB and only 4% larger
+_WINDOW_BITS = 14
+_DICTIONARY_SIZE = 1 << _WINDOW_BITS   # The deflate window, anything further back is never referenced
+_RAW_DEFLATE = -_WINDOW_BITS           # Without the zlib header and checksum, which would cost 6 bytes per record
+_MEMORY_LEVEL = 4                      # Smaller state makes copying the primed compressor cheaper, ratio is unchanged
+_LZMA_FILTERS = [{'id': FILTER_LZMA2, 'preset': 6, 'dict_size': 1 << 20}]
+
+
+class Codec:
+    """ Compression applied to every record before encryption and removed after decryption """
+    def __init__(self, name: str = NO_COMPRESSION, dictionary: bytes = b''):
+        if name not in CODECS:
+            raise ValueError(f'Unknown compression {name!r}, expected one of {", ".join(CODECS)}.')
+
+        self.name = name
+        self.dictionary = dictionary
+
+        # Priming hashes the whole dictionary, so it is done once and copied for every record
+        if name == 'zlib':
+            self.compressor = compressobj(Z_BEST_COMPRESSION, DEFLATED, _RAW_DEFLATE, _MEMORY_LEVEL, zdict=dictionary)
+
+    @staticmethod
+    def train(name: str, records: Iterable[bytes], redact: Callable[[bytes], Optional[bytes]] = None) \
+            -> Tuple['Codec', Iterator[bytes]]:
+        """ Codec with a dictionary sampled from the first records, returns the records still to be written
+
+        Records redacted to None are left out of the sample. Secrets must never reach the dictionary: a later record
+        holding the same secret would compress visibly smaller, so record sizes alone would reveal reuse.
+        """
+        records = iter(records)
+        if name != 'zlib':
+            return Codec(name), records
+
+        sample = []
+        size = 0
+        for record in records:
+            sample.append(record)
+            size += len(record)
+            if size >= _DICTIONARY_SIZE:
+                break
+
+        redacted = sample if redact is None else (record for record in map(redact, sample) if record is not None)
+        dictionary = b''.join(redacted)[-_DICTIONARY_SIZE:]
+        return Codec(name, dictionary), chain(sample, records)
+
+    def compress(self, record: bytes) -> bytes:
+        """ Compress a single record """
+        if self.name == 'zlib':
+            compressor = self.compressor.copy()
+            return compressor.compress(record) + compressor.flush()
+        if self.name == 'lzma':
+            return lzma_compress(record, FORMAT_RAW, filters=_LZMA_FILTERS)
+
+        return record
+
+    def decompress(self, data: Union[bytes, memoryview]) -> bytes:
+        """ Restore a single record """
+        try:
+            if self.name == 'zlib':
+                decompressor = decompressobj(_RAW_DEFLATE, zdict=self.dictionary)
+                record = decompressor.decompress(data)
+
+                if not decompressor.eof:
+                    raise ValueError('Truncated compressed record.')
+                return record
+            if self.name == 'lzma':
+                return lzma_decompress(data, FORMAT_RAW, filters=_LZMA_FILTERS)
+        except (ZlibError, LZMAError) as e:
+            raise ValueError(f'Corrupt compressed record: {e}')
+
+        return bytes(data)
@@ -0,0 +1,102 @@
+from functools import lru_cache
+from json import loads
+from os import environ
+from pathlib import Path
+from typing import Mapping, NamedTuple, Union
+from plain_sight.compression import CODECS
+from plain_sight.encryption import CIPHERS
+from plain_sight.records import RECORD_FORMATS
+
+
+CONFIG_FILENAME = 'config.json'
+CONFIG_TEMPLATE_FILENAME = 'config.template.json'
+_SEARCH_DEPTH = 3
+_CHOICES = {'compression': CODECS, 'cipher': CIPHERS, 'record_format': RECORD_FORMATS}
+
+
+class Config(NamedTuple):
+    """ Settings read from the config file, missing keys keep their defaults """
+    key_file: str = 'passwords.vault'
+    log_level: str = 'ERROR'
+    log_file: str = ''                  # Records are also appended here when set
+    max_search_results: int = 10
+    journal_threshold: int = 1 << 20
+    kdf_target_seconds: float = 0.0     # Zero uses the default KDF costs instead of calibrating
+    agent_idle_timeout: float = 900.0
+    autosave_delay: float = 0.0         # Seconds without edits before saving in the background, zero asks on close
+    compression: str = 'zlib'           # Codec records are compressed with when the vault is rewritten
+    record_format: str = 'binary'       # Encoding of records when the vault is rewritten, binary or json
+    cipher: str = 'aes-gcm'             # Cipher of new vaults, others are migrated on the next save
+
+
+def find_config(filename: Union[Path, str]) -> Path:
+    """ Look for the config in the current directory and up to its parents """
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    file_name = filename.name
+    full_path = filename.absolute().parent
+    for _ in range(_SEARCH_DEPTH):
+        if (full_path / file_name).exists():
+            break
+        full_path = full_path.parent
+
+    filename = full_path / file_name
+    if not filename.exists():
+        raise FileNotFoundError(f'Config file, {filename}, could not be found.')
+
+    return filename
+
+
+# Nothing is logged here as logger levels are themselves read from the config
+def load_config(filename: Union[Path, str] = CONFIG_FILENAME) -> dict:
+    """ Load config and parse to dict """
+    filename = find_config(filename)
+
+    try:
+        return loads(filename.read_bytes().decode('utf8'))
+    except (OSError, ValueError):
+        print(f'Error decoding config data from {filename}.')
+        return {}
+
+
+def parse_config(data: dict) -> Config:
+    """ Typed config from raw values, unknown keys are ignored and invalid or unsupported values keep their defaults """
+    field_types = Config.__annotations__
+    values = {}
+
+    for key, value in data.items():
+        if key not in field_types:
+            continue
+
+        try:
+            value = field_types[key](value)
+        except (TypeError, ValueError):
+            print(f'Invalid config value {value!r} for {key}, using the default.')
+            continue
+
+        if key in _CHOICES and value not in _CHOICES[key]:
+            print(f'Invalid config value {value!r} for {key}, using the default.')
+            continue
+
+        values[key] = value
+
+    return Config(**values)
+
+
+def read_environment(environment: Mapping[str, str] = environ) -> dict:
+    """ Config values set by environment variables named after their keys, they override the config file """
+    return {key: environment[key] for key in Config._fields if key in environment}
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """ Config loaded on first access and cached for the life of the process """
+    filename = CONFIG_FILENAME if Path(CONFIG_FILENAME).exists() else CONFIG_TEMPLATE_FILENAME
+
+    try:
+        data = load_config(filename)
+    except FileNotFoundError:
+        data = {}
+
+    return parse_config({**data, **read_environment()})
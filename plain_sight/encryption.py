@@ -1,32 +1,248 @@
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.padding import PKCS7
-from hashlib import sha256
-from secrets import SystemRandom, token_bytes
+from copy import copy
+from hashlib import sha256, scrypt, pbkdf2_hmac
+from secrets import token_bytes
+from functools import lru_cache
+from itertools import count
+from math import log2
+from time import perf_counter
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+from plain_sight.timing import timed
 
 
-_ALGORITHM = algorithms.AES
-_PAD_ALGORITHM = PKCS7
-_MODE = modes.CBC
+_BLOCK_SIZE = 128
 _IV_LENGTH = 16
+_NONCE_LENGTH = 12
+_KEY_LENGTH = 32
+_SALT_LENGTH = 16
 _PASSWORD_LENGTH = 20
+_SPECIAL_CHARACTERS = '!@#$%^&*'
+_AMBIGUOUS_CHARACTERS = 'Il1O0o'
+_DRAW_MARGIN = 1.1
+_OTHER_CHARACTERS = 25      # Printable ASCII, including the space, that is in none of the classes
+CHARACTER_CLASSES = ('lower', 'upper', 'digits', 'special')
 _ENCODING = 'utf8'
 
+LEGACY_KDF = {'name': 'sha256'}
+_DEFAULT_COSTS = {
+    'scrypt': {'n': 1 << 15, 'r': 8, 'p': 1},
+    'pbkdf2': {'iterations': 600000}
+}
+_COST_PARAMETER = {'scrypt': 'n', 'pbkdf2': 'iterations'}
 
-def encrypt_data(key: str, data: bytes) -> bytes:
+# Costs are read from the plaintext header before anything authenticates it, so they are bounded before deriving: at
+# most 1 GiB of scrypt memory and tens of seconds of work on current machines
+_COST_LIMITS = {
+    'scrypt': {'n': (2, 1 << 20), 'r': (1, 32), 'p': (1, 16)},
+    'pbkdf2': {'iterations': (1, 10_000_000)}
+}
+_MAX_SCRYPT_MEMORY = 1 << 30
+
+# Vaults written before the cipher was recorded use CBC, which only detects a wrong key when unpadding happens to fail
+CBC = 'aes-cbc'
+AES_GCM = 'aes-gcm'
+CHACHA20_POLY1305 = 'chacha20-poly1305'
+CIPHERS = (CBC, AES_GCM, CHACHA20_POLY1305)
+DEFAULT_CIPHER = AES_GCM
+
+
+class DecryptionError(ValueError):
+    """ Ciphertext could not be decrypted, the key is wrong or the data was corrupted """
+
+
+@lru_cache(maxsize=None)
+def load_backend() -> Tuple[Any, Any, Any, Any]:
+    """ Cipher, algorithm, mode and padding, imported on first use so commands that never decrypt skip cryptography """
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.padding import PKCS7
+
+    return Cipher, algorithms.AES, modes.CBC, PKCS7
+
+
+@lru_cache(maxsize=None)
+def load_aead_backend() -> Tuple[Dict[str, Any], Any]:
+    """ Authenticated ciphers by name and the exception raised when authentication fails """
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+    return {AES_GCM: AESGCM, CHACHA20_POLY1305: ChaCha20Poly1305}, InvalidTag
+
+
+@timed('derive_key')
+def derive_key(password: str, kdf: dict) -> bytes:
+    """ Derive a cipher key from a password with the given KDF parameters """
+    password_bytes = password.encode(_ENCODING)
+    name = kdf['name']
+
+    if name == 'sha256':
+        return sha256(password_bytes).digest()
+
+    check_costs(kdf)
+    salt = bytes.fromhex(kdf['salt'])
+    if name == 'scrypt':
+        n, r, p = kdf['n'], kdf['r'], kdf['p']
+        return scrypt(password_bytes, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + (1 << 20), dklen=_KEY_LENGTH)
+    if name == 'pbkdf2':
+        return pbkdf2_hmac('sha256', password_bytes, salt, kdf['iterations'], _KEY_LENGTH)
+
+    raise ValueError(f'Unknown key derivation function {name}.')
+
+
+def check_costs(kdf: dict) -> None:
+    """ Raise DecryptionError for KDF costs outside the limits, a header asking for more is corrupted or crafted """
+    for parameter, (low, high) in _COST_LIMITS.get(kdf['name'], {}).items():
+        value = kdf.get(parameter)
+        if type(value) is not int or not low <= value <= high:
+            raise DecryptionError(f'Key derivation {parameter} {value!r} is outside [{low}, {high}].')
+
+    if kdf['name'] == 'scrypt' and 128 * kdf['n'] * kdf['r'] > _MAX_SCRYPT_MEMORY:
+        raise DecryptionError(f'Key derivation needs more than {_MAX_SCRYPT_MEMORY >> 20} MiB.')
+
+
+def new_kdf(name: str = 'scrypt', **costs: int) -> dict:
+    """ KDF parameters with a fresh salt, costs default to the standard values for the function """
+    return {'name': name, 'salt': token_bytes(_SALT_LENGTH).hex(), **_DEFAULT_COSTS[name], **costs}
+
+
+def calibrate_kdf(target_seconds: float, name: str = 'scrypt') -> dict:
+    """ Pick KDF parameters so that a derivation takes about the target time on this machine, within the cost limits """
+    parameter = _COST_PARAMETER[name]
+    kdf = new_kdf(name, **{parameter: 1 << 10})
+    _, limit = _COST_LIMITS[name][parameter]
+
+    while True:
+        start = perf_counter()
+        derive_key('calibration', kdf)
+        elapsed = perf_counter() - start
+
+        # Cost is linear in the parameter, doubling past the target would overshoot by more than it undershoots
+        if elapsed * 1.5 >= target_seconds or kdf[parameter] * 2 > limit:
+            return kdf
+        kdf[parameter] *= 2
+
+
+class KeyContext:
+    """ Key derived once per session and reused by every encrypt and decrypt call """
+    def __init__(self, password: str, kdf: dict = None, cipher: str = CBC):
+        self.kdf: dict = kdf if kdf is not None else LEGACY_KDF
+        self.key = derive_key(password, self.kdf)
+
+        self.cipher: str = CBC
+        self.algorithm: Any = None
+        self.aead: Optional[Any] = None
+        self.use_cipher(cipher)
+
+    def use_cipher(self, cipher: str) -> None:
+        """ Set up the cipher once, authenticated ciphers keep their expanded key between calls """
+        if cipher == CBC:
+            _, algorithm, _, _ = load_backend()
+            self.algorithm, self.aead = algorithm(self.key), None
+        elif cipher in CIPHERS:
+            aeads, _ = load_aead_backend()
+            self.algorithm, self.aead = None, aeads[cipher](self.key)
+        else:
+            raise ValueError(f'Unknown cipher {cipher!r}, expected one of {", ".join(CIPHERS)}.')
+
+        self.cipher = cipher
+
+    def with_cipher(self, cipher: str) -> 'KeyContext':
+        """ The same key used with another cipher, for migrating a vault without deriving the key again """
+        context = copy(self)
+        context.use_cipher(cipher)
+
+        return context
+
+    def __getstate__(self) -> dict:
+        """ Only the key and its parameters are pickled, cipher objects are set up again by worker processes """
+        return {'kdf': self.kdf, 'key': self.key, 'cipher': self.cipher}
+
+    def __setstate__(self, state: dict) -> None:
+        self.kdf = state['kdf']
+        self.key = state['key']
+        self.use_cipher(state['cipher'])
+
+
+Key = Union[str, KeyContext]
+
+
+def as_context(key: Key) -> KeyContext:
+    """ Plain password strings use the legacy key derivation """
+    return key if isinstance(key, KeyContext) else KeyContext(key)
+
+
+class SessionKey:
+    """ Random key that only exists in memory, seals secrets until they are used
+
+    Nonces come from a counter, they never repeat as the key is new to every session.
+    """
+    def __init__(self):
+        aeads, _ = load_aead_backend()
+        self.aead = aeads[AES_GCM](token_bytes(_KEY_LENGTH))
+        self.nonces = count()
+
+    def seal(self, secret: str) -> bytes:
+        """ Encrypt a secret held in memory """
+        nonce = next(self.nonces).to_bytes(_NONCE_LENGTH, 'big')
+
+        return nonce + self.aead.encrypt(nonce, secret.encode(_ENCODING), None)
+
+    def unseal(self, sealed: bytes) -> str:
+        """ Decrypt a sealed secret for a single use """
+        return self.aead.decrypt(sealed[:_NONCE_LENGTH], sealed[_NONCE_LENGTH:], None).decode(_ENCODING)
+
+
+@timed('encrypt_data')
+def encrypt_data(key: Key, data: bytes) -> bytes:
     """ Compute ciphertext from plaintext """
-    byte_key = sha256(key.encode(_ENCODING)).digest()
+    context = as_context(key)
+    if context.aead is not None:
+        nonce = token_bytes(_NONCE_LENGTH)
+        return nonce + context.aead.encrypt(nonce, data, None)
+
+    cipher, _, mode, padding = load_backend()
     iv = token_bytes(_IV_LENGTH)
 
-    cipher = Cipher(_ALGORITHM(byte_key), _MODE(iv))
-    encryptor = cipher.encryptor()
+    encryptor = cipher(context.algorithm, mode(iv)).encryptor()
 
-    padder = _PAD_ALGORITHM(_ALGORITHM.block_size).padder()
+    padder = padding(_BLOCK_SIZE).padder()
     data = padder.update(data) + padder.finalize()
 
     cipher_text = iv + encryptor.update(data) + encryptor.finalize()
     return cipher_text
 
 
+def encrypted_size(length: int) -> int:
+    """ Buffer size needed to encrypt plaintext of a given length in place, authenticated ciphers need less """
+    block_length = _BLOCK_SIZE // 8
+    padded_length = (length // block_length + 1) * block_length
+
+    return _IV_LENGTH + padded_length + block_length - 1
+
+
+@timed('encrypt_into')
+def encrypt_into(key: Key, data: bytes, buffer: memoryview) -> int:
+    """ Compute ciphertext from plaintext into a preallocated buffer, returns the ciphertext length """
+    context = as_context(key)
+    if context.aead is not None:
+        # The pinned cryptography has no encrypt_into for authenticated ciphers, so this costs one copy
+        cipher_text = encrypt_data(context, data)
+        buffer[:len(cipher_text)] = cipher_text
+        return len(cipher_text)
+
+    cipher, _, mode, padding = load_backend()
+    iv = token_bytes(_IV_LENGTH)
+    buffer[:_IV_LENGTH] = iv
+
+    encryptor = cipher(context.algorithm, mode(iv)).encryptor()
+
+    padder = padding(_BLOCK_SIZE).padder()
+    data = padder.update(data) + padder.finalize()
+
+    length = _IV_LENGTH + encryptor.update_into(data, buffer[_IV_LENGTH:])
+    encryptor.finalize()
+
+    return length
+
+
 def get_character_range(start: str, end: str) -> list:
     """ Return a list of characters """
     start_index = ord(start)
@@ -35,40 +251,176 @@ def get_character_range(start: str, end: str) -> list:
     return [chr(char_index) for char_index in range(start_index, end_index)]
 
 
-def decrypt_data(key: str, cipher_data: bytes) -> bytes:
-    """ Compute plaintext from ciphertext """
-    byte_key = sha256(key.encode(_ENCODING)).digest()
+@timed('decrypt_data')
+def decrypt_data(key: Key, cipher_data: Union[bytes, memoryview]) -> bytes:
+    """ Compute plaintext from ciphertext, memoryviews are decrypted without copying by CBC
+
+    Raises DecryptionError when the key is wrong or the ciphertext was changed, which CBC only detects when the
+    padding comes out invalid.
+    """
+    context = as_context(key)
+    if context.aead is not None:
+        _, invalid_tag = load_aead_backend()
+        cipher_data = memoryview(cipher_data)
 
-    if len(cipher_data) < _IV_LENGTH:
+        # The pinned cryptography only accepts bytes for authenticated ciphers, so this costs one copy
+        try:
+            return context.aead.decrypt(bytes(cipher_data[:_NONCE_LENGTH]), bytes(cipher_data[_NONCE_LENGTH:]), None)
+        except (invalid_tag, ValueError):
+            raise DecryptionError('Wrong key or corrupted data.')
+
+    cipher, _, mode, padding = load_backend()
+
+    if len(cipher_data) < _IV_LENGTH:     # Empty legacy vault
         return b'{}'
 
+    cipher_data = memoryview(cipher_data)
     iv, cipher_text = cipher_data[:_IV_LENGTH], cipher_data[_IV_LENGTH:]
 
-    cipher = Cipher(_ALGORITHM(byte_key), _MODE(iv))
-    decrypter = cipher.decryptor()
+    decrypter = cipher(context.algorithm, mode(iv)).decryptor()
 
     plain_text = decrypter.update(cipher_text) + decrypter.finalize()
 
-    unpadder = _PAD_ALGORITHM(_ALGORITHM.block_size).unpadder()
+    unpadder = padding(_BLOCK_SIZE).unpadder()
 
     try:
         plain_text = unpadder.update(plain_text) + unpadder.finalize()
     except ValueError:
-        print('Invalid password entered. Exiting.')
-        exit(0)
+        raise DecryptionError('Wrong key or corrupted data.')
 
     return plain_text
 
 
+def decrypt_stream(key: Key, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """ Incrementally compute plaintext from chunks of CBC ciphertext, only legacy vaults are a single stream """
+    context = as_context(key)
+    cipher, _, mode, padding = load_backend()
+    chunks = iter(chunks)
+
+    iv = b''
+    for chunk in chunks:
+        iv += chunk
+        if len(iv) >= _IV_LENGTH:
+            break
+
+    if len(iv) < _IV_LENGTH:
+        yield b'{}'
+        return
+
+    iv, first_chunk = iv[:_IV_LENGTH], iv[_IV_LENGTH:]
+
+    decrypter = cipher(context.algorithm, mode(iv)).decryptor()
+    unpadder = padding(_BLOCK_SIZE).unpadder()
+
+    yield unpadder.update(decrypter.update(first_chunk))
+    for chunk in chunks:
+        yield unpadder.update(decrypter.update(chunk))
+
+    try:
+        final_chunk = unpadder.update(decrypter.finalize()) + unpadder.finalize()
+    except ValueError:
+        raise DecryptionError('Wrong key or corrupted data.')
+
+    yield final_chunk
+
+
 def generate_password(length: int = _PASSWORD_LENGTH) -> str:
     """ Securely generate password """
-    lower = get_character_range('a', 'z')
-    upper = get_character_range('A', 'Z')
-    digits = get_character_range('0', '9')
-    special = ['!', '@', '#', '$', '%', '^', '&', '*']
+    return generate_passwords(1, length)[0]
+
+
+@lru_cache(maxsize=None)
+def get_character_classes(exclude_ambiguous: bool = False) -> Dict[str, str]:
+    """ Characters in each class used for generated passwords """
+    character_classes = {
+        'lower': ''.join(get_character_range('a', 'z')),
+        'upper': ''.join(get_character_range('A', 'Z')),
+        'digits': ''.join(get_character_range('0', '9')),
+        'special': _SPECIAL_CHARACTERS
+    }
+
+    if exclude_ambiguous:
+        character_classes = {
+            name: ''.join(character for character in characters if character not in _AMBIGUOUS_CHARACTERS)
+            for name, characters in character_classes.items()
+        }
+
+    return character_classes
+
+
+@lru_cache(maxsize=None)
+def get_character_sets() -> Tuple[Tuple[FrozenSet[str], ...], FrozenSet[str]]:
+    """ Characters of each class as sets, and of all of them, for checking which classes a password uses """
+    character_sets = tuple(frozenset(characters) for characters in get_character_classes().values())
+
+    return character_sets, frozenset().union(*character_sets)
+
+
+def estimate_entropy(password: str) -> float:
+    """ Bits of a password were its characters drawn at random from every character class it uses
+
+    Exact for generated passwords, an upper bound for chosen ones as words and patterns aren't recognised.
+    """
+    characters = set(password)
+    character_sets, known = get_character_sets()
+    pool = sum(len(character_set) for character_set in character_sets if not characters.isdisjoint(character_set))
+
+    if not characters <= known:
+        pool += _OTHER_CHARACTERS
+
+    return len(password) * log2(pool) if pool else 0.0
+
+
+@lru_cache(maxsize=None)
+def get_alphabet(classes: Tuple[str, ...], exclude_ambiguous: bool) -> Tuple[bytes, bytes, float]:
+    """ Table mapping random bytes onto the alphabet, the bytes to reject, and the fraction that is kept """
+    character_classes = get_character_classes(exclude_ambiguous)
+    alphabet = sorted(set(''.join(character_classes[name] for name in classes)))
+
+    # Bytes past the largest multiple of the alphabet size are rejected so every character is equally likely
+    limit = 256 - 256 % len(alphabet)
+    table = bytes(ord(alphabet[value % len(alphabet)]) for value in range(256))
+
+    return table, bytes(range(limit, 256)), limit / 256
+
+
+def generate_passwords(count: int, length: int = _PASSWORD_LENGTH, classes: Iterable[str] = CHARACTER_CLASSES,
+                       required: Iterable[str] = (), exclude_ambiguous: bool = False) -> List[str]:
+    """ Securely generate passwords in bulk, each containing at least one character of every required class """
+    classes = tuple(sorted(set(classes)))
+    required = tuple(sorted(set(required)))
+
+    unknown = set(classes).union(required).difference(CHARACTER_CLASSES)
+    if unknown:
+        raise ValueError(f'Unknown character classes {", ".join(sorted(unknown))}.')
+    if length < 0:
+        raise ValueError(f'Password length can not be negative, got {length}.')
+    if not classes:
+        raise ValueError('Passwords need at least one character class.')
+    if not set(required).issubset(classes):
+        raise ValueError('Required character classes must be part of the alphabet.')
+    if length < len(required):
+        raise ValueError(f'Passwords of length {length} can not contain {len(required)} required classes.')
+    if length == 0:
+        return [''] * count
+
+    table, rejected, kept = get_alphabet(classes, exclude_ambiguous)
+    character_classes = get_character_classes(exclude_ambiguous)
+    required_sets = [frozenset(character_classes[name]) for name in required]
+
+    passwords: List[str] = []
+    characters = ''
+    while len(passwords) < count:
+        # One draw covers every password in the common case, passwords missing a required class are redrawn
+        missing = (count - len(passwords)) * length - len(characters)
+        draw = token_bytes(int(missing / kept * _DRAW_MARGIN) + length)
+        characters += draw.translate(table, rejected).decode('ascii')
 
-    population = lower + upper + digits + special
-    generator = SystemRandom()
+        usable = len(characters) - len(characters) % length
+        for start in range(0, usable, length):
+            password = characters[start:start + length]
+            if len(passwords) < count and all(not required_set.isdisjoint(password) for required_set in required_sets):
+                passwords.append(password)
+        characters = characters[usable:]
 
-    password = generator.choices(population, k=length)
-    return ''.join(password)
+    return passwords
@@ -1,14 +1,21 @@
 from pathlib import Path
-from typing import Union
+from typing import Iterator, Optional, TextIO, Union
+from contextlib import contextmanager
+from mmap import mmap, ACCESS_READ
+from os import SEEK_END, O_RDONLY, O_WRONLY, O_CREAT, O_TRUNC, close, fsync, open as open_fd, replace
+from tempfile import NamedTemporaryFile
+from traceback import clear_frames
 from plain_sight.log import get_logger
-from json import loads
-from os import environ
+from plain_sight.timing import timed
+from plain_sight.config import load_config, CONFIG_FILENAME, CONFIG_TEMPLATE_FILENAME
 
 
-CONFIG_FILENAME = 'config.json'
-CONFIG_TEMPLATE_FILENAME = 'config.template.json'
+CHUNK_SIZE = 1 << 16
+
+logger = get_logger('file_io')
 
 
+@timed('load_file')
 def load_file(filename: Union[Path, str]) -> bytes:
     """ Load file as bytes """
     if isinstance(filename, str):
@@ -25,58 +32,95 @@ def load_file(filename: Union[Path, str]) -> bytes:
     return data
 
 
-def save_file(filename: Union[Path, str], data: bytes) -> None:
-    """ Save file to bytes """
+def iter_file(filename: Union[Path, str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """ Load file as a stream of byte chunks """
     if isinstance(filename, str):
         filename = Path(filename)
 
     try:
-        with filename.open('wb') as fl:
-            fl.write(data)
-    except Exception as e:
-        logger.error('Error writing to %s.', str(filename), exc_info=e)
+        with filename.open('rb') as fl:
+            while True:
+                chunk = fl.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    except OSError as e:
+        logger.error('Error opening %s.', str(filename), exc_info=e)
 
 
-# TODO figure out how to use logger instead of prints (import order)
-def load_config(filename: Union[Path, str] = CONFIG_FILENAME) -> dict:
-    """ Load config and parse to dict """
+@contextmanager
+def map_file(filename: Union[Path, str]) -> Iterator[memoryview]:
+    """ Memory-map a file read-only, slices of the view are zero-copy and must not outlive the context """
     if isinstance(filename, str):
         filename = Path(filename)
 
-    file_name = filename.name
-    full_path = filename.absolute().parent
-    for _ in range(3):
-        if (full_path / file_name).exists():
-            break
-        full_path = full_path.parent
+    with filename.open('rb') as fl:
+        if fl.seek(0, SEEK_END) == 0:     # Empty files can't be mapped
+            yield memoryview(b'')
+            return
+
+        with mmap(fl.fileno(), 0, access=ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            except BaseException as e:
+                # Slices held by the frames of the traceback would keep the map open and hide the error
+                clear_frames(e.__traceback__)
+                raise
+            finally:
+                view.release()
+
+
+def fsync_directory(directory: Path) -> None:
+    """ Make a rename in the directory durable, skipped where directories can't be opened """
+    try:
+        descriptor = open_fd(str(directory), O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        fsync(descriptor)
+    finally:
+        close(descriptor)
+
 
-    filename = full_path / file_name
-    if not (full_path / file_name).exists():
-        raise FileNotFoundError(f'Config file, {filename}, could not be found.')
+def replace_file(source: Path, target: Path) -> None:
+    """ Atomically move a fully written file over the target """
+    replace(source, target)
+    fsync_directory(target.absolute().parent)
 
-    data = load_file(filename)
-    config = {}
 
+@timed('save_file')
+def save_file(filename: Union[Path, str], data: bytes) -> None:
+    """ Save file to bytes, the file is either fully replaced or left as it was """
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    temporary_path: Optional[Path] = None
     try:
-        config = data.decode('utf8')
-        config = loads(config)
-    except Exception:
-        print(f'Error decoding config data from {filename}.')
+        with NamedTemporaryFile('wb', dir=filename.absolute().parent, prefix=f'.{filename.name}.',
+                                delete=False) as fl:
+            temporary_path = Path(fl.name)
+            fl.write(data)
+            fl.flush()
+            fsync(fl.fileno())
+
+        replace_file(temporary_path, filename)
+    except Exception as e:
+        logger.error('Error writing to %s.', str(filename), exc_info=e)
+        if temporary_path is not None and temporary_path.exists():
+            temporary_path.unlink()
+
 
-    # Make config environment variables
-    for key in config:
-        environ[key] = str(config[key])
+def open_private(filename: Union[Path, str]) -> TextIO:
+    """ Open a text file for writing that only the current user can read, for files holding secrets """
+    descriptor = open_fd(str(filename), O_WRONLY | O_CREAT | O_TRUNC, 0o600)
 
-    return config
+    return open(descriptor, 'w', encoding='utf8', newline='')
 
 
 def json_helper(obj):
     """ Specifies the name of the helper function for exporting to json """
     return obj.to_json()
 
-
-_filename = CONFIG_FILENAME if Path(CONFIG_FILENAME).exists() else CONFIG_TEMPLATE_FILENAME
-load_config(_filename)
-
-logger = get_logger('file_io')
-logger.info('Config loaded from %s.', _filename)
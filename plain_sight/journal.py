@@ -0,0 +1,222 @@
+from json import dumps, loads
+from pathlib import Path
+from secrets import token_hex
+from struct import Struct
+from os import fsync, replace
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from plain_sight.encryption import encrypt_data, decrypt_data, KeyContext, CBC, LEGACY_KDF
+from plain_sight.file_io import map_file, replace_file
+from plain_sight.log import get_logger
+from plain_sight.vault import read_header
+
+
+_LENGTH = Struct('>I')
+_POSITION = Struct('>I')
+_HEADER_FLAG = 1 << 31      # Marks the length of the plaintext header every journal file starts with
+_GENERATION_LENGTH = 16
+_ENCODING = 'utf8'
+_JOURNAL_SUFFIX = '.journal'
+_COMPACTING_SUFFIX = '.compacting'
+_TEMPORARY_SUFFIX = '.tmp'
+
+logger = get_logger('journal')
+
+
+class Journal:
+    """ Append-only log of encrypted record edits kept next to a vault
+
+    Every journal file starts with a header naming its generation and the key salt and cipher of its entries. A
+    compacted vault lists the generations it holds, so a journal left behind by an interrupted compaction is skipped
+    rather than replayed over newer records. Entries of another key, written by a process that opened the vault before
+    it was re-keyed, are skipped as well.
+    """
+    def __init__(self, vault_path: Union[Path, str], key: KeyContext, compacted: Iterable[str] = ()):
+        self.vault_path = Path(vault_path)
+        self.key = key
+        self.compacted: Set[str] = set(compacted)
+
+        self.path = self.vault_path.with_name(self.vault_path.name + _JOURNAL_SUFFIX)
+        self.compacting_path = self.path.with_name(self.path.name + _COMPACTING_SUFFIX)
+
+        self.lock = Lock()
+        self.compaction: Optional[Thread] = None
+
+    @property
+    def size(self) -> int:
+        """ Size of the active journal in bytes """
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def encode(self, position: int, record: bytes) -> bytes:
+        """ Encrypt a single edit into a length-prefixed journal entry """
+        cipher_text = encrypt_data(self.key, _POSITION.pack(position) + record)
+
+        return _LENGTH.pack(len(cipher_text)) + cipher_text
+
+    def new_header(self) -> bytes:
+        """ Header of a new journal file with a fresh generation and the key its entries are encrypted with """
+        header = {
+            'generation': token_hex(_GENERATION_LENGTH), 'salt': self.key.kdf.get('salt'), 'cipher': self.key.cipher
+        }
+        data = dumps(header).encode(_ENCODING)
+
+        return _LENGTH.pack(_HEADER_FLAG | len(data)) + data
+
+    def is_own_key(self, header: dict) -> bool:
+        """ Whether entries after a journal header are encrypted with this journal's key """
+        return header.get('salt', self.key.kdf.get('salt')) == self.key.kdf.get('salt') and \
+            header.get('cipher', self.key.cipher) == self.key.cipher
+
+    def check_vault(self) -> None:
+        """ Refuse to journal edits under a key the vault no longer uses, it was re-keyed or migrated by another
+        process since it was opened """
+        if not self.vault_path.exists():
+            return
+
+        with map_file(self.vault_path) as view:
+            header = read_header(view)
+
+        if header.get('kdf', LEGACY_KDF) != self.key.kdf or header.get('cipher', CBC) != self.key.cipher:
+            raise ValueError(f'{self.vault_path} was re-keyed by another process, open it again to save edits.')
+
+    def append(self, changes: Dict[int, bytes]) -> None:
+        """ Durably append edits to the journal with a single write """
+        if not changes:
+            return
+
+        data = b''.join(self.encode(position, changes[position]) for position in sorted(changes))
+        self.check_vault()
+
+        with self.lock, self.path.open('ab') as fl:
+            if fl.tell() == 0:
+                data = self.new_header() + data
+            fl.write(data)
+            fl.flush()
+            fsync(fl.fileno())
+
+        logger.debug('Journaled %d records to %s.', len(changes), self.path)
+
+    @staticmethod
+    def iter_entries(path: Path) -> Iterator[Tuple[Optional[dict], bytes]]:
+        """ Headers and encrypted entries of a journal file, a torn entry at the tail is dropped """
+        data = path.read_bytes()
+        offset = 0
+
+        while offset + _LENGTH.size <= len(data):
+            size, = _LENGTH.unpack_from(data, offset)
+            is_header = size & _HEADER_FLAG
+            size &= ~_HEADER_FLAG
+            if offset + _LENGTH.size + size > len(data):
+                break
+
+            start = offset + _LENGTH.size
+            offset = start + size
+
+            if is_header:
+                yield loads(data[start:offset].decode(_ENCODING)), b''
+            else:
+                yield None, data[start:offset]
+
+        if offset < len(data):
+            logger.warning('Dropping %d bytes of incomplete journal entry from %s.', len(data) - offset, path)
+            with path.open('r+b') as fl:
+                fl.truncate(offset)
+
+    def generations(self, path: Path) -> List[str]:
+        """ Generations of a journal file, several when a failed compaction was merged into a later one """
+        return [header['generation'] for header, _ in self.iter_entries(path) if header is not None]
+
+    def read(self, path: Path) -> Iterator[Tuple[int, bytes]]:
+        """ Decrypt the entries of a journal file, except those of generations the vault already holds or of another
+        key """
+        skipped = False
+
+        for header, cipher_text in self.iter_entries(path):
+            if header is not None:
+                skipped = header['generation'] in self.compacted
+                if not skipped and not self.is_own_key(header):
+                    logger.warning('Skipping edits in %s saved with a key the vault no longer uses.', path)
+                    skipped = True
+                continue
+            if skipped:
+                continue
+
+            plain_text = decrypt_data(self.key, cipher_text)
+            position, = _POSITION.unpack_from(plain_text)
+            yield position, plain_text[_POSITION.size:]
+
+    def replay(self) -> Iterator[Tuple[int, bytes]]:
+        """ Yield every journaled edit in the order it was made """
+        if self.compacting_path.exists():
+            generations = self.generations(self.compacting_path)
+
+            # Left behind by a compaction that replaced the vault but stopped before removing it
+            if generations and self.compacted.issuperset(generations):
+                logger.info('Removing %s, its edits are already in the vault.', self.compacting_path)
+                self.compacting_path.unlink()
+
+        for path in (self.compacting_path, self.path):
+            if path.exists():
+                yield from self.read(path)
+
+    def compact(self, write: Callable[..., None], background: bool = True) -> bool:
+        """ Write a full vault with the given writer and swap it in place of the vault and its journal, returns whether
+        the vault was replaced, which a background compaction only does after returning
+
+        The writer is called with the path to write to and the journal generations the vault will hold. Errors of a
+        foreground compaction are raised, a background compaction can only log them.
+        """
+        if self.compaction is not None and self.compaction.is_alive():
+            logger.debug('Compaction of %s already running.', self.vault_path)
+            return False
+
+        # Edits made while compacting go to a fresh journal
+        with self.lock:
+            if self.path.exists() and self.compacting_path.exists():    # Left behind by a failed compaction
+                with self.compacting_path.open('ab') as fl:
+                    fl.write(self.path.read_bytes())
+                self.path.unlink()
+            elif self.path.exists():
+                replace(self.path, self.compacting_path)
+
+        if background:
+            self.compaction = Thread(target=self.swap_in_background, args=(write,), name='journal-compaction',
+                                     daemon=True)
+            self.compaction.start()
+            return False
+
+        self.swap(write)
+        return True
+
+    def swap_in_background(self, write: Callable[..., None]) -> None:
+        """ Swap from the compaction thread, the journaled edits are kept for the next compaction if it fails """
+        try:
+            self.swap(write)
+        except Exception as e:
+            logger.error('Error compacting %s.', str(self.vault_path), exc_info=e)
+
+    def swap(self, write: Callable[..., None]) -> None:
+        """ Write the compacted vault to a temporary file then atomically replace the vault, the temporary file is
+        removed if either fails """
+        temporary_path = self.vault_path.with_name(self.vault_path.name + _TEMPORARY_SUFFIX)
+
+        try:
+            generations = self.generations(self.compacting_path) if self.compacting_path.exists() else []
+            write(temporary_path, journal=generations)
+            replace_file(temporary_path, self.vault_path)
+        except BaseException:
+            if temporary_path.exists():
+                temporary_path.unlink()
+            raise
+
+        # The vault holds these edits from here on, even if the journal can't be removed
+        self.compacted = set(generations)
+        if self.compacting_path.exists():
+            self.compacting_path.unlink()
+
+        logger.debug('Compacted %s.', self.vault_path)
+
+    def wait(self) -> None:
+        """ Block until a running compaction finishes """
+        if self.compaction is not None:
+            self.compaction.join()
@@ -1,6 +1,13 @@
-from logging import getLogger, Logger, StreamHandler, Formatter, Handler
-from sys import stdout
-from os import environ
+from atexit import register
+from functools import lru_cache
+from logging import getLogger, getLevelName, Logger, LogRecord, StreamHandler, FileHandler, Formatter, Handler, \
+    NOTSET, ERROR, WARNING
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from sys import stderr
+from threading import Lock
+from typing import List, Optional
+from plain_sight.config import get_config
 
 
 _FORMATTER = Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -8,9 +15,48 @@ _FORMATTER = Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 emergency_logger = getLogger('EMERGENCY')
 emergency_logger.setLevel('ERROR')
 
+_queue: SimpleQueue = SimpleQueue()
+_listener: Optional[QueueListener] = None
+_listener_lock = Lock()
+_loggers_lock = Lock()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """ Queues records untouched, the message is only formatted by the listener thread if a sink emits it """
+    def prepare(self, record: LogRecord) -> LogRecord:
+        return record
+
+
+_queue_handler = DeferredQueueHandler(_queue)
+
+
+@lru_cache(maxsize=None)
+def get_level() -> int:
+    """ Configured log level, checked once, unknown levels fall back to WARNING """
+    name = get_config().log_level.strip().upper()
+    level = int(name) if name.isdigit() else getLevelName(name)
+
+    if not isinstance(level, int):
+        emergency_logger.error('Unknown log level %r in the config, using WARNING.', get_config().log_level)
+        return WARNING
+
+    return level
+
+
+class ConfiguredLogger(Logger):
+    """ Logger whose level is read from the config the first time it is needed rather than at import """
+    def getEffectiveLevel(self) -> int:
+        if self.level == NOTSET:
+            self.level = ERROR     # Placeholder, loading the config may itself log
+            self.setLevel(get_level())
+            start_listener()
+
+        return super().getEffectiveLevel()
+
 
 def attach_to_console(logger: Logger) -> None:
-    handler = StreamHandler(stdout)
+    """ Write straight to the console, only for loggers that must not depend on the listener thread """
+    handler = StreamHandler(stderr)
     handler.setFormatter(_FORMATTER)
 
     logger.addHandler(handler)
@@ -19,14 +65,67 @@ def attach_to_console(logger: Logger) -> None:
 attach_to_console(emergency_logger)
 
 
+def get_sinks() -> List[Handler]:
+    """ One handler per configured sink, shared by every logger """
+    sinks: List[Handler] = [StreamHandler(stderr)]
+
+    log_file = get_config().log_file
+    if log_file:
+        sinks.append(FileHandler(log_file, delay=True))
+
+    for sink in sinks:
+        sink.setFormatter(_FORMATTER)
+
+    return sinks
+
+
+def start_listener() -> None:
+    """ Start the thread that drains queued records into the sinks, once per process """
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        _listener = QueueListener(_queue, *get_sinks(), respect_handler_level=True)
+        _listener.start()
+
+    register(stop_listener)
+
+
+def stop_listener() -> None:
+    """ Write out every queued record and stop the listener thread """
+    global _listener
+
+    with _listener_lock:
+        listener, _listener = _listener, None
+
+    if listener is not None:
+        listener.stop()
+        for sink in listener.handlers:
+            sink.close()
+
+
 def get_logger(name: str) -> Logger:
-    log_level = environ.get('log_level', 'ERROR')
-    emergency_logger.info('Setting %s log level to %s.', name, log_level)
+    """ Logger for a module, created once per name, records are handed to the listener thread
 
-    logger = getLogger(name)
-    logger.setLevel(log_level)
+    Loggers are created by the logging manager so they are part of the hierarchy and propagate to the root. The logger
+    class is only swapped while creating one, loggers of other libraries keep the default class.
+    """
+    manager = Logger.manager
 
-    attach_to_console(logger)
+    with _loggers_lock:
+        logger = manager.loggerDict.get(name)
+        if isinstance(logger, Logger) and _queue_handler in logger.handlers:
+            return logger
 
-    return logger
+        logger_class = manager.loggerClass
+        manager.setLoggerClass(ConfiguredLogger)
+        try:
+            logger = manager.getLogger(name)
+        finally:
+            manager.loggerClass = logger_class
+
+        logger.addHandler(_queue_handler)
 
+    return logger
@@ -1,40 +1,69 @@
-from os import environ
 from pathlib import Path
-from plain_sight.cmd_io import get_input, get_password, get_yes_no
-from plain_sight.encryption import decrypt_data, encrypt_data
-from plain_sight.file_io import load_file, save_file, json_helper
-from json import loads, dumps
-from typing import Callable, Dict, Optional, List, Iterable
+from plain_sight.cmd_io import get_input, get_password, get_yes_no, set_completer
+from plain_sight.encryption import decrypt_stream, calibrate_kdf, new_kdf, as_context, DecryptionError, Key, \
+    KeyContext, SessionKey, LEGACY_KDF
+from plain_sight.file_io import iter_file, map_file
+from plain_sight.stream import decode_stream, iter_vault_items
+from plain_sight.vault import is_record_vault, read_header, read_index, iter_records, read_codec, read_record, \
+    write_vault, unlock
+from plain_sight.journal import Journal
+from plain_sight.records import get_decoder, new_table, JSON_RECORDS
+from json import loads
+from functools import partial
+from typing import Any, Callable, Dict, Optional, List, Iterable, Set, Tuple
 from plain_sight.log import get_logger
-from plain_sight.account import Account
+from plain_sight.config import get_config
+from plain_sight.account import Account, AccountStore, serialize_accounts, snapshot_accounts
+from plain_sight.autosave import Autosaver
+from plain_sight.search import SearchIndex
+from plain_sight.completion import NameIndex
+from plain_sight.timing import span, timed
 from re import search, Match, compile
 
 
 logger = get_logger('plain_sight')
 _ENCODING = 'utf8'
-_MAX_RESULTS = int(environ.get('max_search_results', 10))
+_COMPLETION_LIMIT = 50
 _SELECTION_PATTERN = r'(\d+)|(\w?)'
 selection_pattern = compile(_SELECTION_PATTERN)
 number_pattern = compile(r'\d+')
+VaultSnapshot = Tuple[KeyContext, Callable[..., None]]
 
 
 class PlainSight:
-    def __init__(self):
+    def __init__(self, vault_path: Path = None, password: str = None):
         self.updated: bool = False
+        self.modified: Set[Account] = set()
+        self.store = AccountStore()
 
-        self.vault_path: Path = self.select_file()
-        self.password: str = get_password()
+        self.vault_path: Path = vault_path if vault_path is not None else self.select_file()
+        password = password if password is not None else get_password()
 
+        compacted: List[str] = []
         if self.vault_path.exists():
-            cipher_text: bytes = load_file(self.vault_path)
-            plain_text: str = decrypt_data(self.password, cipher_text).decode(_ENCODING)
+            self.key, self.plain_data, compacted = self.read_vault(self.vault_path, password, self.store)
         else:
-            create_new = get_yes_no(f'Would you like to make a new vault at {str(self.vault_path)}?')
-            if not create_new:
-                exit(0)
-            plain_text = '{}'
-
-        self.plain_data: dict = self.load_data(plain_text)
+            if vault_path is None:
+                create_new = get_yes_no(f'Would you like to make a new vault at {str(self.vault_path)}?')
+                if not create_new:
+                    exit(0)
+            self.key: KeyContext = self.new_key(password)
+            self.plain_data: dict = self.load_data('{}', self.store)
+
+        # Legacy vaults get a key with a proper KDF once they are migrated, the password is kept sealed until then
+        self.session_key: Optional[SessionKey] = None
+        self.sealed_password: Optional[bytes] = None
+        self.migration_key: Optional[KeyContext] = None
+        if self.key.kdf == LEGACY_KDF and isinstance(password, str):
+            self.session_key = SessionKey()
+            self.sealed_password = self.session_key.seal(password)
+
+        self.journal = Journal(self.vault_path, self.key, compacted)
+        self.replay_journal(self.plain_data, self.journal, self.store)
+
+        self._search_index: Optional[SearchIndex] = None
+        self._name_index: Optional[NameIndex] = None
+        self.autosave: Optional[Autosaver] = None
 
         self.options: Dict[str, Callable[[Optional[int]], None]] = {
             'l': self.list_accounts,
@@ -54,10 +83,28 @@ class PlainSight:
 
         return accounts
 
+    @property
+    def search_index(self) -> SearchIndex:
+        """ Search index, built on first use so one-off commands that never search don't pay for it """
+        if self._search_index is None:
+            with span('SearchIndex.build'):
+                self._search_index = SearchIndex(self.accounts)
+
+        return self._search_index
+
+    @property
+    def name_index(self) -> NameIndex:
+        """ Name index, built on first use """
+        if self._name_index is None:
+            with span('NameIndex.build'):
+                self._name_index = NameIndex(self.accounts)
+
+        return self._name_index
+
     @staticmethod
     def select_file() -> Path:
         """ Select file to load """
-        default_path = Path(environ.get('key_file', 'passwords.vault'))
+        default_path = Path(get_config().key_file)
 
         while True:
             vault_path = get_input(f'Enter vault path [{default_path}]:', r'.*')
@@ -74,18 +121,31 @@ class PlainSight:
 
     def interaction(self) -> None:
         """ Implements the command line interactivity """
+        set_completer(partial(self.name_index.complete, limit=_COMPLETION_LIMIT))
+
+        autosave_delay = get_config().autosave_delay
+        if autosave_delay > 0:
+            self.enable_autosave(autosave_delay)
+
         while True:
-            option_choice = get_input('What would you like to do? (h for help)', _SELECTION_PATTERN, 'h')
+            option_choice = get_input('What would you like to do? (h for help, TAB to complete a name)', r'.+', 'h')
             logger.debug('Chose %s.', option_choice)
 
             selection_match = selection_pattern.fullmatch(option_choice)
 
-            if selection_match.group(1):    # If match was a number, it is an account reference
+            if selection_match and selection_match.group(1):    # If match was a number, it is an account reference
                 selection = selection_match.group(0)
 
                 self.view_account(int(selection))
+                continue
+
+            option: Optional[Callable] = self.options.get(option_choice)
+            account = self.name_index.find(option_choice) if option is None else None
+
+            if account is not None:         # If match was an account name, jump straight to it
+                self.view_account(0, [account])
             else:                           # If match was a character, it is a function reference
-                option: Callable = self.options.get(option_choice, self.help)
+                option = option if option is not None else self.help
 
                 option()
 
@@ -109,20 +169,39 @@ class PlainSight:
     def new_account(self) -> None:
         """ Create a new account entry """
         raw_account = Account.collect_info()
-        account = Account(raw_account)
+        account = self.store.add(raw_account)
 
         self.accounts.append(account)
-        self.updated = True
+        self.set_update_flag(account)
+
+    def add_accounts(self, records: Iterable[dict]) -> int:
+        """ Append accounts without journaling them, bulk imports write the whole vault once with compact instead """
+        accounts = self.accounts
+        count = 0
+
+        for record in records:
+            account = self.store.add(record)
+            accounts.append(account)
+            count += 1
+
+            if self._search_index is not None:
+                self._search_index.add(account)
+            if self._name_index is not None:
+                self._name_index.update(account)
+
+        return count
 
     def search_accounts(self) -> None:
         """ Search accounts then view or edit """
+        max_results = get_config().max_search_results
+
         while True:
             search_term = get_input('Search term:', default='')
-            accounts = [account for account in self.accounts if account.search(search_term)]
-            print(self.format_output(accounts)[:_MAX_RESULTS])
+            accounts = self.search_index.search(search_term, max_results + 1)
+            print(self.format_output(accounts[:max_results]))
 
-            if len(accounts) > _MAX_RESULTS:
-                print(f'More than {_MAX_RESULTS} returned, only {_MAX_RESULTS} shown.')
+            if len(accounts) > max_results:
+                print(f'More than {max_results} returned, only {max_results} shown.')
 
             selection = get_input('Enter index to view account, anything else to exit.', _SELECTION_PATTERN)
             selection_match: Match = search(_SELECTION_PATTERN, selection)
@@ -142,39 +221,262 @@ class PlainSight:
         elif index < 0:
             logger.error('Index must be larger than zero.')
 
-        return account_pool[index].interaction(self.set_update_flag)
+        account = account_pool[index]
+        return account.interaction(partial(self.set_update_flag, account))
 
-    def set_update_flag(self) -> None:
-        """ Set update flag to True """
+    def set_update_flag(self, account: Account = None) -> None:
+        """ Set update flag to True, and mark the account as modified when given """
         self.updated = True
 
+        if account is not None:
+            self.modified.add(account)
+
+            # Indexes that were never built pick the account up when they are
+            if self._search_index is not None:
+                self._search_index.update(account)
+            if self._name_index is not None:
+                self._name_index.update(account)
+
+            # Snapshots are taken here, on the editing thread, only writing them happens in the background
+            if self.autosave is not None:
+                changes = self.snapshot_changes()
+                self.autosave.schedule(changes, self.snapshot_vault() if self.needs_compaction(changes) else None)
+
     @staticmethod
-    def load_data(plain_text: str) -> dict:
+    def new_key(password: str) -> KeyContext:
+        """ Derive a key for a new vault, calibrated to the configured unlock time when one is set """
+        target_seconds = get_config().kdf_target_seconds
+        kdf = calibrate_kdf(target_seconds) if target_seconds > 0 else new_kdf()
+
+        return KeyContext(password, kdf, get_config().cipher)
+
+    @staticmethod
+    @timed('PlainSight.read_vault')
+    def read_vault(vault_path: Path, password: Key, store: AccountStore) -> Tuple[KeyContext, dict, List[str]]:
+        """ Read either a record vault or a legacy single-blob vault, returns the key to save with and the journal
+        generations the vault already holds """
+        if not is_record_vault(vault_path):
+            plain_chunks = decrypt_stream(password, iter_file(vault_path))
+            try:
+                plain_data = PlainSight.load_items(iter_vault_items(decode_stream(plain_chunks)), store)
+            except DecryptionError:
+                raise
+            except ValueError as e:
+                # Padding is only checked at the end, a wrong key fails to decode or parse well before it
+                raise DecryptionError('Wrong password or corrupted vault.') from e
+
+            # Legacy vaults are migrated on save, the key for that is only derived then
+            return as_context(password), plain_data, []
+
+        with map_file(vault_path) as view:
+            header = read_header(view)
+            key = unlock(header, password)
+            index, _ = read_index(view, key)
+            decode = get_decoder(header.get('records', JSON_RECORDS), index.get('schemas', []))
+
+            plain_data: dict = index['extra']
+            plain_data['accounts'] = [store.append(*decode(record)) for record in iter_records(view, key, index)]
+
+        return key, plain_data, index.get('journal', [])
+
+    @staticmethod
+    @timed('PlainSight.read_account')
+    def read_account(vault_path: Path, password: Key, name: str) -> Optional[Account]:
+        """ Account with exactly this name ignoring case, only its record and the journaled edits are decrypted
+
+        Raises LookupError when the vault has no name index, legacy vaults and vaults written before it are read whole.
+        """
+        if not is_record_vault(vault_path):
+            raise LookupError(f'{vault_path} has no name index.')
+
+        name = name.lower()
+        with map_file(vault_path) as view:
+            header = read_header(view)
+            key = unlock(header, password)
+            index, _ = read_index(view, key)
+            if 'names' not in index:
+                raise LookupError(f'{vault_path} has no name index.')
+
+            journaled = {position: loads(record.decode(_ENCODING))
+                         for position, record in Journal(vault_path, key, index.get('journal', [])).replay()}
+
+            # Journaled edits replace indexed records and may rename them
+            names = index['names'] + [None] * (max(journaled, default=-1) + 1 - len(index['names']))
+            for position, data in journaled.items():
+                names[position] = str(data.get('name', '')).lower()
+
+            if name not in names:
+                return None
+            position = names.index(name)
+
+            store = AccountStore()
+            if position in journaled:
+                return store.add(journaled[position])
+
+            decode = get_decoder(header.get('records', JSON_RECORDS), index.get('schemas', []))
+            record = read_record(view, key, index['records'][position], read_codec(header, index))
+            return store.append(*decode(record))
+
+    @staticmethod
+    @timed('PlainSight.load_data')
+    def load_data(plain_text: str, store: AccountStore = None) -> dict:
         """ Load plaintext data into object """
+        store = store if store is not None else AccountStore()
         plain_data: dict = loads(plain_text)
         accounts = plain_data.get('accounts', [])
 
-        plain_data['accounts'] = [Account(account_data) for account_data in accounts]
+        plain_data['accounts'] = [store.add(account_data) for account_data in accounts]
+
+        return plain_data
+
+    @staticmethod
+    def load_items(items: Iterable[Tuple[str, Any]], store: AccountStore) -> dict:
+        """ Load streamed top-level items, accounts are created one at a time as they are parsed """
+        plain_data: dict = {'accounts': []}
+
+        for key, value in items:
+            if key == 'accounts':
+                plain_data['accounts'].append(store.add(value))
+            else:
+                plain_data[key] = value
 
         return plain_data
 
+    @staticmethod
+    @timed('PlainSight.replay_journal')
+    def replay_journal(plain_data: dict, journal: Journal, store: AccountStore) -> None:
+        """ Apply journaled edits on top of the data read from the vault """
+        accounts: List[Account] = plain_data.setdefault('accounts', [])
+
+        for position, record in journal.replay():
+            data = loads(record.decode(_ENCODING))
+
+            # An edit replaces the record in its existing row, rows are never freed so a new one would be left behind
+            if position < len(accounts):
+                accounts[position].replace(data)
+            elif position == len(accounts):
+                accounts.append(store.add(data))
+            else:
+                logger.warning('Skipping journal entry for missing record %d.', position)
+
+    def reload(self) -> None:
+        """ Re-read the vault and its journal with the session key after another process saved to them """
+        if not is_record_vault(self.vault_path):
+            raise ValueError(f'{self.vault_path} is not a record vault.')
+
+        self.store = AccountStore()
+        self.key, self.plain_data, compacted = self.read_vault(self.vault_path, self.key, self.store)
+        self.journal.key = self.key
+        self.journal.compacted = set(compacted)
+        self.replay_journal(self.plain_data, self.journal, self.store)
+
+        self.modified.clear()
+        self._search_index = None
+        self._name_index = None
+
+    def snapshot_changes(self) -> Dict[int, bytes]:
+        """ Records of the modified accounts as they are now, by position, the accounts are then marked saved """
+        positions = [index for index, account in enumerate(self.accounts) if account in self.modified]
+        changes = dict(zip(positions, serialize_accounts(self.accounts[position] for position in positions)))
+
+        self.modified.clear()
+        return changes
+
+    @timed('PlainSight.save_data')
     def save_data(self) -> None:
-        """ Save data in memory to the same file that was read """
-        json_string = dumps(self.plain_data, default=json_helper)
-        plain_text = json_string.encode(_ENCODING)
-        cipher_text = encrypt_data(self.password, plain_text)
+        """ Journal modified accounts, legacy vaults are migrated to records with a full write, accounts that could not
+        be written stay marked as modified """
+        changes = self.snapshot_changes()
+        try:
+            self.write_changes(changes, self.snapshot_vault() if self.needs_compaction(changes) else None)
+        except Exception:
+            self.modified.update(self.accounts[position] for position in changes)
+            raise
+
+    def needs_compaction(self, changes: Dict[int, bytes]) -> bool:
+        """ Whether writing the changes needs a full write, vaults written with a legacy format or another cipher than
+        configured are migrated and a journal grown past the threshold is compacted """
+        if not is_record_vault(self.vault_path) or self.key.cipher != get_config().cipher:
+            return True
+
+        # Estimated before the changes are journaled, so the snapshot can be taken before handing them over
+        return self.journal.size + sum(map(len, changes.values())) > get_config().journal_threshold
+
+    def write_changes(self, changes: Dict[int, bytes], snapshot: VaultSnapshot = None) -> None:
+        """ Write snapshotted records, safe to call from the autosave thread, the vault is rewritten from the snapshot
+        when one is given """
+        if not is_record_vault(self.vault_path) or self.key.cipher != get_config().cipher:
+            if snapshot is None:    # Only the editing thread may snapshot the accounts, the changes are kept for then
+                raise ValueError(f'{self.vault_path} needs a full write from a snapshot of the vault.')
+            self.compact(background=False, snapshot=snapshot)
+        else:
+            self.journal.append(changes)
+
+            if snapshot is not None:
+                self.compact(snapshot=snapshot)
 
-        save_file(self.vault_path, cipher_text)
         logger.debug('Saved file to %s.', self.vault_path)
 
-    def close(self) -> None:
-        """ Close application and save data if modified """
-        if self.updated:
-            will_save = get_yes_no('Would you like to save the changes?')
-            if will_save:
-                self.save_data()
+    def snapshot_vault(self) -> VaultSnapshot:
+        """ Key and writer of the whole vault as it is now, taken on the editing thread so that a compaction running in
+        the background never reads the accounts while they are edited """
+        extra = {key: value for key, value in self.plain_data.items() if key != 'accounts'}
+
+        config = get_config()
+        schemas = new_table(config.record_format)
+        key = self.get_write_key()
+
+        names = [str(getattr(account, 'name', '')).lower() for account in self.accounts]
+        write = partial(write_vault, key=key, records=snapshot_accounts(self.accounts, schemas), extra=extra,
+                        compression=config.compression, schemas=schemas, names=names)
+        return key, write
+
+    def get_write_key(self) -> KeyContext:
+        """ Key a full write uses, with the configured cipher, a legacy key is replaced by a new one derived on first
+        use, as read-only sessions should not pay for a derivation they never need """
+        if self.sealed_password is not None:
+            if self.migration_key is None:
+                self.migration_key = self.new_key(self.session_key.unseal(self.sealed_password))
+            return self.migration_key
+
+        cipher = get_config().cipher
+        return self.key if self.key.cipher == cipher else self.key.with_cipher(cipher)
+
+    @timed('PlainSight.compact')
+    def compact(self, background: bool = True, snapshot: VaultSnapshot = None) -> None:
+        """ Rewrite the whole vault from a snapshot of the accounts and clear the journal, the snapshot is taken now
+        unless given
+
+        Changing the cipher always rewrites in the foreground, the journal must switch key only once the vault has.
+        """
+        # Edits made while the vault is written are journaled and don't change the snapshot
+        key, write = snapshot if snapshot is not None else self.snapshot_vault()
+
+        if self.journal.compact(write, background and key is self.key) and key is not self.key:
+            logger.info('Migrated %s from %s to %s.', self.vault_path, self.key.cipher, key.cipher)
+            self.key = self.journal.key = key
+            self.sealed_password = self.migration_key = None
+
+    def enable_autosave(self, delay: float) -> None:
+        """ Save edits in the background once no further edit was made for the delay """
+        self.autosave = Autosaver(self.write_changes, delay)
 
-        del self.password
+    def close(self) -> None:
+        """ Close application and save data if modified, when saving fails the shell stays open unless asked not to """
+        try:
+            if self.autosave is not None:
+                self.autosave.flush(raise_errors=True)
+            elif self.updated:
+                will_save = get_yes_no('Would you like to save the changes?')
+                if will_save:
+                    self.save_data()
+        except (OSError, ValueError) as e:
+            print(f'Could not save {self.vault_path}: {e}')
+            if not get_yes_no('Close without saving? Choosing n returns to the shell to retry with c.'):
+                return
+        self.journal.wait()
+
+        del self.key
         del self.plain_data
 
         exit(0)
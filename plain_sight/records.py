@@ -0,0 +1,159 @@
+from json import dumps, loads
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+JSON_RECORDS = 'json'
+BINARY_RECORDS = 'binary'
+RECORD_FORMATS = (JSON_RECORDS, BINARY_RECORDS)
+DEFAULT_RECORD_FORMAT = BINARY_RECORDS
+
+_ENCODING = 'utf8'
+_JSON_VALUE = 1         # Low bit of a field tag, set when the value is JSON rather than a plain string
+_CONTINUATION = 0x80    # High bit of a varint byte, set on every byte but the last
+
+Schema = Tuple[str, ...]
+# Field names and values of a record in the order they were written
+Row = Tuple[Schema, List[Any]]
+Decoder = Callable[[bytes], Row]
+
+
+def encode_varint(value: int, output: bytearray) -> None:
+    """ Append an unsigned integer seven bits at a time, least significant first """
+    while value >= _CONTINUATION:
+        output.append(value & 0x7f | _CONTINUATION)
+        value >>= 7
+
+    output.append(value)
+
+
+def decode_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """ Value of the varint at the position and the position after it """
+    value = 0
+    shift = 0
+
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+
+        if byte < _CONTINUATION:
+            return value, position
+        shift += 7
+
+
+class SchemaTable:
+    """ Binary record codec, the field names of each distinct schema are stored once per vault instead of in every
+    record
+
+    A record is the varint number of its schema, a varint per value holding its length in characters shifted left past
+    the JSON flag, then the UTF-8 text of every value back to back so the whole record is decoded in one call.
+    """
+    def __init__(self, schemas: Iterable[Iterable[str]] = ()):
+        self.schemas: List[Schema] = [tuple(schema) for schema in schemas]
+        self.numbers: Dict[Schema, int] = {schema: number for number, schema in enumerate(self.schemas)}
+
+    def number(self, schema: Schema) -> int:
+        """ Number of a schema, new schemas are numbered in order of first use """
+        number = self.numbers.get(schema)
+        if number is None:
+            number = self.numbers[schema] = len(self.schemas)
+            self.schemas.append(schema)
+
+        return number
+
+    def encode(self, schema: Schema, values: List[Any]) -> bytes:
+        """ Binary record for field names and values """
+        record = bytearray()
+        encode_varint(self.number(schema), record)
+
+        texts = []
+        for value in values:
+            if type(value) is str:
+                encode_varint(len(value) << 1, record)
+                texts.append(value)
+            else:
+                text = dumps(value)
+                encode_varint(len(text) << 1 | _JSON_VALUE, record)
+                texts.append(text)
+
+        record += ''.join(texts).encode(_ENCODING)
+        return bytes(record)
+
+    def decode(self, record: bytes) -> Dict[str, Any]:
+        """ Fields of a binary record """
+        return dict(zip(*self.decode_row(record)))
+
+    def decode_row(self, record: bytes) -> Row:
+        """ Field names and values of a binary record, single byte varints, nearly all of them, skip the varint loop """
+        try:
+            number = record[0]
+            if number < _CONTINUATION:
+                position = 1
+            else:
+                number, position = decode_varint(record, 0)
+            schema = self.schemas[number]
+
+            lengths = []
+            for _ in schema:
+                length = record[position]
+                if length < _CONTINUATION:
+                    position += 1
+                else:
+                    length, position = decode_varint(record, position)
+                lengths.append(length)
+        except IndexError:
+            raise ValueError('Truncated record or unknown schema.')
+
+        text = record[position:].decode(_ENCODING)
+        values = []
+        start = 0
+
+        for length in lengths:
+            end = start + (length >> 1)
+            value = text[start:end]
+            values.append(loads(value) if length & _JSON_VALUE else value)
+            start = end
+
+        if start != len(text):
+            raise ValueError('Record length does not match its values.')
+
+        return schema, values
+
+
+def decode_json(record: bytes) -> Row:
+    """ Field names and values of a JSON record """
+    fields = loads(record.decode(_ENCODING))
+
+    return tuple(fields), list(fields.values())
+
+
+def redact_record(record: bytes, secrets: AbstractSet[str], table: SchemaTable = None) -> Optional[bytes]:
+    """ Record with the values of secret fields emptied, None when it can't be decoded and may hold anything """
+    try:
+        schema, values = table.decode_row(record) if table is not None else decode_json(record)
+    except (ValueError, AttributeError):
+        return None
+
+    values = ['' if field in secrets else value for field, value in zip(schema, values)]
+    if table is not None:
+        return table.encode(schema, values)
+
+    return dumps(dict(zip(schema, values))).encode(_ENCODING)
+
+
+def get_decoder(record_format: str, schemas: List[List[str]]) -> Decoder:
+    """ Decoder for the records of a vault, binary records need the vault's schemas """
+    if record_format == BINARY_RECORDS:
+        return SchemaTable(schemas).decode_row
+    if record_format == JSON_RECORDS:
+        return decode_json
+
+    raise ValueError(f'Unknown record format {record_format!r}.')
+
+
+def new_table(record_format: str) -> Optional[SchemaTable]:
+    """ Schema table to write a vault with, None for JSON records """
+    if record_format not in RECORD_FORMATS:
+        raise ValueError(f'Unknown record format {record_format!r}, expected one of {", ".join(RECORD_FORMATS)}.')
+
+    return SchemaTable() if record_format == BINARY_RECORDS else None
@@ -0,0 +1,145 @@
+from concurrent.futures import Executor
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+from plain_sight.encryption import decrypt_data, encrypt_data, Key, KeyContext
+from plain_sight.file_io import map_file, replace_file
+from plain_sight.journal import Journal
+from plain_sight.log import get_logger
+from plain_sight.timing import timed
+from plain_sight.vault import is_record_vault, read_header, read_index, unlock, write_encrypted_vault
+from plain_sight.workers import count_workers, get_state, iter_chunks, map_chunks, worker_pool
+
+
+# Records sent to a worker at a time, chunks line up between re-encrypting and verifying to compare their digests
+_CHUNK_RECORDS = 4096
+_REKEY_SUFFIX = '.rekey'
+
+logger = get_logger('rekey')
+
+# Stage name, records done and records in the vault
+Progress = Callable[[str, int, int], None]
+
+
+def reencrypt_chunk(records: List[bytes]) -> Tuple[List[bytes], bytes]:
+    """ Records encrypted with the new key and a digest of their plaintext for verification, run by the workers
+    started with the old and the new key """
+    old_key, new_key = get_state()
+    digest = sha256()
+    cipher_texts = []
+
+    for record in records:
+        plain_text = decrypt_data(old_key, record)
+        digest.update(len(plain_text).to_bytes(4, 'big') + plain_text)
+        cipher_texts.append(encrypt_data(new_key, plain_text))
+
+    return cipher_texts, digest.digest()
+
+
+def digest_chunk(records: List[bytes]) -> bytes:
+    """ Digest of records decrypted with the new key, matching the one computed while re-encrypting them """
+    _, new_key = get_state()
+    digest = sha256()
+
+    for record in records:
+        plain_text = decrypt_data(new_key, record)
+        digest.update(len(plain_text).to_bytes(4, 'big') + plain_text)
+
+    return digest.digest()
+
+
+def reencrypt(executor: Optional[Executor], chunks: Iterable[List[bytes]], workers: int, digests: List[bytes],
+              total: int, progress: Progress = None) -> Iterator[bytes]:
+    """ Re-encrypted records in order, the digest of every chunk is appended as it completes """
+    done = 0
+
+    for cipher_texts, digest in map_chunks(executor, reencrypt_chunk, chunks, workers):
+        digests.append(digest)
+        yield from cipher_texts
+
+        done += len(cipher_texts)
+        if progress is not None:
+            progress('re-encrypting', done, total)
+
+
+def fold_journal(vault_path: Path, password: Key) -> None:
+    """ Rewrite a legacy vault or one with journaled edits, the journal is encrypted with the key being replaced """
+    from plain_sight.plain_sight import PlainSight
+
+    if is_record_vault(vault_path) and not has_journal(vault_path):
+        return
+
+    logger.info('Saving journaled edits to %s before re-keying.', vault_path)
+    PlainSight(vault_path, password).compact(background=False)
+
+    if has_journal(vault_path):
+        raise ValueError(f'Could not save the journal of {vault_path}, the vault was not re-keyed.')
+
+
+def has_journal(vault_path: Path) -> bool:
+    """ Whether edits to the vault are journaled, including by a compaction that did not finish """
+    journal = Journal(vault_path, None)
+
+    return journal.path.exists() or journal.compacting_path.exists()
+
+
+@timed('rekey_vault')
+def rekey_vault(vault_path: Union[Path, str], password: Key, new_key: KeyContext, workers: int = None,
+                progress: Progress = None) -> int:
+    """ Re-encrypt every record with a new key across worker processes, returns the number of records
+
+    The new vault is written next to the old one and only replaces it once all of it decrypts to the same records
+    under the new key. Records are copied as they are, compressed and encoded, only their encryption changes.
+    """
+    vault_path = Path(vault_path)
+    temporary_path = vault_path.with_name(vault_path.name + _REKEY_SUFFIX)
+    fold_journal(vault_path, password)
+    modified = vault_path.stat().st_mtime_ns
+
+    try:
+        with map_file(vault_path) as view:
+            header = read_header(view)
+            old_key = unlock(header, password)
+            index, _ = read_index(view, old_key)
+            entries = index['records']
+            total = len(entries)
+
+            workers = count_workers(workers, total, _CHUNK_RECORDS)
+            digests: List[bytes] = []
+
+            with worker_pool((old_key, new_key), workers) as executor:
+                chunks = iter_chunks(view, entries, _CHUNK_RECORDS)
+                write_encrypted_vault(temporary_path, new_key, header, index,
+                                      reencrypt(executor, chunks, workers, digests, total, progress))
+                verify(temporary_path, new_key, executor, digests, workers, progress)
+
+        if vault_path.stat().st_mtime_ns != modified or has_journal(vault_path):
+            raise ValueError(f'{vault_path} was saved by another process while re-keying, try again.')
+
+        replace_file(temporary_path, vault_path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+    logger.debug('Re-keyed %d records of %s with %d workers.', total, vault_path, workers)
+    return total
+
+
+def verify(vault_path: Path, key: KeyContext, executor: Optional[Executor], digests: List[bytes], workers: int,
+           progress: Progress = None) -> None:
+    """ Check that a re-keyed vault opens with the new key and holds exactly the records that were re-encrypted """
+    with map_file(vault_path) as view:
+        index, _ = read_index(view, unlock(read_header(view), key))
+        entries = index['records']
+        checked = 0
+
+        for digest in map_chunks(executor, digest_chunk, iter_chunks(view, entries, _CHUNK_RECORDS), workers):
+            if checked >= len(digests) or digest != digests[checked]:
+                raise ValueError(f'Records of chunk {checked} changed while re-keying.')
+
+            checked += 1
+            if progress is not None:
+                progress('verifying', min(checked * _CHUNK_RECORDS, len(entries)), len(entries))
+
+    if checked != len(digests):
+        raise ValueError('Re-keyed vault is missing records.')
@@ -0,0 +1,234 @@
+from array import array
+from bisect import bisect_left
+from heapq import heappop, heappush, nsmallest
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from plain_sight.account import Account, _SKIP_ATTRIBUTES
+from plain_sight.timing import timed
+
+
+_GRAM_LENGTH = 3
+_FIELD_CLASSES = {'name': 'n', 'login': 'l'}
+_OTHER_CLASS = 'o'
+_CLASSES = ('n', 'l', 'o')
+
+# Every combination of matched field classes, best first, name outweighs login outweighs everything else
+_TIERS = (('n', 'l', 'o'), ('n', 'l'), ('n', 'o'), ('n',), ('l', 'o'), ('l',), ('o',))
+_EXACT_TIER = 0
+_TIER_NUMBERS = {frozenset(tier): tier_number for tier_number, tier in enumerate(_TIERS, _EXACT_TIER + 1)}
+_DOCUMENT_TYPE = 'I'        # Postings hold four byte document numbers, sorted so they can be searched and merged
+
+# Tier a result matched in, exact names first, then its position in the vault, lower ranks are better
+Rank = Tuple[int, int]
+# Postings of every gram of a query in a field class, shortest first, None when some gram is in no document
+Postings = Optional[List[array]]
+
+
+def get_grams(text: str) -> Set[str]:
+    """ Trigrams of padded text, plus the first two characters of every word """
+    grams = {text[index:index + _GRAM_LENGTH] for index in range(len(text) - _GRAM_LENGTH + 1)}
+    grams.update(text[index:index + 2] for index in range(len(text) - 2) if text[index] == ' ')
+
+    return grams
+
+
+def get_pattern(query: str) -> str:
+    """ Text a field must contain to match, queries shorter than a trigram match the start of a word """
+    return query if len(query) >= _GRAM_LENGTH else f' {query}'
+
+
+def get_fields(account: Account) -> Tuple[Tuple[str, str], ...]:
+    """ Padded lower case searchable attribute values, secrets are never indexed """
+    return tuple(
+        (_FIELD_CLASSES.get(attribute, _OTHER_CLASS), f' {str(getattr(account, attribute)).lower()} ')
+        for attribute in account.get_attributes() if attribute not in _SKIP_ATTRIBUTES
+    )
+
+
+def get_tier(fields: Tuple[Tuple[str, str], ...], pattern: str, exact_name: str) -> Optional[int]:
+    """ Tier of an account's searchable fields, None when none of them contains the pattern """
+    if ('n', exact_name) in fields:
+        return _EXACT_TIER
+
+    matched = frozenset(field_class for field_class, value in fields if pattern in value)
+    return _TIER_NUMBERS[matched] if matched else None
+
+
+def get_class_grams(fields: Tuple[Tuple[str, str], ...]) -> Dict[str, Set[str]]:
+    """ Grams of the fields of every class """
+    grams: Dict[str, Set[str]] = {field_class: set() for field_class in _CLASSES}
+    for field_class, value in fields:
+        grams[field_class].update(get_grams(value))
+
+    return grams
+
+
+def contains(posting: array, document: int) -> bool:
+    """ Whether a sorted posting holds the document """
+    position = bisect_left(posting, document)
+    return position < len(posting) and posting[position] == document
+
+
+def search_accounts(accounts: Iterable[Account], query: str, limit: int) -> List[Tuple[Rank, Account]]:
+    """ Rank accounts like SearchIndex.search_ranked with a single scan, cheaper than indexing for a one-off search """
+    query = query.lower()
+    pattern = get_pattern(query)
+    exact_name = f' {query} '
+    ranked = []
+
+    for document, account in enumerate(accounts):
+        tier = _EXACT_TIER if query == '' else get_tier(get_fields(account), pattern, exact_name)
+        if tier is not None:
+            ranked.append(((tier, document), account))
+
+    return nsmallest(limit, ranked, key=itemgetter(0))
+
+
+class SearchIndex:
+    """ Inverted trigram index over account attributes, only sorted postings are kept per field class
+
+    Grams an edited account no longer has stay in their postings until a search finds the account doesn't match, so
+    nothing but the postings has to be remembered per account. Results are always ranked on current values.
+    """
+    def __init__(self, accounts: Iterable[Account] = ()):
+        self.documents: List[Account] = []
+        self.ids: Dict[Account, int] = {}
+        self.postings: Dict[str, Dict[str, array]] = {field_class: {} for field_class in _CLASSES}
+        self.names: Dict[str, array] = {}
+
+        for account in accounts:
+            self.add(account)
+
+    def add(self, account: Account) -> None:
+        """ Index a new account, documents are numbered in order so appending keeps postings sorted """
+        document = len(self.documents)
+        self.ids[account] = document
+        self.documents.append(account)
+
+        fields = get_fields(account)
+        for field_class, grams in get_class_grams(fields).items():
+            postings = self.postings[field_class]
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array(_DOCUMENT_TYPE)
+                posting.append(document)
+
+        for field_class, value in fields:
+            if field_class == 'n':
+                posting = self.names.get(value)
+                if posting is None:
+                    posting = self.names[value] = array(_DOCUMENT_TYPE)
+                posting.append(document)
+
+    def update(self, account: Account) -> None:
+        """ Index the current grams of an edited account, accounts that were never indexed are added """
+        document = self.ids.get(account)
+        if document is None:
+            return self.add(account)
+
+        fields = get_fields(account)
+        postings = [(self.postings[field_class], grams) for field_class, grams in get_class_grams(fields).items()]
+        postings.append((self.names, [value for field_class, value in fields if field_class == 'n']))
+
+        for class_postings, keys in postings:
+            for key in keys:
+                posting = class_postings.get(key)
+                if posting is None:
+                    posting = class_postings[key] = array(_DOCUMENT_TYPE)
+
+                position = bisect_left(posting, document)
+                if position == len(posting) or posting[position] != document:
+                    posting.insert(position, document)
+
+    def get_postings(self, grams: Iterable[str], field_class: str) -> Postings:
+        """ Postings a document of the class must be in to contain every gram """
+        postings = self.postings[field_class]
+        found = [postings.get(gram) for gram in grams]
+
+        return None if not found or None in found else sorted(found, key=len)
+
+    def iter_tier(self, postings: Dict[str, Postings], tier: Tuple[str, ...]) -> Iterator[int]:
+        """ Documents in order whose postings match exactly the classes of the tier, the shortest posting of its
+        classes is walked so a tier can stop as soon as enough results are found """
+        if any(postings[field_class] is None for field_class in tier):
+            return
+
+        required = [postings[field_class] for field_class in tier]
+        excluded = [postings[field_class] for field_class in _CLASSES
+                    if field_class not in tier and postings[field_class] is not None]
+
+        for document in min((class_postings[0] for class_postings in required), key=len):
+            if all(contains(posting, document) for class_postings in required for posting in class_postings) and \
+                    not any(all(contains(posting, document) for posting in class_postings)
+                            for class_postings in excluded):
+                yield document
+
+    def iter_candidates(self, grams: Set[str], exact_name: str) -> Iterator[Rank]:
+        """ Ranks the postings give documents, in rank order, edited accounts may rank lower once checked """
+        yield from ((_EXACT_TIER, document) for document in self.names.get(exact_name, ()))
+
+        postings = {field_class: self.get_postings(grams, field_class) for field_class in _CLASSES}
+        for tier_number, tier in enumerate(_TIERS, _EXACT_TIER + 1):
+            yield from ((tier_number, document) for document in self.iter_tier(postings, tier))
+
+    def prune(self, document: int, grams: Set[str], exact_name: str) -> None:
+        """ Drop the document from postings of the query it no longer belongs to """
+        fields = get_fields(self.documents[document])
+        current = get_class_grams(fields)
+        stale = [(postings, grams.difference(current[field_class])) for field_class, postings in self.postings.items()]
+        if ('n', exact_name) not in fields:
+            stale.append((self.names, {exact_name}))
+
+        for postings, keys in stale:
+            for key in keys:
+                posting = postings.get(key)
+                if posting is not None and contains(posting, document):
+                    del posting[bisect_left(posting, document)]
+
+    @timed('SearchIndex.search')
+    def search(self, query: str, limit: int) -> List[Account]:
+        """ Return the best matching accounts, at most limit of them """
+        return [account for _, account in self.search_ranked(query, limit)]
+
+    def search_ranked(self, query: str, limit: int) -> List[Tuple[Rank, Account]]:
+        """ Best matching accounts in rank order with their ranks, so results of several vaults can be merged """
+        query = query.lower()
+        if query == '':
+            return [((_EXACT_TIER, document), account) for document, account in enumerate(self.documents[:limit])]
+
+        pattern = get_pattern(query)
+        exact_name = f' {query} '
+        grams = get_grams(pattern) if len(query) >= _GRAM_LENGTH else {pattern}
+        results: List[Rank] = []
+        checked: Set[int] = set()
+        pending: List[Rank] = []
+        stale: List[int] = []
+
+        # A document's current rank is never better than the one its postings give, so checked ranks are final once
+        # candidates reach them
+        for candidate in self.iter_candidates(grams, exact_name):
+            while pending and pending[0] <= candidate and len(results) < limit:
+                results.append(heappop(pending))
+            if len(results) >= limit:
+                break
+
+            document = candidate[1]
+            if document in checked:
+                continue
+            checked.add(document)
+
+            tier = get_tier(get_fields(self.documents[document]), pattern, exact_name)
+            if tier != candidate[0]:
+                stale.append(document)
+            if tier is not None:
+                heappush(pending, (tier, document))
+
+        while pending and len(results) < limit:
+            results.append(heappop(pending))
+
+        # Pruned once the postings are no longer being walked
+        for document in stale:
+            self.prune(document, grams, exact_name)
+
+        return [(rank, self.documents[rank[1]]) for rank in results]
@@ -0,0 +1,137 @@
+from codecs import getincrementaldecoder
+from json import JSONDecoder, JSONDecodeError
+from re import compile
+from typing import Any, Iterable, Iterator, Tuple
+
+
+_ENCODING = 'utf8'
+_ACCOUNTS_KEY = 'accounts'
+whitespace_pattern = compile(r'[ \t\n\r]*')
+decoder = JSONDecoder()
+
+
+def decode_stream(chunks: Iterable[bytes]) -> Iterator[str]:
+    """ Decode a stream of bytes without splitting multi-byte characters """
+    text_decoder = getincrementaldecoder(_ENCODING)()
+
+    for chunk in chunks:
+        yield text_decoder.decode(chunk)
+    yield text_decoder.decode(b'', final=True)
+
+
+class TextBuffer:
+    """ Sliding window over a stream of text, only unparsed text is kept """
+    def __init__(self, chunks: Iterable[str]):
+        self.chunks = iter(chunks)
+        self.text = ''
+        self.position = 0
+
+    def fill(self) -> bool:
+        """ Drop consumed text and read the next chunk, returns False once the stream is exhausted """
+        for chunk in self.chunks:
+            self.text = self.text[self.position:] + chunk
+            self.position = 0
+            return True
+
+        return False
+
+    def peek(self) -> str:
+        """ Skip whitespace and return the next character, empty at the end of the stream """
+        while True:
+            self.position = whitespace_pattern.match(self.text, self.position).end()
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        """ Consume the next character, which must be one of the given characters """
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise JSONDecodeError(f'Expected one of {characters!r}', self.text, self.position)
+
+        self.position += 1
+        return character
+
+    def value(self) -> Any:
+        """ Decode the next JSON value, reading more of the stream while it is incomplete """
+        self.peek()
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.position)
+            except JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.text) and self.fill():
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_array(buffer: TextBuffer) -> Iterator[Any]:
+    """ Consume the array at the front of the buffer, each element is yielded as it is parsed """
+    buffer.expect('[')
+    if buffer.peek() == ']':
+        buffer.expect(']')
+        return
+
+    while True:
+        yield buffer.value()
+        if buffer.expect(',]') == ']':
+            return
+
+
+def iter_vault_items(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """ Incrementally parse a vault document, each account is yielded as it is parsed """
+    buffer = TextBuffer(chunks)
+    if buffer.peek() == '':     # Empty vault
+        return
+
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        key = buffer.value()
+        buffer.expect(':')
+
+        if key == _ACCOUNTS_KEY and buffer.peek() == '[':
+            for value in iter_array(buffer):
+                yield key, value
+        else:
+            yield key, buffer.value()
+
+        if buffer.expect(',}') == '}':
+            return
+
+
+def iter_json_records(chunks: Iterable[str], keys: Tuple[str, ...]) -> Iterator[Any]:
+    """ Incrementally parse an export, either a top-level array or an object holding arrays under the given keys """
+    buffer = TextBuffer(chunks)
+    character = buffer.peek()
+    if character == '':
+        return
+    if character == '[':
+        yield from iter_array(buffer)
+        return
+
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        key = buffer.value()
+        buffer.expect(':')
+
+        if key in keys and buffer.peek() == '[':
+            yield from iter_array(buffer)
+        else:
+            buffer.value()
+
+        if buffer.expect(',}') == '}':
+            return
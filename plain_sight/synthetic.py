@@ -0,0 +1,37 @@
+""" Deterministic synthetic accounts, shared by the tests and the benchmarks """
+from random import Random
+from typing import Iterator
+
+
+_SERVICES = (
+    'github', 'gitlab', 'bitbucket', 'google', 'gmail', 'outlook', 'amazon', 'aws console', 'azure portal', 'netflix',
+    'spotify', 'dropbox', 'slack', 'discord', 'twitter', 'linkedin', 'facebook', 'instagram', 'reddit', 'paypal',
+    'bank of example', 'credit union', 'electric utility', 'water utility', 'internet provider', 'mobile carrier',
+    'pharmacy', 'library card', 'airline rewards', 'hotel rewards', 'car rental', 'insurance portal', 'tax office',
+    'university portal', 'work vpn', 'home router', 'nas admin', 'printer admin', 'wifi guest', 'database prod'
+)
+_FIRST_NAMES = ('alex', 'sam', 'jordan', 'taylor', 'casey', 'riley', 'morgan', 'jamie', 'avery', 'quinn')
+_DOMAINS = ('example.com', 'example.org', 'mail.test', 'corp.example', 'home.arpa')
+_PASSWORD_CHARACTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*'
+_NOTE_RATE = 0.3
+
+
+def iter_accounts(count: int, seed: int = 0) -> Iterator[dict]:
+    """ Accounts with a realistic mix of repeated services, logins and optional fields """
+    rng = Random(seed)
+
+    for index in range(count):
+        service = rng.choice(_SERVICES)
+        first_name = rng.choice(_FIRST_NAMES)
+        domain = rng.choice(_DOMAINS)
+
+        account = {
+            'name': f'{service} {index}',
+            'login': f'{first_name}{rng.randrange(100)}@{domain}',
+            'password': ''.join(rng.choice(_PASSWORD_CHARACTERS) for _ in range(20)),
+            'url': f'https://{service.replace(" ", "-")}.{domain}/login'
+        }
+        if rng.random() < _NOTE_RATE:
+            account['notes'] = f'recovery codes kept offline, rotated {rng.randrange(1, 13)}/{rng.randrange(2015, 2026)}'
+
+        yield account
@@ -0,0 +1,166 @@
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from threading import local
+from time import perf_counter
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+
+_DISABLED = nullcontext()
+_CALLS, _SECONDS, _PEAK = range(3)
+_IMPORT_TIME_PATTERN = r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)'
+_LAZY_PACKAGES = ('cryptography',)     # Only imported once a command encrypts or decrypts
+
+Function = TypeVar('Function', bound=Callable)
+
+_enabled = False
+_memory = False
+_started = 0.0
+_offset = 0     # Traced memory dropped by clearing the traces, on Python versions without reset_peak
+_stats: Dict[str, List[float]] = {}
+_state = local()
+
+
+def enable(memory: bool = False) -> None:
+    """ Start collecting stage timings, and peak traced memory per stage when memory is set """
+    global _enabled, _memory, _started, _offset
+
+    _stats.clear()
+    _enabled, _memory, _started, _offset = True, memory, perf_counter(), 0
+    if memory:
+        # Imported on demand as tracemalloc pulls in pickle
+        from tracemalloc import start
+        start()
+
+
+def disable() -> None:
+    """ Stop collecting, collected timings are kept for the report """
+    global _enabled, _memory
+
+    if _memory:
+        from tracemalloc import stop
+        stop()
+    _enabled, _memory = False, False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str) -> ContextManager:
+    """ Time a block as the named stage, a shared no-op context when instrumentation is off """
+    return _measure(name) if _enabled else _DISABLED
+
+
+def timed(name: Optional[str] = None) -> Callable[[Function], Function]:
+    """ Time every call of a function as a stage, only a flag check is added while instrumentation is off """
+    def decorator(function: Function) -> Function:
+        stage = name if name is not None else function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            with _measure(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def _measure(name: str) -> Iterator[None]:
+    """ Record the duration, and with memory tracing the peak allocation, of the enclosed block """
+    memory = _memory
+    if memory:
+        # Every open span keeps the highest peak seen inside it, as starting a span resets the traced peak
+        peaks = _state.__dict__.setdefault('peaks', [])
+        current, peak = _get_traced_memory()
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        peaks.append(0)
+        _reset_peak()
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - started
+
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = [0, 0.0, 0]
+        stats[_CALLS] += 1
+        stats[_SECONDS] += elapsed
+
+        if memory:
+            _, peak = _get_traced_memory()
+            peak = max(peaks.pop(), peak)
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            stats[_PEAK] = max(stats[_PEAK], peak - current)
+
+
+def _get_traced_memory() -> Tuple[int, int]:
+    """ Current and peak traced memory since tracing started, including memory of traces cleared by _reset_peak """
+    from tracemalloc import get_traced_memory
+
+    current, peak = get_traced_memory()
+    return current + _offset, peak + _offset
+
+
+def _reset_peak() -> None:
+    """ Restart the traced peak from the current memory
+
+    Python 3.8 and older have no reset_peak, the traces are cleared instead and the memory they held is kept in the
+    offset. Blocks allocated before and freed after that still count as traced, so peaks may come out slightly high.
+    """
+    global _offset
+    import tracemalloc
+
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.clear_traces()
+        _offset += current
+
+
+def report() -> str:
+    """ Per-stage breakdown, stages nest so their shares of the total can add up to more than all of it """
+    total = perf_counter() - _started
+    lines = [f'{"stage":<28} {"calls":>8} {"total ms":>10} {"mean ms":>10} {"share":>7}'
+             + (f' {"peak KiB":>10}' if _memory else '')]
+
+    for name, (calls, seconds, peak) in sorted(_stats.items(), key=lambda item: -item[1][_SECONDS]):
+        line = f'{name:<28} {calls:>8} {seconds * 1e3:>10.2f} {seconds / calls * 1e3:>10.3f} {seconds / total:>7.1%}'
+        lines.append(line + (f' {peak / 1024:>10.1f}' if _memory else ''))
+
+    lines.append(f'{"wall":<28} {"":>8} {total * 1e3:>10.2f}')
+    return '\n'.join(lines)
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """ Self and cumulative import time in microseconds of every module imported by a fresh interpreter """
+    # Imported on demand, only the startup checks measure imports
+    from re import compile
+    from subprocess import run
+    from sys import executable
+
+    output = run([executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True,
+                 check=True).stderr
+    line_pattern = compile(_IMPORT_TIME_PATTERN)
+
+    times = {}
+    for line in output.splitlines():
+        match = line_pattern.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+
+    return times
+
+
+def forbidden_imports(times: Dict[str, Tuple[int, int]], forbidden: Tuple[str, ...] = _LAZY_PACKAGES) -> List[str]:
+    """ Imported modules that belong to a package which should only be imported on demand """
+    return sorted(name for name in times if name.split('.')[0] in forbidden)
@@ -0,0 +1,270 @@
+from csv import DictReader, DictWriter, Error as CsvError
+from itertools import islice
+from pathlib import Path
+from sys import stdout
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple
+from urllib.parse import urlparse
+from plain_sight.account import Account, serialize_accounts
+from plain_sight.file_io import iter_file, open_private
+from plain_sight.log import get_logger
+from plain_sight.stream import decode_stream, iter_json_records
+
+
+_BATCH_SIZE = 1000
+_ENCODING = 'utf8'
+_CSV_ENCODING = 'utf-8-sig'     # Spreadsheet exports often start with a byte order mark
+_STDOUT = '-'
+
+# Arrays holding the records, this tool's own exports and Bitwarden's
+_RECORD_KEYS = ('accounts', 'items')
+
+# Field names used by other managers' exports, lower case, mapped to account fields
+_FIELD_ALIASES = {
+    'title': 'name',
+    'username': 'login',
+    'user': 'login',
+    'login_username': 'login',
+    'login_password': 'password',
+    'uri': 'url',
+    'login_uri': 'url',
+    'website': 'url',
+    'note': 'notes',
+    'extra': 'notes'
+}
+
+# Bookkeeping fields of other managers that mean nothing here, the password history would overwrite the password
+_IGNORED_FIELDS = {
+    'id', 'guid', 'type', 'folderid', 'organizationid', 'collectionids', 'favorite', 'fav', 'reprompt', 'match',
+    'revisiondate', 'creationdate', 'deleteddate', 'passwordhistory', 'fido2credentials', 'lastuseddate',
+    'httprealm', 'formactionorigin', 'timecreated', 'timelastused', 'timepasswordchanged'
+}
+
+_EXPORT_ORDER = ('name', 'login', 'password', 'url', 'notes')
+_DUPLICATE = 'duplicate of an existing account'
+
+logger = get_logger('transfer')
+
+Rejection = Callable[[int, str], None]
+
+
+class SaveError(Exception):
+    """ The imported accounts could not be written to the vault, nothing was imported """
+
+
+class ImportResult(NamedTuple):
+    """ Counts of the records an import added or skipped """
+    imported: int
+    duplicates: int
+    invalid: int
+
+
+def get_format(path: Path, format_name: Optional[str]) -> str:
+    """ Format given explicitly, otherwise from the file extension """
+    if format_name is None:
+        format_name = 'json' if str(path) == _STDOUT else path.suffix.lstrip('.').lower()
+
+    if format_name not in READERS:
+        raise ValueError(f'Unknown format {format_name!r}, expected one of {", ".join(READERS)}.')
+
+    return format_name
+
+
+def read_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    """ Stream rows of a CSV export with a header row """
+    with path.open(newline='', encoding=_CSV_ENCODING) as fl:
+        reader = DictReader(fl)
+
+        try:
+            for row in reader:
+                # Values of surplus columns are collected under None, they have no field name to import them as
+                yield {key: value for key, value in row.items() if key is not None}
+        except CsvError as e:
+            raise ValueError(f'line {reader.line_num}: {e}')
+
+
+def read_json(path: Path) -> Iterator[Any]:
+    """ Stream records of a JSON export, only one record is parsed and held at a time """
+    return iter_json_records(decode_stream(iter_file(path)), _RECORD_KEYS)
+
+
+READERS: Dict[str, Callable[[Path], Iterator[Any]]] = {
+    'csv': read_csv,
+    'json': read_json
+}
+
+
+def read_records(path: Path, format_name: Optional[str] = None) -> Iterator[Any]:
+    """ Stream raw records from an export in any supported format """
+    return READERS[get_format(path, format_name)](path)
+
+
+def flatten(record: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """ Fields of nested objects and lists of objects, custom fields stored as name and value pairs are unpacked """
+    for key, value in record.items():
+        if str(key).lower() in _IGNORED_FIELDS:
+            continue
+
+        if isinstance(value, dict):
+            yield from flatten(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and 'name' in item and 'value' in item:
+                    yield item['name'], item['value']
+                elif isinstance(item, dict):
+                    yield from flatten(item)
+        else:
+            yield key, value
+
+
+def normalize(record: Dict[str, Any]) -> Dict[str, str]:
+    """ Map an exported record to account fields, the first non-empty value of a field wins """
+    account: Dict[str, str] = {}
+
+    for key, value in flatten(record):
+        key = str(key).strip().lower()
+        key = _FIELD_ALIASES.get(key, key)
+
+        if key in _IGNORED_FIELDS or key in account or value is None or isinstance(value, bool) or value == '':
+            continue
+
+        account[key] = value if isinstance(value, str) else str(value)
+
+    # Browser exports only know the site
+    if 'name' not in account and 'url' in account:
+        account['name'] = urlparse(account['url']).netloc or account['url']
+
+    return account
+
+
+def validate(account: Dict[str, str]) -> Optional[str]:
+    """ Reason the account can't be imported, None when it can """
+    if 'name' not in account:
+        return 'missing name'
+    if 'password' not in account:
+        return 'missing password'
+
+    for key in account:
+        if key == '' or key.startswith('_') or hasattr(Account, key):
+            return f'field {key!r} is reserved'
+
+    return None
+
+
+def get_key(name: Any, login: Any) -> Tuple[str, str]:
+    """ Identity of an account for deduplication, ignoring case like name lookups do, fields may be any value """
+    return str(name).lower(), str(login).lower()
+
+
+def validate_batch(batch: List[Tuple[int, Any]], seen: Set[Tuple[str, str]]) \
+        -> Tuple[List[Dict[str, str]], List[Tuple[int, str]]]:
+    """ Split numbered records into new valid accounts and rejections, accepted accounts are added to seen """
+    accounts = []
+    rejected = []
+
+    for number, record in batch:
+        if not isinstance(record, dict):
+            rejected.append((number, 'not an object'))
+            continue
+
+        account = normalize(record)
+        reason = validate(account)
+        if reason is None:
+            key = get_key(account['name'], account.get('login', ''))
+            if key in seen:
+                reason = _DUPLICATE
+            else:
+                seen.add(key)
+
+        if reason is None:
+            accounts.append(account)
+        else:
+            rejected.append((number, reason))
+
+    return accounts, rejected
+
+
+def import_accounts(plain_sight, records: Iterable[Any], reject: Rejection = None,
+                    batch_size: int = _BATCH_SIZE) -> ImportResult:
+    """ Add the new valid records a batch at a time and rewrite the vault once, nothing is saved if reading fails
+
+    Raises SaveError when the vault could not be rewritten, the accounts are then only added in memory.
+    """
+    seen = {get_key(account, getattr(account, 'login', '')) for account in plain_sight.accounts}
+    numbered = enumerate(records, 1)
+    imported = duplicates = invalid = 0
+
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+
+        accounts, rejected = validate_batch(batch, seen)
+        imported += plain_sight.add_accounts(accounts)
+
+        for number, reason in rejected:
+            if reason == _DUPLICATE:
+                duplicates += 1
+            else:
+                invalid += 1
+
+            if reject is not None:
+                reject(number, reason)
+
+    # Every record is encrypted once, rather than once per journaled batch
+    if imported:
+        try:
+            plain_sight.compact(background=False)
+        except (OSError, ValueError) as e:
+            raise SaveError(f'Could not save {plain_sight.vault_path}: {e}') from e
+
+    logger.debug('Imported %d accounts, skipped %d duplicates and %d invalid records.', imported, duplicates, invalid)
+    return ImportResult(imported, duplicates, invalid)
+
+
+def get_fields(accounts: List[Account]) -> List[str]:
+    """ Every field used by the accounts, common fields first """
+    schemas = {account.get_attributes() for account in accounts}
+    fields = set().union(*schemas)
+
+    return [field for field in _EXPORT_ORDER if field in fields] + sorted(fields.difference(_EXPORT_ORDER))
+
+
+def write_csv(accounts: List[Account], fl: TextIO) -> None:
+    """ Write accounts as CSV with one column per field """
+    writer = DictWriter(fl, get_fields(accounts), restval='')
+    writer.writeheader()
+
+    for account in accounts:
+        writer.writerow(account.to_json())
+
+
+def write_json(accounts: List[Account], fl: TextIO) -> None:
+    """ Write accounts as a vault document, one record at a time """
+    fl.write('{"accounts": [')
+
+    separator = '\n  '
+    for record in serialize_accounts(accounts):
+        fl.write(separator)
+        fl.write(record.decode(_ENCODING))
+        separator = ',\n  '
+
+    fl.write('\n]}\n')
+
+
+WRITERS: Dict[str, Callable[[List[Account], TextIO], None]] = {
+    'csv': write_csv,
+    'json': write_json
+}
+
+
+def export_accounts(accounts: List[Account], path: Path, format_name: Optional[str] = None) -> int:
+    """ Write every account, including secrets, to a file only the current user can read, - writes to stdout """
+    write = WRITERS[get_format(path, format_name)]
+
+    if str(path) == _STDOUT:
+        write(accounts, stdout)
+    else:
+        with open_private(path) as fl:
+            write(accounts, fl)
+
+    return len(accounts)
@@ -0,0 +1,202 @@
+from functools import partial
+from pathlib import Path
+from struct import Struct
+from base64 import b64decode, b64encode
+from json import loads, dumps
+from os import fsync
+from typing import BinaryIO, Iterable, Iterator, List, Tuple, Union
+from plain_sight.encryption import encrypt_data, encrypt_into, encrypted_size, decrypt_data, new_kdf, \
+    Key, KeyContext, CBC, DEFAULT_CIPHER, LEGACY_KDF
+from plain_sight.file_io import map_file
+from plain_sight.compression import Codec, DEFAULT_CODEC, NO_COMPRESSION
+from plain_sight.records import redact_record, SchemaTable, BINARY_RECORDS, JSON_RECORDS
+from plain_sight.account import _SECRET_ATTRIBUTES
+from plain_sight.log import get_logger
+from plain_sight.timing import timed
+
+
+MAGIC = b'PSV\x00'
+_VERSION = 4     # Version 2 added compression, 3 binary records and 4 authenticated ciphers, older vaults use CBC
+_ENCODING = 'utf8'
+_HEADER_SIZE = Struct('>I')
+_TRAILER = Struct('>QI')
+_BUFFER_SIZE = 1 << 16
+
+logger = get_logger('vault')
+
+
+def is_record_vault(filename: Union[Path, str]) -> bool:
+    """ Check whether a file uses the record vault format """
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    try:
+        with filename.open('rb') as fl:
+            return fl.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_header(view: memoryview) -> dict:
+    """ Read the plaintext vault header """
+    if view[:len(MAGIC)] != MAGIC:
+        raise ValueError('File is not a record vault.')
+
+    size, = _HEADER_SIZE.unpack_from(view, len(MAGIC))
+    start = len(MAGIC) + _HEADER_SIZE.size
+    header = loads(bytes(view[start:start + size]).decode(_ENCODING))
+
+    if header.get('version', 1) > _VERSION:
+        raise ValueError(f'Vault format version {header["version"]} is newer than this version supports.')
+
+    return header
+
+
+def unlock(header: dict, key: Key) -> KeyContext:
+    """ Derive the vault key from a password with the KDF and cipher recorded in the header """
+    cipher = header.get('cipher', CBC)
+
+    if isinstance(key, KeyContext):
+        if key.kdf != header.get('kdf', LEGACY_KDF):
+            raise ValueError('Vault was written with a different key.')
+        return key if key.cipher == cipher else key.with_cipher(cipher)
+
+    return KeyContext(key, header.get('kdf', LEGACY_KDF), cipher)
+
+
+def read_index(view: memoryview, key: KeyContext) -> Tuple[dict, int]:
+    """ Read the encrypted record index and the offset it is stored at """
+    offset, size = _TRAILER.unpack_from(view, len(view) - _TRAILER.size)
+    codec = Codec(read_header(view).get('compression', NO_COMPRESSION))
+    index = loads(codec.decompress(decrypt_data(key, view[offset:offset + size])).decode(_ENCODING))
+
+    return index, offset
+
+
+def read_codec(header: dict, index: dict) -> Codec:
+    """ Codec the records of a vault were compressed with, the dictionary is kept in the encrypted index """
+    return Codec(header.get('compression', NO_COMPRESSION), b64decode(index.get('dictionary', '')))
+
+
+def read_record(view: memoryview, key: KeyContext, entry: List[int], codec: Codec = None) -> bytes:
+    """ Decrypt the record at an index entry straight out of the mapped vault """
+    offset, size = entry
+    record = decrypt_data(key, view[offset:offset + size])
+
+    return codec.decompress(record) if codec is not None else record
+
+
+def iter_records(view: memoryview, key: KeyContext, index: dict) -> Iterator[bytes]:
+    """ Decrypt and decompress records one at a time in index order """
+    codec = read_codec(read_header(view), index)
+
+    for entry in index['records']:
+        yield read_record(view, key, entry, codec)
+
+
+def load_record(filename: Union[Path, str], key: Key, position: int) -> bytes:
+    """ Decrypt a single record without reading the rest of the vault """
+    with map_file(filename) as view:
+        header = read_header(view)
+        key = unlock(header, key)
+        index, _ = read_index(view, key)
+
+        return read_record(view, key, index['records'][position], read_codec(header, index))
+
+
+def write_record(fl: BinaryIO, key: KeyContext, record: bytes, buffer: bytearray = None) -> List[int]:
+    """ Encrypt and write a record at the current position, returns its index entry """
+    offset = fl.tell()
+
+    if buffer is not None and encrypted_size(len(record)) <= len(buffer):
+        with memoryview(buffer) as view:
+            length = encrypt_into(key, record, view)
+            fl.write(view[:length])
+    else:
+        cipher_text = encrypt_data(key, record)
+        length = fl.write(cipher_text)
+
+    return [offset, length]
+
+
+def write_header(fl: BinaryIO, header: dict) -> None:
+    """ Write the magic bytes and the plaintext header at the start of a new vault """
+    data = dumps(header).encode(_ENCODING)
+
+    fl.write(MAGIC + _HEADER_SIZE.pack(len(data)) + data)
+
+
+def write_index(fl: BinaryIO, key: KeyContext, index: dict, codec: Codec) -> None:
+    """ Write the encrypted index and the trailer pointing at it, the index holds the dictionary so it is compressed
+    without one """
+    offset = fl.tell()
+    cipher_text = encrypt_data(key, Codec(codec.name).compress(dumps(index).encode(_ENCODING)))
+
+    fl.write(cipher_text + _TRAILER.pack(offset, len(cipher_text)))
+
+
+@timed('write_vault')
+def write_vault(filename: Union[Path, str], key: Key, records: Iterable[bytes], extra: dict = None,
+                compression: str = DEFAULT_CODEC, schemas: SchemaTable = None, journal: List[str] = None,
+                names: List[str] = None) -> None:
+    """ Write every record to a new vault with the key's cipher, a password is derived with fresh KDF parameters and
+    the default cipher
+
+    Records are binary when they were encoded with a schema table, it is stored once all records are written. Journal
+    generations already part of the records are listed in the index so their journal is never replayed again. Lower
+    case account names, in record order, let a single account be found without decrypting the others.
+    """
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    if not isinstance(key, KeyContext):
+        key = KeyContext(key, new_kdf(), DEFAULT_CIPHER)
+    record_format = BINARY_RECORDS if schemas is not None else JSON_RECORDS
+    header = {
+        'version': _VERSION, 'kdf': key.kdf, 'cipher': key.cipher, 'compression': compression, 'records': record_format
+    }
+    redact = partial(redact_record, secrets=_SECRET_ATTRIBUTES, table=schemas)
+    codec, records = Codec.train(compression, records, redact)
+
+    with filename.open('wb') as fl:
+        write_header(fl, header)
+
+        buffer = bytearray(_BUFFER_SIZE)
+        entries = [write_record(fl, key, codec.compress(record), buffer) for record in records]
+
+        index = {'records': entries, 'extra': extra or {}, 'dead': 0, 'journal': journal or []}
+        if codec.dictionary:
+            index['dictionary'] = b64encode(codec.dictionary).decode(_ENCODING)
+        if schemas is not None:
+            index['schemas'] = schemas.schemas
+        if names is not None:
+            index['names'] = names
+        write_index(fl, key, index, codec)
+
+        fl.flush()
+        fsync(fl.fileno())
+
+    logger.debug('Wrote %d records to %s.', len(entries), filename)
+
+
+def write_encrypted_vault(filename: Union[Path, str], key: KeyContext, header: dict, index: dict,
+                          cipher_texts: Iterable[bytes]) -> None:
+    """ Write records already encrypted with the key, everything else is kept from the header and index they were
+    read with, so re-encrypting a vault never decompresses or decodes its records """
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    with filename.open('wb') as fl:
+        write_header(fl, {**header, 'version': _VERSION, 'kdf': key.kdf, 'cipher': key.cipher})
+
+        entries = []
+        for cipher_text in cipher_texts:
+            entries.append([fl.tell(), len(cipher_text)])
+            fl.write(cipher_text)
+
+        write_index(fl, key, {**index, 'records': entries, 'dead': 0}, Codec(header.get('compression', NO_COMPRESSION)))
+
+        fl.flush()
+        fsync(fl.fileno())
+
+    logger.debug('Wrote %d encrypted records to %s.', len(entries), filename)
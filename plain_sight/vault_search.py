@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from heapq import merge
+from itertools import islice
+from os import cpu_count
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+from plain_sight.account import Account
+from plain_sight.encryption import Key
+from plain_sight.log import get_logger
+from plain_sight.search import Rank, search_accounts
+from plain_sight.timing import timed
+
+
+# Key derivation is memory hard, unlocking more vaults at once than there are CPUs only slows every one of them down
+_MAX_WORKERS = 32
+
+logger = get_logger('vault_search')
+
+Failure = Callable[[Path, Exception], None]
+
+
+class VaultMatch(NamedTuple):
+    """ An account found by searching several vaults and the vault it is in """
+    vault: Path
+    account: Account
+
+
+def search_vault(vault_path: Path, password: Key, query: str, limit: int) -> List[Tuple[Rank, Account]]:
+    """ Unlock a single vault, including its journaled edits, and search it without building an index """
+    from plain_sight.plain_sight import PlainSight
+
+    if not vault_path.is_file():
+        raise FileNotFoundError(f'Vault {vault_path} does not exist.')
+
+    return search_accounts(PlainSight(vault_path, password).accounts, query, limit)
+
+
+@timed('search_vaults')
+def search_vaults(vaults: Sequence[Tuple[Path, Key]], query: str, limit: int, workers: int = None,
+                  fail: Failure = None) -> List[VaultMatch]:
+    """ Search vaults concurrently, one per CPU by default, and merge the best results of all of them
+
+    Deriving the key, the slowest part of opening a vault, releases the GIL, so vaults unlock in parallel. Results are
+    ranked by the tier they matched in, then by position in their vault, then by the order the vaults were given. A
+    vault that can't be opened or searched is passed to fail and left out.
+    """
+    workers = workers or max(1, min(len(vaults), cpu_count() or 1, _MAX_WORKERS))
+    ranked = []
+
+    with ThreadPoolExecutor(workers, thread_name_prefix='vault-search') as executor:
+        futures = [executor.submit(search_vault, vault_path, password, query, limit) for vault_path, password in vaults]
+
+        for number, ((vault_path, _), future) in enumerate(zip(vaults, futures)):
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.debug('Could not search %s.', str(vault_path), exc_info=e)
+                if fail is not None:
+                    fail(vault_path, e)
+                continue
+
+            ranked.append([(rank, number, VaultMatch(vault_path, account)) for rank, account in results])
+
+    # Ranks and vault numbers never tie, so matches themselves are never compared
+    return [match for _, _, match in islice(merge(*ranked), limit)]
@@ -0,0 +1,76 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from multiprocessing import get_context
+from os import cpu_count
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+
+_PENDING_CHUNKS = 2         # Chunks queued per worker, so memory stays at a few chunks whatever the vault size
+# Forked workers would inherit the locks of the log listener thread in whatever state they were in
+_START_METHOD = 'spawn'
+
+Result = TypeVar('Result')
+
+# Keys and settings of the worker process, set once by the pool initializer rather than sent with every chunk
+_state: Tuple[Any, ...] = ()
+
+
+def set_state(*state: Any) -> None:
+    """ State used by chunk functions, called in every worker and cleared again when working in process """
+    global _state
+    _state = state
+
+
+def get_state() -> Tuple[Any, ...]:
+    """ State the pool was started with """
+    return _state
+
+
+def count_workers(workers: Optional[int], records: int, chunk_records: int) -> int:
+    """ Workers to start, one per CPU by default, more workers than chunks would only add start up time """
+    return max(1, min(workers or cpu_count() or 1, -(-records // chunk_records)))
+
+
+def iter_chunks(view: memoryview, entries: List[List[int]], chunk_records: int) -> Iterator[List[bytes]]:
+    """ Encrypted records copied out of the mapped vault a chunk at a time, workers can't share the map """
+    entries = iter(entries)
+
+    while True:
+        chunk = [bytes(view[offset:offset + size]) for offset, size in islice(entries, chunk_records)]
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def worker_pool(state: Tuple[Any, ...], workers: int) -> Iterator[Optional[Executor]]:
+    """ Process pool holding the state, None when a single worker runs the chunks in this process """
+    if workers <= 1:
+        set_state(*state)
+        try:
+            yield None
+        finally:
+            set_state()
+        return
+
+    with ProcessPoolExecutor(workers, get_context(_START_METHOD), set_state, state) as executor:
+        yield executor
+
+
+def map_chunks(executor: Optional[Executor], function: Callable[[List[bytes]], Result],
+               chunks: Iterable[List[bytes]], workers: int) -> Iterator[Result]:
+    """ Results of a chunk function in order, only a few chunks per worker are read ahead of the one being used """
+    if executor is None:
+        yield from map(function, chunks)
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, chunk))
+        if len(pending) >= workers * _PENDING_CHUNKS:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
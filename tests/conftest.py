@@ -0,0 +1,19 @@
+from typing import Callable, Iterable
+import pytest
+from plain_sight.plain_sight import PlainSight
+
+
+_KEY = 'this is my key'
+
+
+@pytest.fixture
+def make_vault(tmp_path) -> Callable[..., PlainSight]:
+    """ Factory writing the given accounts to a new record vault in tmp_path with one full write """
+    def make(accounts: Iterable[dict], name: str = 'test.vault', password: str = _KEY) -> PlainSight:
+        plain_sight = PlainSight(tmp_path / name, password)
+        plain_sight.add_accounts(accounts)
+        plain_sight.compact(background=False)
+
+        return plain_sight
+
+    return make
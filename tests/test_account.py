@@ -1,5 +1,7 @@
-from plain_sight.account import Account
+from plain_sight.account import Account, AccountStore, serialize_accounts, snapshot_accounts
+from json import dumps
 from plain_sight.encryption import get_character_range
+from plain_sight.records import SchemaTable
 
 
 _SYSIN = 'builtins.input'
@@ -65,3 +67,142 @@ def test_generate_password(mocker) -> None:
     custom_generation = Account.new_password()
 
     assert len(custom_generation) == int(custom_length[-1])
+
+
+def test_search() -> None:
+    account = Account({'name': 'my name', 'login': 'my login'})
+
+    assert account.search('name')
+    assert account.search('login')
+    assert not account.search('missing')
+
+
+def test_store() -> None:
+    store = AccountStore()
+    first = store.add({'name': 'first', 'login': 'shared@example.com'})
+    second = store.add({'name': 'second', 'login': ''.join(['shared', '@example.com']), 'url': 'example.com'})
+
+    assert first.login is second.login
+    assert first.get_attributes() == ('login', 'name')
+    assert second.get_attributes() == ('login', 'name', 'url')
+    assert second.to_json() == {'name': 'second', 'login': 'shared@example.com', 'url': 'example.com'}
+
+    first.url = 'other.com'
+    assert first.url == 'other.com'
+    assert store.size == 2
+
+    try:
+        getattr(first, 'missing')
+        assert False
+    except AttributeError:
+        pass
+
+
+def test_options() -> None:
+    account = Account({'name': 'my name'})
+
+    assert set(account.options) == {'c', 'v', 'p', 'e', 'h'}
+    assert account.options['e'].__name__ == 'edit'
+    assert 'options' not in account.get_attributes()
+
+    try:
+        account.options = {}
+        assert False
+    except AttributeError:
+        pass
+    assert 'options' not in account._store.columns
+
+
+def test_replace() -> None:
+    store = AccountStore()
+    account = store.add({'name': 'first', 'login': 'login', 'url': 'example.com'})
+    row = account._row
+
+    account.replace({'name': 'replaced', 'notes': 'notes'})
+
+    assert account._row == row and store.size == 1
+    assert account.to_json() == {'name': 'replaced', 'notes': 'notes'}
+
+
+def test_schema_cache() -> None:
+    store = AccountStore()
+    first = store.add({'name': 'first', 'login': 'login'})
+    second = store.add({'login': 'login', 'name': 'second'})
+
+    assert first.get_attributes() is second.get_attributes()
+
+    second.url = 'example.com'
+    assert second.get_attributes() == ('login', 'name', 'url')
+    assert first.get_attributes() == ('login', 'name')
+
+
+def test_serialize_accounts() -> None:
+    store = AccountStore()
+    accounts = [
+        store.add({'name': 'first', 'login': 'lögin "quoted"', 'password': 'p@ss\n'}),
+        store.add({'name': 'second', 'count': 3, 'nested': {'a': [1, None]}}),
+        store.add({}),
+        Account({'name': 'other store'})
+    ]
+
+    records = list(serialize_accounts(accounts))
+    assert records == [dumps(account.to_json()).encode() for account in accounts]
+
+
+def test_snapshot_accounts() -> None:
+    store = AccountStore()
+    accounts = [store.add({'name': 'first', 'login': 'a'}), Account({'name': 'other store'})]
+
+    records = snapshot_accounts(accounts)
+    accounts[0].login = 'edited'
+    accounts[0].url = 'added'
+    store.add({'name': 'added later'})
+
+    assert list(records) == [dumps({'login': 'a', 'name': 'first'}).encode(), dumps({'name': 'other store'}).encode()]
+
+
+def test_snapshot_binary_records() -> None:
+    store = AccountStore()
+    accounts = [store.add({'name': 'first', 'login': 'a', 'pin': 1234}), store.add({'name': 'second'})]
+    schemas = SchemaTable()
+
+    records = list(snapshot_accounts(accounts, schemas))
+
+    assert schemas.schemas == [('login', 'name', 'pin'), ('name',)]
+    assert [schemas.decode(record) for record in records] == [account.to_json() for account in accounts]
+
+
+def test_append() -> None:
+    store = AccountStore()
+    added = store.add({'name': 'first', 'login': 'shared'})
+    appended = store.append(('name', 'login', 'pin'), ['second', 'shared', 1])
+    repeated = store.append(('name', 'name'), ['old', 'third'])
+
+    assert appended.to_json() == {'login': 'shared', 'name': 'second', 'pin': 1}
+    assert repeated.to_json() == {'name': 'third'}
+    assert added.login is appended.login
+    assert store.fields(appended._row) == ('login', 'name', 'pin')
+    assert list(serialize_accounts([appended])) == [dumps(appended.to_json()).encode()]
+
+    appended.url = 'edited'
+    fourth = store.append(('name', 'login', 'pin'), ['fourth', 'a', 2])
+    assert fourth.to_json() == {'login': 'a', 'name': 'fourth', 'pin': 2}
+
+
+def test_sealed_secrets() -> None:
+    store = AccountStore()
+    added = store.add({'name': 'first', 'password': 'first secret'})
+    appended = store.append(('name', 'password'), ['second', 'second secret'])
+    schemas = SchemaTable()
+
+    for account, secret in ((added, 'first secret'), (appended, 'second secret')):
+        column = store.columns['password']
+        assert secret.encode() not in column[account._row]
+        assert account.password == secret
+
+    snapshot = list(snapshot_accounts([added, appended], schemas))
+    added.password = 'changed'
+
+    assert [schemas.decode(record)['password'] for record in snapshot] == ['first secret', 'second secret']
+    assert list(serialize_accounts([added])) == [dumps({'name': 'first', 'password': 'changed'}).encode()]
+    assert store.get_row(added._row) == (('name', 'password'), ['first', 'changed'])
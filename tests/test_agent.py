@@ -0,0 +1,86 @@
+from asyncio import run, get_running_loop, sleep, wait_for
+from pathlib import Path
+from stat import S_IMODE
+from typing import Any, Dict
+import plain_sight.agent as agent
+import plain_sight.cli as cli
+from plain_sight.plain_sight import PlainSight
+
+
+_KEY = 'this is my key'
+_ACCOUNTS = [
+    {'name': 'github', 'login': 'me', 'password': 'first password'},
+    {'name': 'gitlab', 'login': 'you', 'password': 'second password'}
+]
+
+
+async def ask(socket_path: Path, message: Dict[str, Any]) -> Dict[str, Any]:
+    return await get_running_loop().run_in_executor(None, agent.request, socket_path, message)
+
+
+async def wait_for_socket(socket_path: Path) -> None:
+    while not socket_path.exists():
+        await sleep(0.01)
+
+
+def test_requests(capsys, monkeypatch, tmp_path, make_vault) -> None:
+    vault_path = tmp_path / 'agent.vault'
+    socket_path = tmp_path / 'agent.sock'
+    vault_agent = agent.Agent(make_vault(_ACCOUNTS, 'agent.vault', _KEY), idle_timeout=30)
+
+    async def scenario() -> None:
+        server = get_running_loop().create_task(vault_agent.serve(socket_path))
+        await wait_for_socket(socket_path)
+
+        assert S_IMODE(socket_path.stat().st_mode) == 0o600
+
+        response = await ask(socket_path, {'command': 'get', 'name': 'GitHub'})
+        assert response == {'ok': True, 'vault': str(vault_path.resolve()), 'value': 'first password'}
+
+        response = await ask(socket_path, {'command': 'search', 'term': 'lab'})
+        assert response['accounts'] == [{'name': 'gitlab', 'login': 'you'}]
+
+        assert not (await ask(socket_path, {'command': 'get', 'name': 'git'}))['ok']
+        for attribute in ('_store', 'options'):
+            response = await ask(socket_path, {'command': 'get', 'name': 'GitHub', 'field': attribute})
+            assert response['error'] == f"Account 'GitHub' has no field {attribute!r}."
+        assert not (await ask(socket_path, {'command': 'unknown'}))['ok']
+
+        # Edits saved by another process are picked up on the next request
+        edited = PlainSight(vault_path, _KEY)
+        edited.accounts[0].password = 'changed password'
+        edited.set_update_flag(edited.accounts[0])
+        edited.save_data()
+        assert (await ask(socket_path, {'command': 'get', 'name': 'github'}))['value'] == 'changed password'
+
+        # The command line asks the agent, no master password is needed
+        monkeypatch.delenv(cli.PASSWORD_VARIABLE, raising=False)
+        monkeypatch.setenv(cli.AGENT_VARIABLE, str(socket_path))
+        capsys.readouterr()
+        argv = ['get', 'github', '--vault', str(vault_path)]
+        assert await get_running_loop().run_in_executor(None, cli.main, argv) == 0
+        assert capsys.readouterr().out == 'changed password\n'
+
+        assert (await ask(socket_path, {'command': 'stop'}))['ok']
+        await wait_for(server, 5)
+
+    run(scenario())
+    assert not socket_path.exists()
+
+
+def test_idle_timeout(tmp_path, make_vault) -> None:
+    socket_path = tmp_path / 'agent.sock'
+    vault_agent = agent.Agent(make_vault(_ACCOUNTS, 'agent.vault', _KEY), idle_timeout=0.2)
+
+    run(wait_for(vault_agent.serve(socket_path), 5))
+    assert not socket_path.exists()
+    assert not hasattr(vault_agent, 'plain_sight')
+
+
+def test_cli_falls_back(capsys, monkeypatch, tmp_path, make_vault) -> None:
+    vault_path = make_vault(_ACCOUNTS, 'agent.vault', _KEY).vault_path
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, _KEY)
+    monkeypatch.setenv(cli.AGENT_VARIABLE, str(tmp_path / 'missing.sock'))
+
+    assert cli.main(['get', 'github', '--vault', str(vault_path)]) == 0
+    assert capsys.readouterr().out == 'first password\n'
@@ -0,0 +1,20 @@
+from stat import S_IMODE
+import pytest
+import plain_sight.agent_client as agent_client
+
+
+def test_socket_directory(mocker, tmp_path) -> None:
+    mocker.patch('plain_sight.agent_client.gettempdir', return_value=str(tmp_path))
+
+    directory = agent_client.socket_directory()
+    assert S_IMODE(directory.stat().st_mode) == 0o700
+    assert agent_client.default_socket_path().parent == directory
+
+    directory.chmod(0o755)
+    with pytest.raises(agent_client.AgentError):
+        agent_client.socket_directory()
+
+
+def test_request_unreachable(tmp_path) -> None:
+    with pytest.raises(OSError):
+        agent_client.request(tmp_path / 'missing.sock', {'command': 'status'})
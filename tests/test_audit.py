@@ -0,0 +1,50 @@
+import plain_sight.audit as audit
+from plain_sight.encryption import generate_password
+
+
+_KEY = 'this is my key'
+_SHARED = generate_password()
+
+
+_ACCOUNTS = [
+    {'name': 'github', 'login': 'me', 'password': _SHARED},
+    {'name': 'email', 'login': 'me', 'password': 'hunter2'},
+    {'name': 'bank', 'login': 'me', 'password': generate_password()},
+    {'name': 'wifi', 'pin': 1234},
+    {'name': 'forum', 'login': 'you', 'password': _SHARED},
+    {'name': 'printer', 'password': 'admin'}
+]
+
+
+def test_audit(monkeypatch, make_vault) -> None:
+    plain_sight = make_vault(_ACCOUNTS, 'audit.vault', _KEY)
+
+    # Journaled edits replace and follow the records in the vault
+    plain_sight.accounts[1].password = generate_password()
+    plain_sight.set_update_flag(plain_sight.accounts[1])
+    account = plain_sight.store.add({'name': 'router', 'password': _SHARED})
+    plain_sight.accounts.append(account)
+    plain_sight.set_update_flag(account)
+    plain_sight.save_data()
+    assert plain_sight.journal.path.exists()
+
+    monkeypatch.setattr(audit, '_CHUNK_RECORDS', 2)
+    for workers in (1, 2):
+        report = list(audit.audit_vault(plain_sight.vault_path, _KEY, workers=workers))
+
+        assert report == [
+            {'issue': 'weak', 'name': 'printer', 'login': '', 'bits': 23.5},
+            {'issue': 'reused', 'accounts': [
+                {'name': 'github', 'login': 'me'}, {'name': 'forum', 'login': 'you'}, {'name': 'router', 'login': ''}
+            ]},
+            {'summary': {'accounts': 7, 'without_password': 1, 'weak': 1, 'reused': 3}}
+        ]
+        assert _SHARED not in str(report)
+
+
+def test_weak_threshold(make_vault) -> None:
+    plain_sight = make_vault(_ACCOUNTS, 'audit.vault', _KEY)
+
+    report = list(audit.audit_vault(plain_sight.vault_path, _KEY, min_bits=200))
+    assert [finding['name'] for finding in report if finding.get('issue') == 'weak'] == \
+        ['github', 'email', 'bank', 'forum', 'printer']
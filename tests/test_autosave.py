@@ -0,0 +1,71 @@
+from threading import Event
+from time import sleep
+import pytest
+from plain_sight.autosave import Autosaver
+
+
+def test_debounce() -> None:
+    writes = []
+    written = Event()
+
+    def write(changes: dict, snapshot: object) -> None:
+        writes.append(changes)
+        written.set()
+
+    autosaver = Autosaver(write, 0.05)
+    autosaver.schedule({0: b'first'})
+    autosaver.schedule({0: b'second', 1: b'other'})
+
+    assert written.wait(5)
+    sleep(0.1)
+    assert writes == [{0: b'second', 1: b'other'}]
+
+
+def test_flush() -> None:
+    writes = []
+    autosaver = Autosaver(lambda changes, snapshot: writes.append(changes), 60)
+
+    autosaver.schedule({0: b'record'})
+    autosaver.flush()
+    autosaver.flush()
+
+    assert writes == [{0: b'record'}]
+    assert autosaver.timer is None
+
+
+def test_failed_write_is_kept(mocker) -> None:
+    write = mocker.Mock(side_effect=[OSError('disk full'), None])
+    autosaver = Autosaver(write, 60)
+
+    autosaver.schedule({0: b'old'})
+    autosaver.flush()
+    autosaver.schedule({1: b'new'})
+    autosaver.flush()
+
+    assert write.call_args_list[-1] == mocker.call({0: b'old', 1: b'new'}, None)
+
+
+def test_latest_snapshot(mocker) -> None:
+    write = mocker.Mock(side_effect=[OSError('disk full'), None])
+    autosaver = Autosaver(write, 60)
+
+    autosaver.schedule({0: b'old'}, 'first snapshot')
+    autosaver.schedule({0: b'new'}, 'second snapshot')
+    autosaver.flush()
+    autosaver.schedule({1: b'other'})
+    autosaver.flush()
+
+    assert write.call_args_list == [mocker.call({0: b'new'}, 'second snapshot'),
+                                    mocker.call({0: b'new', 1: b'other'}, 'second snapshot')]
+
+
+def test_flush_raises(mocker) -> None:
+    write = mocker.Mock(side_effect=[OSError('disk full'), None])
+    autosaver = Autosaver(write, 60)
+
+    autosaver.schedule({0: b'record'})
+    with pytest.raises(OSError):
+        autosaver.flush(raise_errors=True)
+    autosaver.flush(raise_errors=True)
+
+    assert write.call_args_list[-1] == mocker.call({0: b'record'}, None)
@@ -0,0 +1,203 @@
+from argparse import ArgumentTypeError
+from io import StringIO
+from json import loads
+from os import pipe, write, close
+from typing import Tuple
+import pytest
+import plain_sight.cli as cli
+from plain_sight.timing import forbidden_imports, import_times
+
+
+_STARTUP_BUDGET_US = 1000000     # Generous as machines vary, the forbidden import check is the precise guard
+
+
+def test_generate(capsys) -> None:
+    assert cli.main(['generate', '-n', '5', '-l', '12', '--require', 'digits']) == 0
+
+    passwords = capsys.readouterr().out.split()
+    assert len(passwords) == 5
+    for password in passwords:
+        assert len(password) == 12
+        assert any(character.isdigit() for character in password)
+
+
+def test_generate_invalid(capsys) -> None:
+    for argv in (['--classes', 'digits', '--require', 'lower'], ['--classes', ''], ['-l', '-1']):
+        assert cli.main(['generate', *argv]) == 1
+        assert capsys.readouterr().out == ''
+
+    assert cli.main(['generate', '-n', '2', '-l', '0']) == 0
+    assert capsys.readouterr().out == '\n\n'
+
+
+def run(capsys, *argv: str) -> Tuple[int, str]:
+    """ Run a command and return its exit code and stdout """
+    code = cli.main(list(argv))
+    return code, capsys.readouterr().out
+
+
+def test_vault_commands(capsys, monkeypatch, tmp_path) -> None:
+    vault = str(tmp_path / 'cli.vault')
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    monkeypatch.setattr(cli, 'stdin', StringIO('account password\n'))
+
+    assert run(capsys, 'get', 'github', '--vault', vault)[0] == 1
+
+    code, output = run(capsys, 'add', 'github', '--login', 'me', '-s', 'url=github.com', '--password-stdin', '--vault', vault)
+    assert code == 0
+    assert loads(output) == {'name': 'github', 'login': 'me', 'url': 'github.com'}
+
+    assert run(capsys, 'add', 'gitlab', '--generate', '30', '--vault', vault)[0] == 0
+    assert run(capsys, 'add', 'GitHub', '--vault', vault)[0] == 1
+    for override in ('name=other', 'login=other', 'edit=other'):
+        assert run(capsys, 'add', 'other', '-s', override, '--vault', vault) == (1, '')
+
+    assert run(capsys, 'get', 'github', '--vault', vault) == (0, 'account password\n')
+    assert run(capsys, 'get', 'git', '--vault', vault)[0] == 1
+    assert len(run(capsys, 'get', 'gitlab', '--vault', vault)[1].strip()) == 30
+
+    assert run(capsys, 'set', 'github', '-s', 'login=you', '--vault', vault)[0] == 0
+    assert run(capsys, 'get', 'github', '-f', 'login', '--vault', vault) == (0, 'you\n')
+    for attribute in ('_store', 'options', 'to_json'):
+        assert run(capsys, 'get', 'github', '-f', attribute, '--vault', vault) == (1, '')
+    for attribute in ('_store', 'to_json'):
+        assert run(capsys, 'set', 'github', '-s', f'{attribute}=value', '--vault', vault)[0] == 1
+
+    code, output = run(capsys, 'list', '--vault', vault)
+    assert [loads(line)['name'] for line in output.splitlines()] == ['github', 'gitlab']
+    assert 'password' not in output
+
+    code, output = run(capsys, 'search', 'lab', '--vault', vault)
+    assert [loads(line)['name'] for line in output.splitlines()] == ['gitlab']
+
+
+def test_failed_save(capsys, monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    vault = str(tmp_path / 'missing' / 'cli.vault')
+
+    assert run(capsys, 'add', 'github', '--generate', '20', '--vault', vault) == (1, '')
+    assert not (tmp_path / 'missing').exists()
+
+
+def test_password_fd(capsys, monkeypatch, tmp_path) -> None:
+    vault = str(tmp_path / 'cli.vault')
+    monkeypatch.delenv(cli.PASSWORD_VARIABLE, raising=False)
+
+    assert run(capsys, 'list', '--vault', vault)[0] == 1
+
+    read_fd, write_fd = pipe()
+    write(write_fd, b'master password\n')
+    close(write_fd)
+    try:
+        assert run(capsys, 'add', 'github', '--vault', vault, '--password-fd', str(read_fd))[0] == 0
+    finally:
+        close(read_fd)
+
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    code, output = run(capsys, 'list', '--vault', vault)
+    assert code == 0 and loads(output) == {'name': 'github', 'login': ''}
+
+
+def test_field_rejects_secrets() -> None:
+    assert cli.field('url=a=b') == ('url', 'a=b')
+    with pytest.raises(ArgumentTypeError):
+        cli.field('password=hunter2')
+    with pytest.raises(ArgumentTypeError):
+        cli.field('no separator')
+
+
+def test_startup_budget() -> None:
+    times = import_times('plain_sight.cli')
+
+    assert forbidden_imports(times) == []
+    assert times['plain_sight.cli'][1] < _STARTUP_BUDGET_US
+
+
+def test_profile(monkeypatch) -> None:
+    report = StringIO()
+    monkeypatch.setattr(cli, 'stderr', report)
+
+    assert cli.main(['--profile', 'generate']) == 0
+    assert report.getvalue().splitlines()[-1].startswith('wall')
+
+
+def test_import_export(capsys, monkeypatch, tmp_path) -> None:
+    vault = str(tmp_path / 'cli.vault')
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    csv_path = tmp_path / 'export.csv'
+    csv_path.write_text('name,url,username,password\ngithub,https://github.com,me,secret\ngitlab,,me,\n')
+
+    errors = StringIO()
+    monkeypatch.setattr(cli, 'stderr', errors)
+
+    code, output = run(capsys, 'import', str(csv_path), '--vault', vault)
+    assert code == 0
+    assert loads(output) == {'imported': 1, 'duplicates': 0, 'invalid': 1}
+    assert errors.getvalue() == 'Skipped record 2: missing password.\n'
+
+    assert run(capsys, 'get', 'github', '--vault', vault) == (0, 'secret\n')
+    assert run(capsys, 'import', str(tmp_path / 'missing.csv'), '--vault', vault)[0] == 1
+    assert run(capsys, 'import', str(csv_path), '--vault', str(tmp_path / 'missing' / 'cli.vault')) == (1, '')
+
+    json_path = tmp_path / 'export.json'
+    assert run(capsys, 'export', str(json_path), '--vault', vault)[0] == 0
+    assert loads(json_path.read_text())['accounts'] == [
+        {'login': 'me', 'name': 'github', 'password': 'secret', 'url': 'https://github.com'}
+    ]
+
+
+def test_rekey(capsys, monkeypatch, tmp_path) -> None:
+    vault = str(tmp_path / 'cli.vault')
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    monkeypatch.setattr(cli, 'stderr', StringIO())
+    assert run(capsys, 'rekey', '--vault', vault)[0] == 1
+
+    assert run(capsys, 'add', 'github', '--vault', vault)[0] == 0
+    assert run(capsys, 'rekey', '--vault', vault)[0] == 1
+
+    monkeypatch.setenv(cli.NEW_PASSWORD_VARIABLE, 'new master password')
+    assert run(capsys, 'rekey', '--vault', vault, '--workers', '1')[0] == 0
+    assert run(capsys, 'list', '--vault', vault)[0] == 1
+    assert 'Verifying 1/1 records\n' in cli.stderr.getvalue()
+
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'new master password')
+    assert loads(run(capsys, 'list', '--vault', vault)[1])['name'] == 'github'
+
+
+def test_search_vaults(capsys, monkeypatch, tmp_path) -> None:
+    vaults = [str(tmp_path / f'{name}.vault') for name in ('first', 'second', 'missing')]
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    errors = StringIO()
+    monkeypatch.setattr(cli, 'stderr', errors)
+
+    for vault, name in zip(vaults, ('github work', 'github')):
+        assert run(capsys, 'add', name, '--vault', vault)[0] == 0
+
+    code, output = run(capsys, 'search-vaults', 'github', *vaults)
+    assert code == 0
+    assert [loads(line) for line in output.splitlines()] == [
+        {'vault': vaults[1], 'name': 'github', 'login': ''}, {'vault': vaults[0], 'name': 'github work', 'login': ''}
+    ]
+    assert errors.getvalue() == f'Skipped {vaults[2]}: Vault {vaults[2]} does not exist.\n'
+
+    assert run(capsys, 'search-vaults', 'github', vaults[2])[0] == 1
+
+
+def test_audit(capsys, monkeypatch, tmp_path) -> None:
+    vault = str(tmp_path / 'cli.vault')
+    monkeypatch.setenv(cli.PASSWORD_VARIABLE, 'master password')
+    monkeypatch.setattr(cli, 'stdin', StringIO('weak\nweak\n'))
+    assert run(capsys, 'audit', '--vault', vault)[0] == 1
+
+    for name in ('first', 'second'):
+        assert run(capsys, 'add', name, '--password-stdin', '--vault', vault)[0] == 0
+    assert run(capsys, 'add', 'third', '--vault', vault)[0] == 0
+
+    code, output = run(capsys, 'audit', '--vault', vault, '--min-bits', '20')
+    assert code == 0
+    assert [loads(line) for line in output.splitlines()] == [
+        {'issue': 'weak', 'name': 'first', 'login': '', 'bits': 18.8},
+        {'issue': 'weak', 'name': 'second', 'login': '', 'bits': 18.8},
+        {'issue': 'reused', 'accounts': [{'name': 'first', 'login': ''}, {'name': 'second', 'login': ''}]},
+        {'summary': {'accounts': 3, 'without_password': 0, 'weak': 2, 'reused': 2}}
+    ]
@@ -64,3 +64,14 @@ def test_yes_no(mocker) -> None:
     mocker.patch(_SYSIN, side_effect=retry_input)
     collected_retry = cmd.get_yes_no(_PROMPT)
     assert collected_retry is True
+
+
+def test_set_completer(mocker) -> None:
+    readline = mocker.patch.dict('sys.modules', {'readline': mocker.MagicMock()})['readline']
+
+    assert cmd.set_completer(lambda text: [text + ' one', text + ' two'])
+
+    completer = readline.set_completer.call_args[0][0]
+    assert completer('prefix', 0) == 'prefix one'
+    assert completer('prefix', 1) == 'prefix two'
+    assert completer('prefix', 2) is None
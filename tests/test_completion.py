@@ -0,0 +1,42 @@
+from plain_sight.account import Account
+from plain_sight.completion import NameIndex
+
+
+_NAMES = ['Online Banking', 'bank', 'Email', 'Bank of Somewhere', 'Forum']
+
+
+def build_index() -> NameIndex:
+    return NameIndex(Account({'name': name}) for name in _NAMES)
+
+
+def test_complete() -> None:
+    index = build_index()
+
+    assert index.complete('ban') == ['bank', 'Bank of Somewhere']
+    assert index.complete('BANK O') == ['Bank of Somewhere']
+    assert index.complete('b', limit=1) == ['bank']
+    assert index.complete('missing') == []
+    assert len(index.complete('')) == len(_NAMES)
+
+
+def test_find() -> None:
+    index = build_index()
+
+    assert str(index.find('BANK')) == 'bank'
+    assert str(index.find('em')) == 'Email'
+    assert index.find('ban') is None
+    assert index.find('missing') is None
+
+
+def test_update() -> None:
+    index = build_index()
+    account = index.find('Forum')
+
+    account.name = 'Message Board'
+    index.update(account)
+    assert index.complete('fo') == []
+    assert index.complete('me') == ['Message Board']
+
+    new_account = Account({'name': 'Forum'})
+    index.update(new_account)
+    assert index.find('forum') is new_account
@@ -0,0 +1,42 @@
+from json import dumps
+import pytest
+from plain_sight.compression import Codec, CODECS
+import plain_sight.compression as compression
+
+
+_RECORDS = [dumps({'name': f'account {index}', 'login': 'me@example.com', 'url': 'https://example.com'}).encode()
+            for index in range(1000)]
+
+
+def test_round_trip() -> None:
+    for name in CODECS:
+        codec, records = Codec.train(name, _RECORDS)
+        compressed = [codec.compress(record) for record in records]
+
+        restored = Codec(name, codec.dictionary)
+        assert [restored.decompress(memoryview(data)) for data in compressed] == _RECORDS
+
+
+def test_train() -> None:
+    codec, records = Codec.train('zlib', iter(_RECORDS))
+
+    assert list(records) == _RECORDS
+    assert 0 < len(codec.dictionary) <= compression._DICTIONARY_SIZE
+    assert codec.dictionary in b''.join(_RECORDS)
+
+    # The dictionary is what makes single records worth compressing
+    assert len(codec.compress(_RECORDS[-1])) < len(Codec('zlib').compress(_RECORDS[-1])) / 2
+
+    assert Codec.train('zlib', [])[0].dictionary == b''
+    assert Codec.train('lzma', _RECORDS)[0].dictionary == b''
+
+
+def test_invalid() -> None:
+    with pytest.raises(ValueError):
+        Codec('brotli')
+
+    codec = Codec('zlib')
+    with pytest.raises(ValueError):
+        codec.decompress(codec.compress(_RECORDS[0])[:-2])
+    with pytest.raises(ValueError):
+        codec.decompress(b'\xff' * 16)
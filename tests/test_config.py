@@ -0,0 +1,61 @@
+from json import dumps
+from subprocess import run
+from sys import executable
+import plain_sight.config as config
+
+
+_STARTUP_CHECK = '''
+import sys
+from os import environ
+before = dict(environ)
+import plain_sight.cli, plain_sight.plain_sight
+from plain_sight.config import get_config
+print(get_config.cache_info().currsize, dict(environ) == before, 'cryptography' in sys.modules)
+'''
+
+
+def test_parse_config() -> None:
+    parsed = config.parse_config({'max_search_results': '5', 'kdf_target_seconds': 1, 'unknown': 'ignored'})
+
+    assert parsed.max_search_results == 5
+    assert parsed.kdf_target_seconds == 1.0
+    assert parsed.key_file == config.Config().key_file
+
+    assert config.parse_config({'max_search_results': 'many'}).max_search_results == config.Config().max_search_results
+
+
+def test_parse_config_choices(capsys) -> None:
+    parsed = config.parse_config({'compression': 'brotli', 'cipher': 'rot13', 'record_format': 'lzma'})
+
+    assert parsed == config.Config()
+    assert capsys.readouterr().out.count('Invalid config value') == 3
+    assert config.parse_config({'compression': 'lzma', 'cipher': 'chacha20-poly1305'}).compression == 'lzma'
+
+
+def test_read_environment() -> None:
+    environment = {'log_level': 'DEBUG', 'max_search_results': '3', 'HOME': '/home/me'}
+
+    assert config.read_environment(environment) == {'log_level': 'DEBUG', 'max_search_results': '3'}
+
+
+def test_get_config(monkeypatch, tmp_path) -> None:
+    (tmp_path / config.CONFIG_FILENAME).write_text(dumps({'key_file': 'other.vault', 'log_level': 'DEBUG'}))
+    monkeypatch.chdir(tmp_path)
+    config.get_config.cache_clear()
+
+    try:
+        assert config.get_config() == config.Config(key_file='other.vault', log_level='DEBUG')
+        assert config.get_config() is config.get_config()
+
+        config.get_config.cache_clear()
+        monkeypatch.setenv('key_file', 'environment.vault')
+        assert config.get_config().key_file == 'environment.vault'
+    finally:
+        config.get_config.cache_clear()
+
+
+def test_import_is_side_effect_free() -> None:
+    output = run([executable, '-c', _STARTUP_CHECK], capture_output=True, text=True, check=True).stdout
+
+    # The config is not read, the environment is untouched and no cipher is loaded until a command needs them
+    assert output.split() == ['0', 'True', 'False']
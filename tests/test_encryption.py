@@ -1,6 +1,8 @@
+import pytest
 import plain_sight.encryption as encryption
 from typing import Callable, Hashable
 from functools import partial
+from math import log2
 
 
 _PLAINTEXT = 'Hello, world!'
@@ -45,3 +47,135 @@ def test_encryption():
 
 def test_unique_password() -> None:
     ensure_unique(encryption.generate_password, num_copies=10000)
+
+
+def test_decrypt_stream():
+    plaintext = (_PLAINTEXT * 100).encode()
+    ciphertext = encryption.encrypt_data(_KEY, plaintext)
+    chunks = [ciphertext[start:start + 7] for start in range(0, len(ciphertext), 7)]
+
+    assert b''.join(encryption.decrypt_stream(_KEY, chunks)) == plaintext
+    assert b''.join(encryption.decrypt_stream(_KEY, [])) == b'{}'
+
+
+def test_encrypt_into():
+    plaintext = _PLAINTEXT.encode()
+    buffer = bytearray(encryption.encrypted_size(len(plaintext)))
+
+    length = encryption.encrypt_into(_KEY, plaintext, memoryview(buffer))
+    recovered_plaintext = encryption.decrypt_data(_KEY, memoryview(buffer)[:length])
+
+    assert recovered_plaintext == plaintext
+
+
+def test_key_context():
+    legacy_context = encryption.KeyContext(_KEY)
+    ciphertext = encryption.encrypt_data(legacy_context, _PLAINTEXT.encode())
+
+    assert encryption.decrypt_data(_KEY, ciphertext).decode() == _PLAINTEXT
+
+    for name in ('scrypt', 'pbkdf2'):
+        kdf = encryption.new_kdf(name)
+        context = encryption.KeyContext(_KEY, kdf)
+        ciphertext = encryption.encrypt_data(context, _PLAINTEXT.encode())
+
+        assert encryption.decrypt_data(encryption.KeyContext(_KEY, kdf), ciphertext).decode() == _PLAINTEXT
+        assert encryption.derive_key(_KEY, kdf) != encryption.derive_key(_KEY, encryption.new_kdf(name))
+
+
+def test_authenticated_ciphers():
+    context = encryption.KeyContext(_KEY, encryption.new_kdf())
+    plaintext = _PLAINTEXT.encode()
+
+    for cipher in (encryption.AES_GCM, encryption.CHACHA20_POLY1305):
+        aead_context = context.with_cipher(cipher)
+        ciphertext = encryption.encrypt_data(aead_context, plaintext)
+
+        assert encryption.decrypt_data(aead_context, memoryview(ciphertext)) == plaintext
+        assert len(ciphertext) <= encryption.encrypted_size(len(plaintext))
+
+        buffer = bytearray(encryption.encrypted_size(len(plaintext)))
+        length = encryption.encrypt_into(aead_context, plaintext, memoryview(buffer))
+        assert encryption.decrypt_data(aead_context, buffer[:length]) == plaintext
+
+        tampered = bytearray(ciphertext)
+        tampered[-1] ^= 1
+        for invalid in (bytes(tampered), ciphertext[:8]):
+            with pytest.raises(encryption.DecryptionError):
+                encryption.decrypt_data(aead_context, invalid)
+
+        wrong_key = encryption.KeyContext('wrong key', context.kdf, cipher)
+        with pytest.raises(encryption.DecryptionError):
+            encryption.decrypt_data(wrong_key, ciphertext)
+
+    assert context.cipher == encryption.CBC
+    with pytest.raises(ValueError):
+        context.with_cipher('rot13')
+
+
+def test_calibrate_kdf():
+    kdf = encryption.calibrate_kdf(0.01, 'pbkdf2')
+
+    assert kdf['name'] == 'pbkdf2'
+    assert kdf['iterations'] >= 1 << 10
+
+
+def test_calibrate_kdf_limit(monkeypatch):
+    monkeypatch.setattr(encryption, 'derive_key', lambda password, kdf: b'')
+    monkeypatch.setattr(encryption, 'perf_counter', lambda: 0.0)
+
+    assert encryption.calibrate_kdf(60)['n'] == 1 << 20
+
+
+def test_kdf_limits():
+    for costs in ({'n': 1 << 30}, {'r': 1 << 20}, {'p': 0}, {'n': '1024'}, {'n': 1 << 20, 'r': 16}):
+        with pytest.raises(encryption.DecryptionError):
+            encryption.derive_key(_KEY, encryption.new_kdf('scrypt', **costs))
+
+    with pytest.raises(encryption.DecryptionError):
+        encryption.derive_key(_KEY, encryption.new_kdf('pbkdf2', iterations=1 << 40))
+
+
+def test_generate_passwords() -> None:
+    classes = encryption.get_character_classes()
+    passwords = encryption.generate_passwords(500, 8, required=encryption.CHARACTER_CLASSES)
+
+    assert len(passwords) == 500
+    for password in passwords:
+        assert len(password) == 8
+        for characters in classes.values():
+            assert set(password) & set(characters)
+
+
+def test_estimate_entropy() -> None:
+    assert encryption.estimate_entropy('') == 0
+    assert encryption.estimate_entropy('aaaa') == pytest.approx(4 * log2(26))
+    assert encryption.estimate_entropy('Ab1!') == pytest.approx(4 * log2(70))
+    assert encryption.estimate_entropy('a b') == pytest.approx(3 * log2(26 + 25))
+
+    assert encryption.estimate_entropy(encryption.generate_password(20)) > encryption.estimate_entropy('Password1!')
+
+
+def test_generate_passwords_policy() -> None:
+    digits = encryption.generate_passwords(200, 10, classes=['digits'])
+    assert all(password.isdigit() for password in digits)
+
+    assert encryption.generate_passwords(3, 0) == ['', '', '']
+    assert encryption.generate_password(0) == ''
+
+    unambiguous = ''.join(encryption.generate_passwords(200, 20, exclude_ambiguous=True))
+    assert not set(unambiguous) & set('Il1O0o')
+
+    invalid_policies = [
+        (8, {'classes': ['unknown']}),
+        (8, {'classes': ['digits'], 'required': ['lower']}),
+        (1, {'required': ['lower', 'upper']}),
+        (8, {'classes': []}),
+        (-1, {})
+    ]
+    for length, policy in invalid_policies:
+        try:
+            encryption.generate_passwords(1, length, **policy)
+            assert False
+        except ValueError:
+            pass
@@ -36,3 +36,28 @@ class ExampleClass:
 def test_json_helper() -> None:
     example_object = ExampleClass()
     assert file_io.json_helper(example_object)
+
+
+def test_map_file() -> None:
+    with TemporaryDirectory() as temp_dir:
+        temp_filename = Path(temp_dir) / 'temporary_file'
+        file_io.save_file(temp_filename, b'mapped content')
+
+        with file_io.map_file(temp_filename) as view:
+            assert bytes(view[7:]) == b'content'
+
+        file_io.save_file(temp_filename, b'')
+        with file_io.map_file(temp_filename) as view:
+            assert len(view) == 0
+
+
+def test_save_file_is_atomic(mocker) -> None:
+    with TemporaryDirectory() as temp_dir:
+        filename = Path(temp_dir) / 'vault'
+        file_io.save_file(filename, b'original')
+
+        mocker.patch('plain_sight.file_io.replace', side_effect=OSError('rename failed'))
+        file_io.save_file(filename, b'replacement')
+
+        assert filename.read_bytes() == b'original'
+        assert [path.name for path in Path(temp_dir).iterdir()] == ['vault']
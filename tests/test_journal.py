@@ -0,0 +1,94 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import pytest
+from functools import partial
+from plain_sight.journal import Journal
+from plain_sight.encryption import KeyContext
+from plain_sight.file_io import map_file
+from plain_sight.vault import write_vault, read_index, iter_records
+
+
+_KEY = KeyContext('this is my key')
+
+
+def test_append_and_replay() -> None:
+    with TemporaryDirectory() as temp_dir:
+        journal = Journal(Path(temp_dir) / 'records.vault', _KEY)
+
+        journal.append({0: b'first'})
+        journal.append({1: b'second', 0: b'edited'})
+
+        assert list(journal.replay()) == [(0, b'first'), (0, b'edited'), (1, b'second')]
+        assert journal.size > 0
+
+
+def test_torn_entry() -> None:
+    with TemporaryDirectory() as temp_dir:
+        journal = Journal(Path(temp_dir) / 'records.vault', _KEY)
+        journal.append({0: b'first'})
+        complete_size = journal.size
+
+        with journal.path.open('ab') as fl:
+            fl.write(journal.encode(1, b'second')[:-5])
+
+        assert list(journal.replay()) == [(0, b'first')]
+        assert journal.size == complete_size
+
+
+def test_compact() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        journal = Journal(vault_path, _KEY)
+        journal.append({0: b'first'})
+
+        journal.compact(partial(write_vault, key=_KEY, records=[b'compacted']))
+        journal.wait()
+
+        assert list(journal.replay()) == []
+        assert not journal.path.exists()
+
+        with map_file(vault_path) as view:
+            index, _ = read_index(view, _KEY)
+            assert list(iter_records(view, _KEY, index)) == [b'compacted']
+
+
+def test_failed_compaction(tmp_path) -> None:
+    journal = Journal(tmp_path / 'records.vault', _KEY)
+    journal.append({0: b'first'})
+
+    def write(path: Path, **kwargs) -> None:
+        path.write_bytes(b'partial')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        journal.compact(write, background=False)
+
+    assert not (tmp_path / 'records.vault.tmp').exists()
+    assert list(journal.replay()) == [(0, b'first')]
+
+
+def test_interrupted_swap() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        journal = Journal(vault_path, _KEY)
+        journal.append({0: b'first'})
+
+        # The vault is replaced but the process stops before the compacted journal is removed
+        def write(path: Path, **kwargs) -> None:
+            write_vault(path, _KEY, [b'first'], **kwargs)
+            journal.compacting_path.with_suffix('.left').write_bytes(journal.compacting_path.read_bytes())
+
+        assert journal.compact(write, background=False)
+        journal.compacting_path.with_suffix('.left').rename(journal.compacting_path)
+        journal.append({0: b'second'})
+
+        with map_file(vault_path) as view:
+            index, _ = read_index(view, _KEY)
+
+        reopened = Journal(vault_path, _KEY, index['journal'])
+        assert list(reopened.replay()) == [(0, b'second')]
+        assert not reopened.compacting_path.exists()
+
+        # Journals of generations the vault doesn't hold are still replayed
+        journal.compacting_path.write_bytes(journal.new_header() + journal.encode(0, b'first'))
+        assert list(Journal(vault_path, _KEY, index['journal']).replay()) == [(0, b'first'), (0, b'second')]
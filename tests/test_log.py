@@ -1,5 +1,7 @@
 import plain_sight.log as log
-from logging import Logger, StreamHandler, Handler
+from logging import getLogger, Logger, StreamHandler, Handler, DEBUG, WARNING
+from logging.handlers import QueueHandler
+from plain_sight.config import Config
 
 
 _LOGGER_NAME = 'logger_name'
@@ -28,3 +30,52 @@ def test_get_logger() -> None:
 
     assert isinstance(logger, Logger)
     assert logger.name == _LOGGER_NAME
+
+
+def test_get_logger_is_idempotent() -> None:
+    logger = log.get_logger(_LOGGER_NAME)
+
+    assert log.get_logger(_LOGGER_NAME) is logger
+    assert len(logger.handlers) == 1
+    assert isinstance(logger.handlers[0], QueueHandler)
+
+
+def test_loggers_join_the_hierarchy() -> None:
+    logger = log.get_logger(_LOGGER_NAME)
+
+    assert getLogger(_LOGGER_NAME) is logger
+    assert logger.parent is getLogger() and logger.propagate
+
+    # Loggers of other libraries are not affected
+    assert type(getLogger('another_library')) is Logger
+
+
+def test_get_level(mocker) -> None:
+    for level, expected in (('debug', DEBUG), ('10', DEBUG), ('loud', WARNING)):
+        mocker.patch('plain_sight.log.get_config', return_value=Config(log_level=level))
+        log.get_level.cache_clear()
+
+        assert log.get_level() == expected
+
+    log.get_level.cache_clear()
+
+
+def test_queued_records_reach_sinks(mocker, tmp_path) -> None:
+    log_file = tmp_path / 'plain_sight.log'
+    mocker.patch('plain_sight.log.get_config', return_value=Config(log_level='INFO', log_file=str(log_file)))
+    log.stop_listener()
+    log.get_level.cache_clear()
+
+    logger = log.ConfiguredLogger('queued')
+    logger.addHandler(log._queue_handler)
+    argument = mocker.Mock(__str__=mocker.Mock(return_value='value'))
+
+    logger.info('Message with %s.', argument)
+    logger.debug('Dropped %s.', argument)
+    log.stop_listener()
+
+    assert log_file.read_text().splitlines()[-1].endswith('queued - INFO - Message with value.')
+
+    # Formatted once by each of the two sinks, the debug record is dropped before anything is formatted
+    assert argument.__str__.call_count == 2
+    log.get_level.cache_clear()
@@ -0,0 +1,236 @@
+import pytest
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from json import dumps
+import plain_sight.plain_sight as plain_sight_module
+from plain_sight.plain_sight import PlainSight
+from plain_sight.account import Account
+from plain_sight.encryption import encrypt_data, DecryptionError
+from plain_sight.vault import is_record_vault
+from plain_sight.config import Config
+
+
+_KEY = 'this is my key'
+_ACCOUNTS = [
+    {'name': 'first', 'login': 'first login', 'password': 'first password'},
+    {'name': 'second', 'login': 'second login', 'password': 'second password'}
+]
+
+
+def test_legacy_migration(mocker) -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'legacy.vault'
+        vault_path.write_bytes(encrypt_data(_KEY, dumps({'accounts': _ACCOUNTS}).encode()))
+        new_key = mocker.spy(PlainSight, 'new_key')
+
+        # Only saving migrates the vault, so only saving derives its new key
+        plain_sight = PlainSight(vault_path, _KEY)
+        assert [account.to_json() for account in plain_sight.accounts] == _ACCOUNTS
+        assert new_key.call_count == 0
+
+        plain_sight.save_data()
+        assert is_record_vault(vault_path)
+        assert new_key.call_count == 1
+        assert plain_sight.key.kdf['name'] == 'scrypt'
+
+        migrated = PlainSight(vault_path, _KEY)
+        assert [account.to_json() for account in migrated.accounts] == _ACCOUNTS
+
+
+def test_legacy_wrong_password() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'legacy.vault'
+        vault_path.write_bytes(encrypt_data(_KEY, dumps({'accounts': _ACCOUNTS * 100}).encode()))
+
+        for _ in range(5):
+            with pytest.raises(DecryptionError):
+                PlainSight(vault_path, 'wrong key')
+
+
+def test_partial_save() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+
+        plain_sight = PlainSight(vault_path, _KEY)
+        for account in _ACCOUNTS:
+            plain_sight.accounts.append(Account(account))
+        plain_sight.save_data()
+
+        edited = PlainSight(vault_path, _KEY)
+        account = edited.accounts[1]
+        account.login = 'edited login'
+        edited.set_update_flag(account)
+
+        new_account = Account({'name': 'third', 'login': 'third login', 'password': 'third password'})
+        edited.accounts.append(new_account)
+        edited.set_update_flag(new_account)
+        edited.save_data()
+
+        reloaded = PlainSight(vault_path, _KEY)
+        assert [account.login for account in reloaded.accounts] == ['first login', 'edited login', 'third login']
+        assert reloaded.store.size == 3     # The edit was replayed into the row read from the vault
+
+
+def test_read_account(mocker, tmp_path) -> None:
+    vault_path = tmp_path / 'records.vault'
+    plain_sight = PlainSight(vault_path, _KEY)
+    plain_sight.add_accounts(_ACCOUNTS)
+    plain_sight.compact(background=False)
+
+    renamed = plain_sight.accounts[0]
+    renamed.name = 'renamed'
+    plain_sight.set_update_flag(renamed)
+    added = Account({'name': 'third', 'login': 'third login', 'password': 'third password'})
+    plain_sight.accounts.append(added)
+    plain_sight.set_update_flag(added)
+    plain_sight.save_data()
+
+    # Only the matching record is decrypted, journaled edits are read from the journal
+    read_record = mocker.spy(plain_sight_module, 'read_record')
+    assert PlainSight.read_account(vault_path, _KEY, 'SECOND').to_json() == _ACCOUNTS[1]
+    assert read_record.call_count == 1
+    assert PlainSight.read_account(vault_path, _KEY, 'renamed').login == 'first login'
+    assert PlainSight.read_account(vault_path, _KEY, 'third').password == 'third password'
+    assert PlainSight.read_account(vault_path, _KEY, 'first') is None
+    assert read_record.call_count == 1
+
+    legacy_path = tmp_path / 'legacy.vault'
+    legacy_path.write_bytes(encrypt_data(_KEY, dumps({'accounts': _ACCOUNTS}).encode()))
+    with pytest.raises(LookupError):
+        PlainSight.read_account(legacy_path, _KEY, 'first')
+
+
+def test_compaction(mocker) -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+
+        plain_sight = PlainSight(vault_path, _KEY)
+        plain_sight.accounts.append(Account(_ACCOUNTS[0]))
+        plain_sight.save_data()
+
+        mocker.patch('plain_sight.plain_sight.get_config', return_value=Config(journal_threshold=0))
+        account = Account(_ACCOUNTS[1])
+        plain_sight.accounts.append(account)
+        plain_sight.set_update_flag(account)
+        plain_sight.save_data()
+        plain_sight.journal.wait()
+
+        assert plain_sight.journal.size == 0
+
+        reloaded = PlainSight(vault_path, _KEY)
+        assert [account.to_json() for account in reloaded.accounts] == _ACCOUNTS
+
+
+def test_autosave() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+
+        plain_sight = PlainSight(vault_path, _KEY)
+        plain_sight.accounts.append(Account(_ACCOUNTS[0]))
+        plain_sight.save_data()
+
+        plain_sight.enable_autosave(60)
+        account = plain_sight.accounts[0]
+        account.login = 'autosaved login'
+        plain_sight.set_update_flag(account)
+
+        # The record was snapshotted when the edit was flagged, later unflagged edits are not part of it
+        account.login = 'unsaved login'
+        plain_sight.autosave.flush()
+
+        reloaded = PlainSight(vault_path, _KEY)
+        assert reloaded.accounts[0].login == 'autosaved login'
+
+
+def test_autosave_compaction(mocker, tmp_path) -> None:
+    vault_path = tmp_path / 'records.vault'
+
+    plain_sight = PlainSight(vault_path, _KEY)
+    plain_sight.accounts.append(Account(_ACCOUNTS[0]))
+    plain_sight.save_data()
+
+    mocker.patch('plain_sight.plain_sight.get_config', return_value=Config(journal_threshold=0))
+    plain_sight.enable_autosave(60)
+    account = plain_sight.accounts[0]
+    account.login = 'autosaved login'
+    plain_sight.set_update_flag(account)
+
+    # The vault is compacted from the accounts as they were flagged, not as they are when the timer fires
+    account.login = 'unsaved login'
+    plain_sight.autosave.flush()
+    plain_sight.journal.wait()
+
+    assert plain_sight.journal.size == 0
+    reloaded = PlainSight(vault_path, _KEY)
+    assert reloaded.accounts[0].login == 'autosaved login'
+
+
+def test_failed_close(mocker, tmp_path) -> None:
+    vault_path = tmp_path / 'records.vault'
+
+    plain_sight = PlainSight(vault_path, _KEY)
+    plain_sight.accounts.append(Account(_ACCOUNTS[0]))
+    plain_sight.save_data()
+
+    plain_sight.enable_autosave(60)
+    account = plain_sight.accounts[0]
+    account.login = 'closing login'
+    plain_sight.set_update_flag(account)
+
+    # Declining to close without saving returns to the shell with the edit still queued, closing again retries
+    append, failures = plain_sight.journal.append, [OSError('disk full')]
+
+    def fail_once(changes: dict) -> None:
+        if failures:
+            raise failures.pop()
+        append(changes)
+
+    mocker.patch.object(plain_sight.journal, 'append', side_effect=fail_once)
+    ask = mocker.patch('plain_sight.plain_sight.get_yes_no', return_value=False)
+    plain_sight.close()
+    ask.assert_called_once()
+
+    with pytest.raises(SystemExit):
+        plain_sight.close()
+
+    reloaded = PlainSight(vault_path, _KEY)
+    assert reloaded.accounts[0].login == 'closing login'
+
+
+def test_record_formats(mocker, tmp_path) -> None:
+    vault_path = tmp_path / 'records.vault'
+    plain_sight = PlainSight(vault_path, _KEY)
+    plain_sight.add_accounts(dict(account, pin=index) for index, account in enumerate(_ACCOUNTS))
+
+    for record_format in ('json', 'binary', 'json'):
+        mocker.patch('plain_sight.plain_sight.get_config', return_value=Config(record_format=record_format))
+        plain_sight.compact(background=False)
+
+        reopened = PlainSight(vault_path, _KEY)
+        assert [account.to_json() for account in reopened.accounts] == \
+            [dict(account, pin=index) for index, account in enumerate(_ACCOUNTS)]
+        plain_sight = reopened
+
+
+def test_cipher_migration(mocker, tmp_path) -> None:
+    vault_path = tmp_path / 'records.vault'
+    mocker.patch('plain_sight.plain_sight.get_config', return_value=Config(cipher='aes-cbc'))
+    plain_sight = PlainSight(vault_path, _KEY)
+    plain_sight.add_accounts(_ACCOUNTS)
+    plain_sight.compact(background=False)
+    assert plain_sight.key.cipher == 'aes-cbc'
+
+    # Saving with another cipher configured rewrites the whole vault instead of journaling
+    mocker.patch('plain_sight.plain_sight.get_config', return_value=Config(cipher='chacha20-poly1305'))
+    reopened = PlainSight(vault_path, _KEY)
+    reopened.accounts[0].login = 'changed'
+    reopened.set_update_flag(reopened.accounts[0])
+    reopened.save_data()
+
+    assert reopened.key.cipher == reopened.journal.key.cipher == 'chacha20-poly1305'
+    assert not reopened.journal.path.exists()
+
+    migrated = PlainSight(vault_path, _KEY)
+    assert migrated.key.cipher == 'chacha20-poly1305'
+    assert [account.to_json() for account in migrated.accounts] == \
+        [dict(_ACCOUNTS[0], login='changed')] + _ACCOUNTS[1:]
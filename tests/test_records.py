@@ -0,0 +1,68 @@
+from json import dumps
+import pytest
+import plain_sight.records as records
+from plain_sight.records import SchemaTable
+
+
+_FIELDS = {'login': 'second login', 'name': 'sécond', 'notes': 'n' * 300, 'pin': 1234, 'tags': ['a', None]}
+
+
+def test_varint() -> None:
+    for value in (0, 1, 127, 128, 300, 1 << 32):
+        output = bytearray()
+        records.encode_varint(value, output)
+
+        assert records.decode_varint(bytes(output) + b'\x05', 0) == (value, len(output))
+
+
+def test_schema_table() -> None:
+    table = SchemaTable()
+    record = table.encode(tuple(_FIELDS), list(_FIELDS.values()))
+
+    assert table.schemas == [tuple(_FIELDS)]
+    assert len(record) < len(dumps(_FIELDS))
+    assert SchemaTable(table.schemas).decode(record) == _FIELDS
+    assert table.decode(table.encode((), [])) == {}
+
+    # Enough schemas that their numbers take two bytes
+    for number in range(200):
+        schema = (f'field {number}',)
+        assert table.decode(table.encode(schema, [str(number)])) == {schema[0]: str(number)}
+
+
+def test_invalid_records() -> None:
+    table = SchemaTable()
+    record = table.encode(tuple(_FIELDS), list(_FIELDS.values()))
+
+    with pytest.raises(ValueError):
+        table.decode(record[:-1])
+    with pytest.raises(ValueError):
+        table.decode(record[:3])
+    with pytest.raises(ValueError):
+        SchemaTable().decode(record)
+    with pytest.raises(ValueError):
+        records.get_decoder('xml', [])
+    with pytest.raises(ValueError):
+        records.new_table('xml')
+
+
+def test_redact_record() -> None:
+    secrets = {'pin', 'notes'}
+    redacted = dict(_FIELDS, pin='', notes='')
+
+    assert records.redact_record(dumps(_FIELDS).encode(), secrets) == dumps(redacted).encode()
+    assert records.redact_record(b'not a record', secrets) is None
+
+    table = SchemaTable()
+    record = records.redact_record(table.encode(tuple(_FIELDS), list(_FIELDS.values())), secrets, table)
+    assert table.decode(record) == redacted
+    assert records.redact_record(b'\x05', secrets, table) is None
+
+
+def test_get_decoder() -> None:
+    assert records.get_decoder('json', [])(dumps(_FIELDS).encode()) == (tuple(_FIELDS), list(_FIELDS.values()))
+    assert records.new_table('json') is None
+
+    table = records.new_table('binary')
+    record = table.encode(tuple(_FIELDS), list(_FIELDS.values()))
+    assert records.get_decoder('binary', table.schemas)(record) == (tuple(_FIELDS), list(_FIELDS.values()))
@@ -0,0 +1,75 @@
+import pytest
+import plain_sight.rekey as rekey
+from plain_sight.encryption import DecryptionError, KeyContext, new_kdf
+from plain_sight.plain_sight import PlainSight
+
+
+_KEY = 'this is my key'
+_NEW_KEY = 'this is my new key'
+_ACCOUNTS = [{'name': f'account {index}', 'login': 'me', 'password': f'password {index}'} for index in range(9)]
+
+
+@pytest.fixture
+def journaled_vault(make_vault) -> PlainSight:
+    plain_sight = make_vault(_ACCOUNTS, 'rekey.vault', _KEY)
+
+    # Left in the journal, it has to be saved before the vault is re-keyed
+    plain_sight.accounts[0].login = 'journaled'
+    plain_sight.set_update_flag(plain_sight.accounts[0])
+    plain_sight.save_data()
+    assert plain_sight.journal.path.exists()
+
+    return plain_sight
+
+
+def test_rekey(monkeypatch, journaled_vault) -> None:
+    plain_sight = journaled_vault
+    monkeypatch.setattr(rekey, '_CHUNK_RECORDS', 2)
+    progress = []
+
+    new_key = KeyContext(_NEW_KEY, new_kdf(), 'chacha20-poly1305')
+    assert rekey.rekey_vault(plain_sight.vault_path, _KEY, new_key, 2, lambda *args: progress.append(args)) == 9
+
+    assert progress[-1] == ('verifying', 9, 9)
+    assert [done for stage, done, _ in progress if stage == 're-encrypting'] == [2, 4, 6, 8, 9]
+    assert not rekey.has_journal(plain_sight.vault_path)
+    assert not plain_sight.vault_path.with_name('rekey.vault.rekey').exists()
+
+    with pytest.raises(DecryptionError):
+        PlainSight(plain_sight.vault_path, _KEY)
+
+    reopened = PlainSight(plain_sight.vault_path, _NEW_KEY)
+    assert [account.to_json() for account in reopened.accounts] == \
+        [dict(_ACCOUNTS[0], login='journaled')] + _ACCOUNTS[1:]
+
+
+def test_failed_verification(monkeypatch, journaled_vault) -> None:
+    plain_sight = journaled_vault
+    plain_sight.compact(background=False)
+    vault = plain_sight.vault_path.read_bytes()
+
+    monkeypatch.setattr(rekey, 'digest_chunk', lambda records: b'')
+    with pytest.raises(ValueError):
+        rekey.rekey_vault(plain_sight.vault_path, _KEY, KeyContext(_NEW_KEY, new_kdf()), 1)
+
+    assert plain_sight.vault_path.read_bytes() == vault
+    assert not plain_sight.vault_path.with_name('rekey.vault.rekey').exists()
+
+
+def test_stale_session(journaled_vault) -> None:
+    plain_sight = journaled_vault
+    rekey.rekey_vault(plain_sight.vault_path, _KEY, KeyContext(_NEW_KEY, new_kdf()), 1)
+
+    # A session opened before re-keying can't journal under the old key
+    plain_sight.accounts[1].login = 'stale'
+    plain_sight.set_update_flag(plain_sight.accounts[1])
+    with pytest.raises(ValueError):
+        plain_sight.save_data()
+    assert not rekey.has_journal(plain_sight.vault_path)
+
+    # Entries written with the old key anyway are skipped rather than making the vault unreadable
+    journal = plain_sight.journal
+    journal.path.write_bytes(journal.new_header() + journal.encode(1, b'{"name": "stale"}'))
+
+    reopened = PlainSight(plain_sight.vault_path, _NEW_KEY)
+    assert reopened.accounts[1].login == 'me'
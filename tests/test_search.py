@@ -0,0 +1,80 @@
+import plain_sight.search as search
+from plain_sight.synthetic import iter_accounts
+from plain_sight.account import Account, AccountStore
+from plain_sight.search import SearchIndex, get_grams
+
+
+_ACCOUNTS = [
+    {'name': 'Online Banking', 'login': 'me@example.com', 'password': 'bank password'},
+    {'name': 'Bank', 'login': 'someone', 'password': 'other password'},
+    {'name': 'Email', 'login': 'banker@example.com', 'password': 'email password'},
+    {'name': 'Forum', 'login': 'forum user', 'password': 'forum password'}
+]
+
+
+def build_index() -> SearchIndex:
+    return SearchIndex(Account(account) for account in _ACCOUNTS)
+
+
+def test_get_grams() -> None:
+    assert get_grams('abcd') == {'abc', 'bcd'}
+    assert get_grams('ab') == set()
+
+
+def test_ranked_search() -> None:
+    index = build_index()
+    results = [str(account) for account in index.search('bank', 10)]
+
+    assert results == ['Bank', 'Online Banking', 'Email']
+    assert [str(account) for account in index.search('BANK', 2)] == ['Bank', 'Online Banking']
+
+
+def test_short_and_missing_queries() -> None:
+    index = build_index()
+
+    assert len(index.search('', 10)) == len(_ACCOUNTS)
+    assert [str(account) for account in index.search('fo', 10)] == ['Forum']
+    assert [str(account) for account in index.search('e', 10)][0] == 'Email'
+    assert index.search('missing', 10) == []
+
+
+def test_secrets_not_indexed() -> None:
+    index = build_index()
+
+    assert index.search('password', 10) == []
+
+
+def test_update() -> None:
+    index = build_index()
+    account = index.documents[3]
+
+    account.name = 'Renamed'
+    index.update(account)
+    assert index.search('forum', 10) == [account]     # Still matches on login
+    assert index.search('renamed', 10) == [account]
+
+    account.login = 'nobody'
+    index.update(account)
+    assert index.search('forum', 10) == []
+
+    new_account = Account({'name': 'New Forum', 'login': 'new', 'password': 'new password'})
+    index.update(new_account)
+    assert index.search('forum', 10) == [new_account]
+
+
+def test_search_accounts() -> None:
+    store = AccountStore()
+    accounts = [store.add(account) for account in iter_accounts(500)]
+    index = SearchIndex(accounts)
+
+    queries = ('github', 'gi', 'GitHub 12', 'alex', 'example.org', 'netflix 3', '', 'zzz')
+    for query in queries:
+        assert search.search_accounts(accounts, query, 15) == index.search_ranked(query, 15)
+
+    # Edited accounts keep their old postings until a search checks them, ranks must follow their current values
+    for account in accounts[::7]:
+        account.name, account.login = account.login, 'github 1'
+        index.update(account)
+    for query in queries + ('github 1',):
+        assert search.search_accounts(accounts, query, 15) == index.search_ranked(query, 15)
+        assert search.search_accounts(accounts, query, 15) == index.search_ranked(query, 15)
@@ -0,0 +1,59 @@
+from json import dumps
+import plain_sight.stream as stream
+
+
+_DATA = {
+    'version': 12,
+    'accounts': [
+        {'name': 'first', 'login': 'first login', 'password': 'p@ss'},
+        {'name': 'sécond', 'login': 'second login', 'password': '[{"tricky"}]'}
+    ],
+    'other': {'nested': [1, 2.5, None]}
+}
+
+
+def chunk(data: bytes, size: int) -> list:
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def test_decode_stream() -> None:
+    encoded = 'sécond'.encode()
+
+    assert ''.join(stream.decode_stream(chunk(encoded, 1))) == 'sécond'
+
+
+def test_iter_vault_items() -> None:
+    encoded = dumps(_DATA, indent=2, ensure_ascii=False).encode()
+
+    for size in (1, 7, len(encoded)):
+        items = list(stream.iter_vault_items(stream.decode_stream(chunk(encoded, size))))
+
+        assert items == [
+            ('version', 12),
+            ('accounts', _DATA['accounts'][0]),
+            ('accounts', _DATA['accounts'][1]),
+            ('other', _DATA['other'])
+        ]
+
+
+def test_empty_documents() -> None:
+    for document in (b'', b'{}', b'{"accounts": []}'):
+        assert list(stream.iter_vault_items(stream.decode_stream([document]))) == []
+
+
+def test_iter_json_records() -> None:
+    records = _DATA['accounts']
+    documents = (
+        dumps(records),
+        dumps({'encrypted': False, 'folders': [{'id': 1}], 'items': records}),
+        dumps({'accounts': records[:1], 'other': records, 'items': records[1:]})
+    )
+
+    for document in documents:
+        encoded = document.encode()
+        for size in (1, 7, len(encoded)):
+            parsed = stream.iter_json_records(stream.decode_stream(chunk(encoded, size)), ('accounts', 'items'))
+            assert list(parsed) == records
+
+    for document in (b'', b'[]', b'{}', b'{"items": []}'):
+        assert list(stream.iter_json_records(stream.decode_stream([document]), ('items',))) == []
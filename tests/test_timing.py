@@ -0,0 +1,53 @@
+import tracemalloc
+import plain_sight.timing as timing
+
+
+@timing.timed('example')
+def example(size: int) -> bytearray:
+    return bytearray(size)
+
+
+def test_disabled() -> None:
+    timing.enable()
+    timing.disable()
+
+    assert timing.span('stage') is timing.span('other stage')
+    assert len(example(8)) == 8
+    assert 'example' not in timing.report()
+
+
+def test_spans() -> None:
+    timing.enable()
+    try:
+        with timing.span('outer'):
+            example(8)
+            example(8)
+    finally:
+        timing.disable()
+
+    lines = {line.split()[0]: line.split() for line in timing.report().splitlines()[1:]}
+    assert lines['example'][1] == '2'
+    assert lines['outer'][1] == '1'
+    assert 'wall' in lines
+
+
+def test_memory() -> None:
+    timing.enable(memory=True)
+    try:
+        with timing.span('outer'):
+            example(1 << 20)
+            example(1 << 10)
+        report = timing.report()
+    finally:
+        timing.disable()
+
+    peaks = {line.split()[0]: float(line.split()[-1]) for line in report.splitlines()[1:-1]}
+
+    # The peak of the first call is kept by the enclosing span even though the second call resets the traced peak
+    assert peaks['example'] >= 1024
+    assert peaks['outer'] >= 1024
+
+
+def test_memory_without_reset_peak(monkeypatch) -> None:
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    test_memory()
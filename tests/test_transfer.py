@@ -0,0 +1,128 @@
+from csv import DictReader
+from io import StringIO
+from json import dumps, loads
+from pathlib import Path
+import pytest
+import plain_sight.transfer as transfer
+from plain_sight.plain_sight import PlainSight
+
+
+_KEY = 'this is my key'
+_BITWARDEN_ITEM = {
+    'passwordHistory': [{'lastUsedDate': '2020-01-01', 'password': 'old password'}],
+    'id': 'a1', 'type': 1, 'favorite': False,
+    'name': 'github', 'notes': None,
+    'fields': [{'name': 'PIN', 'value': '1234', 'type': 0}],
+    'login': {'uris': [{'match': None, 'uri': 'https://github.com'}], 'username': 'me', 'password': 'secret'}
+}
+
+
+def test_normalize() -> None:
+    assert transfer.normalize(_BITWARDEN_ITEM) == {
+        'name': 'github', 'pin': '1234', 'url': 'https://github.com', 'login': 'me', 'password': 'secret'
+    }
+
+    # Firefox exports have no name
+    firefox = {'url': 'https://example.com', 'username': 'me', 'password': 'secret', 'guid': '{1}', 'httpRealm': ''}
+    assert transfer.normalize(firefox) == {
+        'url': 'https://example.com', 'login': 'me', 'password': 'secret', 'name': 'example.com'
+    }
+
+
+def test_validate_batch() -> None:
+    seen = {('github', 'me')}
+    batch = list(enumerate([
+        {'name': 'GitHub', 'login': 'Me', 'password': 'a'},
+        {'name': 'gitlab', 'login': 'me', 'password': 'b'},
+        {'name': 'gitlab', 'login': 'me', 'password': 'c'},
+        {'name': 'no password'},
+        {'name': 'reserved', 'password': 'd', 'options': 'e'},
+        ['not', 'an', 'object']
+    ], 1))
+
+    accounts, rejected = transfer.validate_batch(batch, seen)
+
+    assert accounts == [{'name': 'gitlab', 'login': 'me', 'password': 'b'}]
+    assert [number for number, _ in rejected] == [1, 3, 4, 5, 6]
+    assert ('gitlab', 'me') in seen
+
+
+def test_failed_save(mocker, tmp_path) -> None:
+    plain_sight = PlainSight(tmp_path / 'import.vault', _KEY)
+    mocker.patch.object(plain_sight, 'compact', side_effect=OSError('disk full'))
+
+    with pytest.raises(transfer.SaveError):
+        transfer.import_accounts(plain_sight, [{'name': 'github', 'login': 'me', 'password': 'secret'}])
+    assert not (tmp_path / 'import.vault').exists()
+
+
+def test_non_string_login(tmp_path) -> None:
+    plain_sight = PlainSight(tmp_path / 'import.vault', _KEY)
+    plain_sight.add_accounts([{'name': 'Door', 'login': 1234, 'password': 'secret'}])
+
+    records = [{'name': 'door', 'login': '1234', 'password': 'other'}]
+    assert transfer.import_accounts(plain_sight, records) == transfer.ImportResult(0, 1, 0)
+
+
+def test_import_export(tmp_path) -> None:
+    vault_path = tmp_path / 'import.vault'
+    rows = [{'Title': f'account {index}', 'Username': 'me', 'Password': f'password {index}', 'URL': ''}
+            for index in range(25)]
+    csv_path = tmp_path / 'export.csv'
+    csv_path.write_text('Title,Username,Password,URL\n' + ''.join(
+        f'{row["Title"]},{row["Username"]},{row["Password"]},\n' for row in rows + rows[:3]
+    ))
+
+    plain_sight = PlainSight(vault_path, _KEY)
+    rejected = []
+    result = transfer.import_accounts(plain_sight, transfer.read_records(csv_path), lambda *args: rejected.append(args),
+                                      batch_size=10)
+
+    assert result == transfer.ImportResult(25, 3, 0)
+    assert [number for number, _ in rejected] == [26, 27, 28]
+    assert not plain_sight.journal.path.exists()
+
+    reopened = PlainSight(vault_path, _KEY)
+    assert [account.to_json() for account in reopened.accounts] == [
+        {'name': row['Title'], 'login': 'me', 'password': row['Password']} for row in rows
+    ]
+
+    json_path = tmp_path / 'export.json'
+    assert transfer.export_accounts(reopened.accounts, json_path) == 25
+    assert json_path.stat().st_mode & 0o777 == 0o600
+    assert loads(json_path.read_text()) == {'accounts': [account.to_json() for account in reopened.accounts]}
+
+    # Importing its own export adds nothing and leaves the vault alone
+    modified = vault_path.stat().st_mtime_ns
+    assert transfer.import_accounts(reopened, transfer.read_records(json_path)) == transfer.ImportResult(0, 25, 0)
+    assert vault_path.stat().st_mtime_ns == modified
+
+
+def test_export_csv() -> None:
+    accounts = PlainSight.load_data(dumps({'accounts': [
+        {'name': 'first', 'login': 'me', 'password': 'a', 'pin': '1'},
+        {'name': 'second', 'password': 'b', 'notes': 'line one\nline two'}
+    ]}))['accounts']
+
+    output = StringIO()
+    transfer.write_csv(accounts, output)
+    output.seek(0)
+
+    reader = DictReader(output)
+    assert reader.fieldnames == ['name', 'login', 'password', 'notes', 'pin']
+    assert [row['notes'] for row in reader] == ['', 'line one\nline two']
+
+
+def test_unreadable_import(tmp_path) -> None:
+    vault_path = tmp_path / 'import.vault'
+    json_path = tmp_path / 'broken.json'
+    json_path.write_text(dumps([{'name': 'first', 'password': 'a'}])[:-5])
+
+    plain_sight = PlainSight(vault_path, _KEY)
+    with pytest.raises(ValueError):
+        transfer.import_accounts(plain_sight, transfer.read_records(json_path))
+
+    assert not vault_path.exists()
+
+    with pytest.raises(ValueError):
+        transfer.read_records(Path('accounts.xml'))
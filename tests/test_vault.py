@@ -0,0 +1,139 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from json import dumps
+import pytest
+import plain_sight.vault as vault
+from plain_sight.compression import Codec, CODECS
+from plain_sight.encryption import encrypt_data, new_kdf, KeyContext, DecryptionError, CBC, DEFAULT_CIPHER
+from plain_sight.file_io import map_file
+from plain_sight.records import SchemaTable
+
+
+_KEY = 'this is my key'
+_RECORDS = [b'first record', b'second record', b'third record']
+
+
+def test_write_and_read() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        vault.write_vault(vault_path, _KEY, _RECORDS, {'a': 1})
+
+        assert vault.is_record_vault(vault_path)
+
+        with map_file(vault_path) as view:
+            header = vault.read_header(view)
+            assert header['version'] == 4
+            assert header['compression'] == 'zlib'
+            assert header['records'] == 'json'
+            assert header['kdf']['name'] == 'scrypt'
+
+            key = vault.unlock(header, _KEY)
+            index, _ = vault.read_index(view, key)
+
+            assert index['extra'] == {'a': 1}
+            assert list(vault.iter_records(view, key, index)) == _RECORDS
+
+
+def test_load_record() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        vault.write_vault(vault_path, _KEY, _RECORDS)
+
+        for position, record in enumerate(_RECORDS):
+            assert vault.load_record(vault_path, _KEY, position) == record
+
+
+def test_legacy_vault() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'legacy.vault'
+        vault_path.write_bytes(encrypt_data(_KEY, b'{}'))
+
+        assert not vault.is_record_vault(vault_path)
+        assert not vault.is_record_vault(Path(temp_dir) / 'missing.vault')
+
+
+def test_large_record() -> None:
+    large_record = b'x' * (vault._BUFFER_SIZE * 2)
+
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        vault.write_vault(vault_path, _KEY, [_RECORDS[0], large_record])
+
+        assert vault.load_record(vault_path, _KEY, 0) == _RECORDS[0]
+        assert vault.load_record(vault_path, _KEY, 1) == large_record
+
+
+def test_compression() -> None:
+    records = [dumps({'name': f'account {index}', 'login': 'me@example.com'}).encode() for index in range(200)]
+
+    with TemporaryDirectory() as temp_dir:
+        sizes = {}
+        for compression in CODECS:
+            vault_path = Path(temp_dir) / f'{compression}.vault'
+            vault.write_vault(vault_path, _KEY, records, compression=compression)
+
+            assert vault.load_record(vault_path, _KEY, 0) == records[0]
+            assert vault.load_record(vault_path, _KEY, 199) == records[199]
+            sizes[compression] = vault_path.stat().st_size
+
+        assert sizes['zlib'] < sizes['none'] / 2
+
+
+def test_dictionary_without_secrets() -> None:
+    accounts = [{'name': f'account {index}', 'login': 'me', 'password': f'reused {index % 3}'} for index in range(200)]
+
+    with TemporaryDirectory() as temp_dir:
+        for schemas in (None, SchemaTable()):
+            vault_path = Path(temp_dir) / 'records.vault'
+            records = [schemas.encode(tuple(account), list(account.values())) if schemas else dumps(account).encode()
+                       for account in accounts]
+            vault.write_vault(vault_path, _KEY, records, schemas=schemas)
+
+            with map_file(vault_path) as view:
+                key = vault.unlock(vault.read_header(view), _KEY)
+                index, _ = vault.read_index(view, key)
+                dictionary = vault.read_codec(vault.read_header(view), index).dictionary
+
+            assert b'account 1' in dictionary
+            assert b'reused' not in dictionary
+
+
+def test_version_1_vault() -> None:
+    key = KeyContext(_KEY, new_kdf())
+    header = dumps({'version': 1, 'kdf': key.kdf}).encode()
+
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        with vault_path.open('wb') as fl:
+            fl.write(vault.MAGIC + vault._HEADER_SIZE.pack(len(header)) + header)
+            entries = [vault.write_record(fl, key, record) for record in _RECORDS]
+            vault.write_index(fl, key, {'records': entries, 'extra': {}, 'dead': 0}, Codec())
+
+        assert [vault.load_record(vault_path, _KEY, position) for position in range(3)] == _RECORDS
+
+
+def test_ciphers() -> None:
+    with TemporaryDirectory() as temp_dir:
+        vault_path = Path(temp_dir) / 'records.vault'
+        vault.write_vault(vault_path, _KEY, _RECORDS)
+
+        with map_file(vault_path) as view:
+            header = vault.read_header(view)
+            assert header['cipher'] == DEFAULT_CIPHER
+            assert vault.unlock(header, _KEY).cipher == DEFAULT_CIPHER
+        assert vault.load_record(vault_path, _KEY, 1) == _RECORDS[1]
+
+        with pytest.raises(DecryptionError):
+            vault.load_record(vault_path, 'wrong key', 1)
+
+        # A session key is switched to the cipher of the vault it opens
+        legacy_key = KeyContext(_KEY, new_kdf(), CBC)
+        vault.write_vault(vault_path, legacy_key, _RECORDS)
+        assert vault.load_record(vault_path, legacy_key.with_cipher(DEFAULT_CIPHER), 2) == _RECORDS[2]
+
+
+def test_newer_version() -> None:
+    header = dumps({'version': vault._VERSION + 1}).encode()
+
+    with pytest.raises(ValueError):
+        vault.read_header(memoryview(vault.MAGIC + vault._HEADER_SIZE.pack(len(header)) + header))
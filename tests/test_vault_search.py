@@ -0,0 +1,31 @@
+from typing import List
+from plain_sight.encryption import DecryptionError
+from plain_sight.vault_search import search_vaults
+
+
+_KEY = 'this is my key'
+
+
+def make_accounts(*names: str) -> List[dict]:
+    return [{'name': name, 'login': 'me', 'password': 'secret'} for name in names]
+
+
+def test_search_vaults(tmp_path, make_vault) -> None:
+    first, second, other_key, missing = (tmp_path / f'{name}.vault' for name in ('first', 'second', 'other', 'missing'))
+    make_vault(make_accounts('github work', 'gitlab', 'email'), first.name, _KEY)
+    make_vault(make_accounts('github', 'github home'), second.name, _KEY)
+    make_vault(make_accounts('github'), other_key.name, 'another key')
+
+    failures = []
+    vaults = [(first, _KEY), (missing, _KEY), (other_key, _KEY), (second, _KEY)]
+    matches = search_vaults(vaults, 'github', 10, fail=lambda *args: failures.append(args))
+
+    # The exact name comes first, then name matches by position, the first vault winning ties
+    assert [(match.vault, str(match.account)) for match in matches] == [
+        (second, 'github'), (first, 'github work'), (second, 'github home')
+    ]
+    assert [vault_path for vault_path, _ in failures] == [missing, other_key]
+    assert isinstance(failures[0][1], FileNotFoundError) and isinstance(failures[1][1], DecryptionError)
+
+    matches = search_vaults(vaults, 'git', 2, workers=1)
+    assert [(match.vault, str(match.account)) for match in matches] == [(first, 'github work'), (second, 'github')]